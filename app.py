@@ -4,19 +4,28 @@ BTC Store Data Analytics Web UI
 Simple Flask web interface for natural language to SQL queries.
 """
 
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 import os
+import json
 from dotenv import load_dotenv
 from nl_to_sql_postgres import get_openai_client, generate_sql_query, execute_sql_query
 from local_llm_summarizer import LocalLLMSummarizer, check_ollama_status, get_available_models
+from llm_http import get_llm_http_stats
+from summary_cache import get_summary_cache_stats
+from dataset_reload import get_dataset_reloader
+from postgres_client import get_pool_stats, cancel_query, QueryCancelledError
 import traceback
 import base64
+import time
 
 # Load environment variables (optional for Railway deployment)
 load_dotenv(override=False)
 
 app = Flask(__name__)
 
+# Time budget for a whole /api/query request (SQL generation plus execution)
+QUERY_DEADLINE_SECONDS = float(os.getenv('QUERY_DEADLINE_SECONDS', '60'))
+
 # Basic Authentication
 def check_auth(username, password):
     """Check if username and password are correct."""
@@ -42,6 +51,22 @@ def requires_auth(f):
     decorated.__name__ = f.__name__
     return decorated
 
+def check_admin_auth(username, password):
+    """Check admin credentials. Admin endpoints stay disabled until ADMIN_PASSWORD is set."""
+    admin_username = os.getenv('ADMIN_USERNAME', 'admin')
+    admin_password = os.getenv('ADMIN_PASSWORD')
+    return bool(admin_password) and username == admin_username and password == admin_password
+
+def requires_admin(f):
+    """Decorator to require admin authentication for routes."""
+    def decorated(*args, **kwargs):
+        auth = request.authorization
+        if not auth or not check_admin_auth(auth.username, auth.password):
+            return authenticate()
+        return f(*args, **kwargs)
+    decorated.__name__ = f.__name__
+    return decorated
+
 # Initialize OpenAI client
 try:
     openai_client = get_openai_client()
@@ -67,6 +92,8 @@ def index():
 @requires_auth
 def process_query():
     """Process natural language query and return results."""
+    deadline = time.time() + QUERY_DEADLINE_SECONDS
+    sql_query = None
     try:
         if not api_connected:
             return jsonify({
@@ -87,8 +114,9 @@ def process_query():
         # Generate SQL query
         sql_query = generate_sql_query(query, openai_client)
         
-        # Execute the query
-        results = execute_sql_query(sql_query)
+        # Execute the query; the client can cancel it by query_id while it runs
+        results = execute_sql_query(sql_query, query_id=data.get('query_id'), deadline=deadline,
+                                    exact_count=bool(data.get('exact_count')))
         
         return jsonify({
             'success': True,
@@ -97,6 +125,13 @@ def process_query():
             'query': query
         })
         
+    except QueryCancelledError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'sql_query': sql_query,
+            **e.to_dict()
+        })
     except Exception as e:
         return jsonify({
             'success': False,
@@ -104,13 +139,27 @@ def process_query():
             'details': traceback.format_exc()
         })
 
+@app.route('/api/query/cancel', methods=['POST'])
+@requires_auth
+def cancel_running_query():
+    """Cancel a running query, e.g. when the page that started it is closed."""
+    data = request.get_json(silent=True) or {}
+    try:
+        cancelled = cancel_query(data.get('query_id', ''))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'cancelled': cancelled})
+
 @app.route('/api/status')
 def api_status():
     """Check API connection status."""
     return jsonify({
         'api_connected': api_connected,
         'local_llm_available': local_llm_available,
-        'error': error_message if not api_connected else None
+        'error': error_message if not api_connected else None,
+        'postgres_pool': get_pool_stats(),
+        'llm_http': get_llm_http_stats(),
+        'summary_cache': get_summary_cache_stats()
     })
 
 @app.route('/api/summarize', methods=['POST'])
@@ -127,6 +176,8 @@ def summarize_results():
         query = data.get('query', '')
         sql = data.get('sql', '')
         results = data.get('results', '')
+        # Skip the summary cache and generate a fresh summary
+        refresh = bool(data.get('refresh'))
         
         if not all([query, sql, results]):
             return jsonify({
@@ -134,8 +185,14 @@ def summarize_results():
                 'error': 'Missing required data: query, sql, or results'
             })
         
+        # Relay tokens as they're generated when the client asks for a stream
+        if data.get('stream'):
+            return Response(stream_with_context(stream_summary(query, sql, results, refresh)),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
         # Generate summary using local LLM
-        summary = local_llm_summarizer.summarize_query_results(query, sql, results)
+        summary = local_llm_summarizer.summarize_query_results(query, sql, results, refresh=refresh)
         
         return jsonify({
             'success': True,
@@ -148,6 +205,22 @@ def summarize_results():
             'error': str(e)
         })
 
+def sse_event(event: str, payload: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_summary(query, sql, results, refresh=False):
+    """Yield 'token' events as the summary is generated, then 'done' with the full text (or 'error')."""
+    parts = []
+    try:
+        for token in local_llm_summarizer.stream_query_results(query, sql, results, refresh=refresh):
+            parts.append(token)
+            yield sse_event('token', {'text': token})
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+    yield sse_event('done', {'summary': ''.join(parts)})
+
 @app.route('/api/models')
 def get_models():
     """Get available local LLM models."""
@@ -163,6 +236,35 @@ def get_models():
             'error': str(e)
         })
 
+@app.route('/api/admin/reload', methods=['POST'])
+@requires_admin
+def reload_dataset():
+    """Rebuild the dataset in the background and swap it into the serving database."""
+    try:
+        reloader = get_dataset_reloader()
+        started = reloader.start()
+        
+        return jsonify({
+            'success': started,
+            'error': None if started else 'A reload is already running',
+            'status': reloader.status()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/admin/reload', methods=['GET'])
+@requires_admin
+def reload_status():
+    """Report the state of the current or most recent dataset reload."""
+    return jsonify({
+        'success': True,
+        'status': get_dataset_reloader().status()
+    })
+
 @app.route('/health')
 def health_check():
     """Health check endpoint for Railway (no authentication required)."""
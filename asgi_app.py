@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for BT MIS Analytics
+Serves /api/query, /api/query/cancel and /api/status from async handlers on the
+asyncpg pool, so waiting on the database or OpenAI doesn't hold a worker. Every
+other route is the Flask app from app.py, mounted as WSGI.
+
+Usage:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8080
+"""
+
+import base64
+import os
+import time
+import traceback
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from dotenv import load_dotenv
+import app as flask_module
+from nl_to_sql_postgres import get_async_openai_client, generate_sql_query_async, execute_sql_query_async
+from postgres_client import get_pool_stats, QueryCancelledError
+from postgres_async_client import cancel_query, close_async_postgres_client, get_async_pool_stats
+from llm_http import get_llm_http_stats
+from summary_cache import get_summary_cache_stats
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    # Starlette's bridge is deprecated but still works when a2wsgi isn't installed
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+# Load environment variables (optional for Railway deployment)
+load_dotenv(override=False)
+
+# Initialize async OpenAI client
+try:
+    openai_client = get_async_openai_client()
+except Exception:
+    openai_client = None
+
+def is_authorized(request: Request) -> bool:
+    """Check Basic auth credentials against app.check_auth"""
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'basic':
+        return False
+    try:
+        username, _, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+    except ValueError:
+        return False
+    return flask_module.check_auth(username, password)
+
+def authenticate() -> Response:
+    """Send 401 response with authentication header."""
+    return Response(
+        'Could not verify your access level for that URL.\n'
+        'You have to login with proper credentials', 401,
+        {'WWW-Authenticate': 'Basic realm="Login Required"'})
+
+async def process_query(request: Request):
+    """Process natural language query and return results."""
+    if not is_authorized(request):
+        return authenticate()
+
+    deadline = time.time() + flask_module.QUERY_DEADLINE_SECONDS
+    sql_query = None
+    try:
+        if openai_client is None or not flask_module.api_connected:
+            return JSONResponse({
+                'success': False,
+                'error': 'OpenAI API not connected. Please check your API key.',
+                'details': getattr(flask_module, 'error_message', None)
+            })
+
+        data = await request.json()
+        query = data.get('query', '').strip()
+
+        if not query:
+            return JSONResponse({
+                'success': False,
+                'error': 'Please enter a question.'
+            })
+
+        sql_query = await generate_sql_query_async(query, openai_client)
+        results = await execute_sql_query_async(sql_query, query_id=data.get('query_id'), deadline=deadline,
+                                                exact_count=bool(data.get('exact_count')))
+
+        return JSONResponse({
+            'success': True,
+            'sql_query': sql_query,
+            'results': results,
+            'query': query
+        })
+
+    except QueryCancelledError as e:
+        return JSONResponse({
+            'success': False,
+            'error': str(e),
+            'sql_query': sql_query,
+            **e.to_dict()
+        })
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': str(e),
+            'details': traceback.format_exc()
+        })
+
+async def cancel_running_query(request: Request):
+    """Cancel a running query, e.g. when the page that started it is closed."""
+    if not is_authorized(request):
+        return authenticate()
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    try:
+        cancelled = await cancel_query((data or {}).get('query_id', ''))
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)})
+    return JSONResponse({'success': True, 'cancelled': cancelled})
+
+async def api_status(request: Request):
+    """Check API connection status."""
+    return JSONResponse({
+        'api_connected': flask_module.api_connected,
+        'local_llm_available': flask_module.local_llm_available,
+        'error': getattr(flask_module, 'error_message', None) if not flask_module.api_connected else None,
+        'postgres_pool': get_pool_stats(),
+        'postgres_async_pool': get_async_pool_stats(),
+        'llm_http': get_llm_http_stats(),
+        'summary_cache': get_summary_cache_stats()
+    })
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_postgres_client()
+
+app = Starlette(
+    routes=[
+        Route('/api/query', process_query, methods=['POST']),
+        Route('/api/query/cancel', cancel_running_query, methods=['POST']),
+        Route('/api/status', api_status),
+        Mount('/', WSGIMiddleware(flask_module.app))
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Starting BT MIS Analytics Web UI (ASGI)...")
+    port = int(os.environ.get('PORT', 8080))
+    uvicorn.run(app, host='0.0.0.0', port=port)
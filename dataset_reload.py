@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Dataset Reloader for BT MIS Analytics
+Rebuilds the tidy dataset from the source CSV in the background and swaps it
+into the serving database without restarting the app.
+
+Usage:
+    python dataset_reload.py                      # reload into DATABASE_URL
+    python dataset_reload.py --sink csv           # rewrite clean_mis_long.csv (DuckDB)
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+from process_btc_csv import run_pipeline, write_to_sink, write_csv_output
+
+# Load environment variables (optional for Railway deployment)
+load_dotenv(override=False)
+
+class DatasetReloader:
+    """Runs the ETL pipeline and publishes the result, one rebuild at a time"""
+
+    def __init__(self, input_path: Optional[str] = None, sink: Optional[str] = None,
+                 database: Optional[str] = None, output_path: Optional[str] = None,
+                 reader: Optional[str] = None):
+        self.input_path = input_path or os.getenv('MIS_SOURCE_CSV', 'BTC store for CSV.csv')
+        self.sink = sink or os.getenv('MIS_RELOAD_SINK', 'postgres')
+        self.database = database or os.getenv('MIS_RELOAD_DATABASE')
+        self.output_path = output_path or os.getenv('MIS_RELOAD_OUTPUT', 'clean_mis_long.csv')
+        self.reader = reader or os.getenv('MIS_RELOAD_READER', 'pandas')
+
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.version = 0
+        self.state = 'idle'
+        self.started_at = None
+        self.finished_at = None
+        self.duration_seconds = None
+        self.rows = None
+        self.error = None
+
+    def start(self, input_path: Optional[str] = None) -> bool:
+        """Start a background rebuild. Returns False if one is already running."""
+        with self._lock:
+            if self.state == 'running':
+                return False
+            self.state = 'running'
+            self.started_at = datetime.now().isoformat(timespec='seconds')
+            self.error = None
+
+        self._thread = threading.Thread(
+            target=self._run_in_background,
+            args=(input_path or self.input_path,),
+            daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def reload(self, input_path: Optional[str] = None) -> int:
+        """Rebuild and publish the dataset synchronously. Returns the number of rows published."""
+        input_path = input_path or self.input_path
+        df_tidy, df_lifecycle = run_pipeline(input_path, reader=self.reader)
+
+        # Each sink swaps atomically: Postgres renames a freshly loaded table over
+        # the live one, the CSV sink renames a finished file into place
+        if self.sink == 'csv':
+            write_csv_output(df_tidy, self.output_path, df_lifecycle)
+        else:
+            write_to_sink(self.sink, df_tidy, 'mis_long', self.database)
+            if df_lifecycle is not None:
+                write_to_sink(self.sink, df_lifecycle, 'store_lifecycle', self.database)
+            if self.sink == 'postgres':
+                # The swap recreated (or dropped) the rollup views; re-check before the next question
+                from nl_to_sql_postgres import clear_rollup_context
+                clear_rollup_context()
+
+        return len(df_tidy)
+
+    def _run_in_background(self, input_path: str):
+        """Thread target: run reload() and record the outcome"""
+        start_time = time.time()
+        try:
+            rows = self.reload(input_path)
+            with self._lock:
+                self.version += 1
+                self.rows = rows
+                self.state = 'succeeded'
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self.error = str(e)
+                self.state = 'failed'
+        finally:
+            with self._lock:
+                self.finished_at = datetime.now().isoformat(timespec='seconds')
+                self.duration_seconds = round(time.time() - start_time, 2)
+
+    def status(self) -> Dict[str, Any]:
+        """Return the state of the current or most recent rebuild"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'version': self.version,
+                'sink': self.sink,
+                'input_path': self.input_path,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'duration_seconds': self.duration_seconds,
+                'rows': self.rows,
+                'error': self.error
+            }
+
+# Global instance
+dataset_reloader = None
+
+def get_dataset_reloader() -> DatasetReloader:
+    """Get or create the global dataset reloader instance"""
+    global dataset_reloader
+    if dataset_reloader is None:
+        dataset_reloader = DatasetReloader()
+    return dataset_reloader
+
+def main():
+    """Run a one-off synchronous reload from the command line"""
+    parser = argparse.ArgumentParser(description='Rebuild the MIS dataset and swap it into the serving database')
+    parser.add_argument('--input', '-i', help='Source cross-tab CSV (default: MIS_SOURCE_CSV)')
+    parser.add_argument('--sink', choices=['csv', 'duckdb', 'sqlite', 'postgres'], help='Target (default: MIS_RELOAD_SINK or postgres)')
+    parser.add_argument('--database', help='Database file or connection string (default: DATABASE_URL)')
+    parser.add_argument('--output', '-o', help='Output CSV for the csv sink (default: clean_mis_long.csv)')
+
+    args = parser.parse_args()
+
+    reloader = DatasetReloader(input_path=args.input, sink=args.sink,
+                               database=args.database, output_path=args.output)
+
+    try:
+        print(f"🔄 Rebuilding dataset from {reloader.input_path} into {reloader.sink}...")
+        start_time = time.time()
+        rows = reloader.reload()
+        print(f"✅ Published {rows:,} rows in {time.time() - start_time:.1f}s")
+    except Exception as e:
+        print(f"❌ Reload failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
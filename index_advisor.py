@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Index Advisor for BT MIS Analytics
+Replays the SQL recorded in the query log (PG_QUERY_LOG) with
+EXPLAIN (ANALYZE, BUFFERS) and recommends indexes for mis_long from the
+sequential scans, filtered index scans and filter columns it finds.
+
+Recommendations are partial indexes per parameter (WHERE parameter = '...'),
+keyed on the other filter columns and covering every other column the query
+selects, groups or orders by, so the typical "one metric over a date range"
+question becomes an index-only scan. With --apply the indexes are created and every query is replayed again
+for a before/after latency report.
+
+Run it against a local copy of the database: EXPLAIN ANALYZE executes each
+query (inside a read-only transaction that is rolled back).
+
+Usage:
+    PG_QUERY_LOG=query_log.jsonl python app.py          # collect queries
+    python index_advisor.py --log query_log.jsonl       # recommend
+    python index_advisor.py --log query_log.jsonl --apply --report index_report.md
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables (optional for Railway deployment)
+load_dotenv(override=False)
+
+TABLE = 'mis_long'
+
+# Equality columns go first in an index key, most selective first; ranges go last
+KEY_ORDER = ['store_name', 'cafe_code', 'region', 'category', 'vintage', 'for_ssg', 'parameter']
+
+# (column OP 'literal') or (column = ANY ('{...}')) as printed in plan Filter/Index Cond
+CONDITION_PATTERN = re.compile(
+    r"\(+(?:\w+\.)?(\w+)\)*(?:::[\w ]+?)?\s+(=|<>|>=|<=|>|<)\s+(ANY\s+\()?'((?:[^']|'')*)'"
+)
+# Quoted literals are dropped before looking for column names in the SQL text
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+IDENTIFIER_PATTERN = re.compile(r'"([^"]+)"|\b([A-Za-z_][A-Za-z0-9_]*)\b')
+WRAPPED_MONTH_PATTERN = re.compile(r"(date_part|date_trunc|extract)\s*\([^()]*\(*month\b", re.IGNORECASE)
+
+def load_query_log(path: str) -> Counter:
+    """Distinct read queries from the log with how often each ran"""
+    calls: Counter = Counter()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not entry.get('ok', True):
+                continue
+            sql = ' '.join(entry.get('sql', '').split()).rstrip(';')
+            if sql.upper().startswith(('SELECT', 'WITH')):
+                calls[sql] += 1
+    return calls
+
+def query_columns(sql: str, columns: List[str]) -> List[str]:
+    """Table columns a query references, in order of appearance (all of them for SELECT *)"""
+    text = LITERAL_PATTERN.sub("''", sql)
+    if re.search(r'(^|[\s,.])\*\s*(,|FROM\b)', text, re.IGNORECASE):
+        return list(columns)
+    found = []
+    for quoted, word in IDENTIFIER_PATTERN.findall(text):
+        name = quoted or word.lower()
+        if name in columns and name not in found:
+            found.append(name)
+    return found
+
+def walk_plan(node: Dict[str, Any]):
+    """Yield a plan node and all of its children"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+def parse_conditions(expression: str, columns: List[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """Split a plan condition into equality literals per column and range columns"""
+    equalities: Dict[str, List[str]] = defaultdict(list)
+    ranges: List[str] = []
+    for column, op, any_list, literal in CONDITION_PATTERN.findall(expression or ''):
+        if column not in columns:
+            continue
+        if op == '=':
+            if any_list:
+                equalities[column].extend(v.strip('"') for v in literal.strip('{}').split(','))
+            else:
+                equalities[column].append(literal.replace("''", "'"))
+        elif op in ('<', '<=', '>', '>=') and column not in ranges:
+            ranges.append(column)
+    return dict(equalities), ranges
+
+class IndexAdvisor:
+    """Explains logged queries and derives index recommendations for mis_long"""
+
+    def __init__(self, connection_string: str, runs: int = 3):
+        import psycopg2
+
+        self.connection = psycopg2.connect(connection_string)
+        self.connection.autocommit = True
+        self.runs = runs
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position", (TABLE,)
+            )
+            self.columns = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(%s)", (TABLE,))
+            row = cursor.fetchone()
+            self.partitioned = bool(row and row[0])
+        if not self.columns:
+            raise ValueError(f"Table {TABLE} not found")
+
+    def explain(self, sql: str) -> Dict[str, Any]:
+        """Run EXPLAIN (ANALYZE, BUFFERS) a few times; keep the plan and median execution time"""
+        times = []
+        plan = None
+        with self.connection.cursor() as cursor:
+            for _ in range(self.runs):
+                cursor.execute("BEGIN READ ONLY")
+                try:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) {sql}")
+                    result = cursor.fetchone()[0]
+                finally:
+                    cursor.execute("ROLLBACK")
+                result = result[0] if isinstance(result, list) else json.loads(result)[0]
+                times.append(result['Execution Time'])
+                plan = result['Plan']
+
+        scans = []
+        indexes_used = set()
+        for node in walk_plan(plan):
+            if node.get('Index Name'):
+                indexes_used.add(node['Index Name'])
+            relation = node.get('Relation Name', '')
+            if relation == TABLE or relation.startswith(f"{TABLE}_"):
+                scans.append({
+                    'type': node['Node Type'],
+                    'relation': relation,
+                    'filter': ' AND '.join(filter(None, [node.get('Index Cond'), node.get('Recheck Cond'),
+                                                         node.get('Filter')])),
+                    'rows_removed': node.get('Rows Removed by Filter', 0),
+                    'blocks': node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)
+                })
+
+        return {
+            'ms': statistics.median(times),
+            'scans': scans,
+            'indexes_used': indexes_used,
+            'scan_types': sorted({scan['type'] for scan in scans})
+        }
+
+    def existing_indexes(self) -> Dict[str, str]:
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", (TABLE,))
+            return dict(cursor.fetchall())
+
+    def index_parents(self) -> Dict[str, str]:
+        """Map partition indexes to the mis_long index they belong to"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT child.relname, parent.relname
+                FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                WHERE parent.relkind = 'I'
+            """)
+            return dict(cursor.fetchall())
+
+    def recommend(self, explained: Dict[str, Dict[str, Any]], calls: Counter) -> List[Dict[str, Any]]:
+        """Turn scans that filter rows into index candidates, merged and ranked by time spent"""
+        candidates: Dict[Tuple, Dict[str, Any]] = {}
+
+        for sql, result in explained.items():
+            # Scan Output lists are no guide here: bitmap and sequential scans emit every
+            # column of the row, so the covered columns come from the query text instead
+            referenced = query_columns(sql, self.columns)
+            for scan in result['scans']:
+                # Sequential scans, and index scans that still throw rows away (e.g. a bitmap
+                # scan on the single-column parameter index filtering month afterwards)
+                if scan['type'] != 'Seq Scan' and not scan['rows_removed']:
+                    continue
+                equalities, ranges = parse_conditions(scan['filter'], self.columns)
+                if not equalities and not ranges:
+                    continue
+
+                # A single parameter value becomes the partial-index predicate
+                parameters = equalities.pop('parameter', [])
+                predicate = parameters[0] if len(parameters) == 1 else None
+                if len(parameters) > 1:
+                    equalities['parameter'] = parameters
+
+                keys = [col for col in KEY_ORDER if col in equalities]
+                keys += [col for col in equalities if col not in keys]
+                keys += [col for col in ranges if col not in keys]
+                if not keys:
+                    # Only the parameter filter: key on the first selected/grouped column
+                    keys = [col for col in referenced if col not in ('value', 'parameter')][:1] or ['month']
+
+                # Everything else the query touches, so the index covers it without heap visits
+                include = [col for col in referenced if col not in keys and col != 'parameter']
+
+                key = (predicate, tuple(keys))
+                candidate = candidates.setdefault(key, {
+                    'predicate': predicate,
+                    'keys': keys,
+                    'include': [],
+                    'queries': set(),
+                    'calls': 0,
+                    'weighted_ms': 0.0
+                })
+                candidate['include'] += [col for col in include if col not in candidate['include']]
+                if sql not in candidate['queries']:
+                    candidate['queries'].add(sql)
+                    candidate['calls'] += calls[sql]
+                    candidate['weighted_ms'] += calls[sql] * result['ms']
+
+        recommendations = sorted(candidates.values(), key=lambda c: c['weighted_ms'], reverse=True)
+        for rec in recommendations:
+            rec['name'] = self._index_name(rec)
+            rec['sql'] = self._index_sql(rec)
+        return recommendations
+
+    def _index_name(self, rec: Dict[str, Any]) -> str:
+        parts = ['idx', TABLE]
+        if rec['predicate']:
+            parts.append(re.sub(r'[^a-z0-9]+', '_', rec['predicate'].lower()).strip('_'))
+        parts += rec['keys']
+        # Postgres truncates identifiers at 63 bytes
+        return '_'.join(parts)[:63].rstrip('_')
+
+    def _index_sql(self, rec: Dict[str, Any]) -> str:
+        sql = f"CREATE INDEX {'' if self.partitioned else 'CONCURRENTLY '}IF NOT EXISTS {rec['name']} ON {TABLE} ({', '.join(rec['keys'])})"
+        if rec['include']:
+            sql += f" INCLUDE ({', '.join(rec['include'])})"
+        if rec['predicate']:
+            sql += " WHERE parameter = '{}'".format(rec['predicate'].replace("'", "''"))
+        return sql
+
+    def apply(self, recommendations: List[Dict[str, Any]]):
+        with self.connection.cursor() as cursor:
+            for rec in recommendations:
+                print(f"🔨 {rec['sql']}")
+                cursor.execute(rec['sql'])
+            # Index-only scans skip the heap only for pages marked all-visible
+            cursor.execute(f"VACUUM (ANALYZE) {TABLE}")
+
+    def close(self):
+        self.connection.close()
+
+def format_report(calls: Counter, before: Dict[str, Dict[str, Any]], after: Optional[Dict[str, Dict[str, Any]]],
+                  recommendations: List[Dict[str, Any]], existing: Dict[str, str],
+                  wrapped_month: List[str], index_parents: Dict[str, str]) -> str:
+    """Markdown report of plans, recommendations and (after --apply) latency changes"""
+    lines = ['# Index advisor report', '']
+
+    used = set()
+    for result in list(before.values()) + list((after or {}).values()):
+        used |= {index_parents.get(name, name) for name in result['indexes_used']}
+
+    lines += ['## Queries', '',
+              '| # | calls | before ms | scans before | after ms | scans after | speedup |',
+              '|---|---|---|---|---|---|---|']
+    ordered = sorted(before, key=lambda sql: calls[sql] * before[sql]['ms'], reverse=True)
+    for number, sql in enumerate(ordered, 1):
+        b = before[sql]
+        row = f"| {number} | {calls[sql]} | {b['ms']:.2f} | {', '.join(b['scan_types']) or '-'} "
+        if after and sql in after:
+            a = after[sql]
+            row += f"| {a['ms']:.2f} | {', '.join(a['scan_types']) or '-'} | {b['ms'] / max(a['ms'], 1e-3):.1f}x |"
+        else:
+            row += "| - | - | - |"
+        lines.append(row)
+    lines.append('')
+    for number, sql in enumerate(ordered, 1):
+        lines.append(f"{number}. `{sql}`")
+    lines.append('')
+
+    lines += ['## Recommended indexes', '']
+    if recommendations:
+        for rec in recommendations:
+            lines.append(f"- `{rec['sql']}` ({len(rec['queries'])} queries, {rec['calls']} calls, "
+                         f"{rec['weighted_ms']:.1f} ms of query time)")
+    else:
+        lines.append('- None: no filtering scans with indexable conditions')
+    lines.append('')
+
+    lines += ['## Existing indexes not used by the logged queries', '']
+    unused = [name for name in existing if name not in used and not name.endswith('_pkey')]
+    lines += [f"- `{name}`" for name in unused] or ['- None']
+    lines.append('')
+
+    if wrapped_month:
+        lines += ['## Queries that hide month from indexes', '',
+                  'These filter on EXTRACT/DATE_PART/DATE_TRUNC of month; a range such as '
+                  "`month >= '2024-01-01' AND month < '2025-01-01'` can use month indexes and partition pruning.", '']
+        lines += [f"- `{sql}`" for sql in wrapped_month]
+        lines.append('')
+
+    return '\n'.join(lines)
+
+def main():
+    """Main function to run the index advisor"""
+    parser = argparse.ArgumentParser(description='Recommend mis_long indexes from the logged query workload')
+    parser.add_argument('--log', default=os.getenv('PG_QUERY_LOG', 'query_log.jsonl'),
+                        help='Query log written via PG_QUERY_LOG (default: PG_QUERY_LOG or query_log.jsonl)')
+    parser.add_argument('--database', help='Postgres to replay against (default: DATABASE_URL)')
+    parser.add_argument('--runs', type=int, default=3, help='EXPLAIN ANALYZE runs per query; the median is reported (default: 3)')
+    parser.add_argument('--min-calls', type=int, default=1, help='Ignore candidates used by fewer logged calls (default: 1)')
+    parser.add_argument('--apply', action='store_true', help='Create the recommended indexes and replay the workload again')
+    parser.add_argument('--report', help='Write the markdown report to this file')
+    args = parser.parse_args()
+
+    connection_string = args.database or os.getenv('DATABASE_URL')
+    if not connection_string:
+        print("❌ DATABASE_URL must be set (or pass --database)", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        calls = load_query_log(args.log)
+    except OSError as e:
+        print(f"❌ Could not read query log: {e}", file=sys.stderr)
+        sys.exit(1)
+    if not calls:
+        print("⚠️  No successful SELECT queries in the log")
+        return
+    print(f"📜 {sum(calls.values())} logged queries, {len(calls)} distinct")
+
+    advisor = IndexAdvisor(connection_string, runs=args.runs)
+    try:
+        before = {}
+        for sql in calls:
+            try:
+                before[sql] = advisor.explain(sql)
+            except Exception as e:
+                print(f"⚠️  Skipping query that failed to explain: {e}")
+
+        wrapped_month = [sql for sql in before if WRAPPED_MONTH_PATTERN.search(sql)]
+        recommendations = [rec for rec in advisor.recommend(before, calls) if rec['calls'] >= args.min_calls]
+        existing = advisor.existing_indexes()
+
+        after = None
+        if args.apply and recommendations:
+            advisor.apply(recommendations)
+            after = {sql: advisor.explain(sql) for sql in before}
+            existing = advisor.existing_indexes()
+
+        report = format_report(calls, before, after, recommendations, existing, wrapped_month,
+                               advisor.index_parents())
+    finally:
+        advisor.close()
+
+    print(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(f"📝 Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Watch-Folder Ingestion Service for BT MIS Analytics
+Watches a directory for new MIS exports and publishes a new dataset version
+whenever a file with new content lands.
+
+Uses watchdog (inotify on Linux) when installed, otherwise polls the folder.
+
+Usage:
+    python ingest_watcher.py --watch-dir /shared/mis
+    python ingest_watcher.py --watch-dir /shared/mis --sink csv --output clean_mis_long.csv
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from dataset_reload import DatasetReloader
+
+# Load environment variables (optional for Railway deployment)
+load_dotenv(override=False)
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file in chunks so large exports don't have to fit in memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class IngestWatcher:
+    """Debounces file drops in a folder and runs the ETL on new content"""
+
+    def __init__(self, watch_dir: str, reloader: DatasetReloader, pattern: str = '*.csv',
+                 debounce_seconds: float = 5.0, poll_interval: float = 2.0,
+                 state_path: Optional[str] = None):
+        self.watch_dir = Path(watch_dir)
+        self.reloader = reloader
+        self.pattern = pattern
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.state_path = Path(state_path) if state_path else self.watch_dir / '.ingest_state.json'
+
+        # path -> (size, mtime) when last seen, and when that signature was first seen
+        self._pending: Dict[Path, Tuple[Tuple[int, float], float]] = {}
+        self._seen: Dict[Path, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._observer = None
+
+        # Never ingest our own output when the csv sink writes into the watched folder
+        self._ignored = {Path(reloader.output_path).resolve()}
+
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Load published versions from the state file"""
+        if self.state_path.exists():
+            try:
+                return json.loads(self.state_path.read_text(encoding='utf-8'))
+            except Exception as e:
+                print(f"⚠️  Could not read state file {self.state_path}: {e}")
+        return {'version': 0, 'last_hash': None, 'versions': []}
+
+    def _save_state(self):
+        """Write the state file atomically"""
+        tmp_path = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        tmp_path.write_text(json.dumps(self.state, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.state_path)
+
+    def _matches(self, path: Path) -> bool:
+        """Only consider regular files matching the pattern (skip hidden/temp files)"""
+        return (not path.name.startswith('.')
+                and fnmatch.fnmatch(path.name, self.pattern)
+                and path.is_file()
+                and path.resolve() not in self._ignored)
+
+    def _signature(self, path: Path) -> Optional[Tuple[int, float]]:
+        try:
+            stat = path.stat()
+            return (stat.st_size, stat.st_mtime)
+        except OSError:
+            return None
+
+    def notify(self, path: Path):
+        """Record that a file changed; it is processed once it stops changing"""
+        path = Path(path)
+        if not self._matches(path):
+            return
+        signature = self._signature(path)
+        if signature is None:
+            return
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                self._pending[path] = (signature, time.time())
+
+    def _scan(self):
+        """Polling fallback: notice files whose size or mtime changed since the last scan"""
+        for path in self.watch_dir.iterdir():
+            if not self._matches(path):
+                continue
+            signature = self._signature(path)
+            if signature is not None and self._seen.get(path) != signature:
+                self._seen[path] = signature
+                self.notify(path)
+
+    def _start_observer(self) -> bool:
+        """Use watchdog (inotify/FSEvents) when available"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.notify(Path(event.src_path))
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    watcher.notify(Path(event.src_path))
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher.notify(Path(event.dest_path))
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), str(self.watch_dir), recursive=False)
+        self._observer.start()
+        return True
+
+    def _ready_paths(self):
+        """Pending files whose size and mtime have been stable for the debounce window"""
+        now = time.time()
+        ready = []
+        with self._lock:
+            for path, (signature, since) in list(self._pending.items()):
+                current = self._signature(path)
+                if current is None:
+                    del self._pending[path]
+                elif current != signature:
+                    self._pending[path] = (current, now)
+                elif now - since >= self.debounce_seconds:
+                    ready.append(path)
+                    del self._pending[path]
+        return ready
+
+    def process(self, path: Path) -> bool:
+        """Run the pipeline for a settled file unless its content was already published"""
+        file_hash = file_sha256(path)
+        if file_hash == self.state.get('last_hash'):
+            print(f"⏭️  {path.name} unchanged (sha256 {file_hash[:12]}), skipping")
+            return False
+
+        print(f"🔄 Processing {path.name} (sha256 {file_hash[:12]})...")
+        start_time = time.time()
+        try:
+            rows = self.reloader.reload(str(path))
+        except Exception as e:
+            print(f"❌ Ingestion of {path.name} failed: {e}")
+            return False
+
+        version = self.state.get('version', 0) + 1
+        self.state['version'] = version
+        self.state['last_hash'] = file_hash
+        self.state.setdefault('versions', []).append({
+            'version': version,
+            'file': path.name,
+            'sha256': file_hash,
+            'rows': rows,
+            'sink': self.reloader.sink,
+            'published_at': datetime.now().isoformat(timespec='seconds'),
+            'duration_seconds': round(time.time() - start_time, 2)
+        })
+        self._save_state()
+
+        print(f"✅ Published dataset version {version}: {rows:,} rows in {time.time() - start_time:.1f}s")
+        return True
+
+    def run(self):
+        """Watch the folder until interrupted"""
+        if not self.watch_dir.is_dir():
+            raise ValueError(f"Watch directory '{self.watch_dir}' does not exist")
+
+        using_events = self._start_observer()
+        print(f"👀 Watching {self.watch_dir} for '{self.pattern}' "
+              f"({'filesystem events' if using_events else f'polling every {self.poll_interval}s'}, "
+              f"debounce {self.debounce_seconds}s)")
+
+        # Files already in the folder are checked once at startup; the hash skips known content
+        self._scan()
+
+        try:
+            while True:
+                if not using_events:
+                    self._scan()
+                for path in self._ready_paths():
+                    self.process(path)
+                time.sleep(min(self.poll_interval, 1.0) if using_events else self.poll_interval)
+        finally:
+            if self._observer:
+                self._observer.stop()
+                self._observer.join()
+
+def main():
+    """Main function to run the ingestion service"""
+    parser = argparse.ArgumentParser(
+        description='Watch a folder for MIS exports and publish new dataset versions',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--watch-dir', '-w', default=os.getenv('MIS_WATCH_DIR', '.'),
+                        help='Directory to watch (default: MIS_WATCH_DIR or current directory)')
+    parser.add_argument('--pattern', default='*.csv', help="File name pattern to ingest (default: '*.csv')")
+    parser.add_argument('--debounce', type=float, default=5.0,
+                        help='Seconds a file must stay unchanged before it is processed (default: 5)')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Polling interval when watchdog is not installed (default: 2)')
+    parser.add_argument('--state-file', help='Where to record published versions (default: <watch-dir>/.ingest_state.json)')
+    parser.add_argument('--sink', choices=['csv', 'duckdb', 'sqlite', 'postgres'],
+                        help='Target (default: MIS_RELOAD_SINK or postgres)')
+    parser.add_argument('--database', help='Database file or connection string (default: DATABASE_URL)')
+    parser.add_argument('--output', '-o', help='Output CSV for the csv sink (default: clean_mis_long.csv)')
+    parser.add_argument('--reader', choices=['pandas', 'arrow'], help='CSV reader backend (default: pandas)')
+
+    args = parser.parse_args()
+
+    reloader = DatasetReloader(sink=args.sink, database=args.database,
+                               output_path=args.output, reader=args.reader)
+    watcher = IngestWatcher(args.watch_dir, reloader, pattern=args.pattern,
+                            debounce_seconds=args.debounce, poll_interval=args.poll_interval,
+                            state_path=args.state_file)
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping ingestion service")
+    except Exception as e:
+        print(f"❌ Ingestion service failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
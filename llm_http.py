@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Pooled HTTP Client for Local LLM Backends
+One keep-alive session per backend (scheme, host and port), shared by every
+summary, status check and model list. Requests get connect/read timeouts and
+are retried with jittered exponential backoff when the backend is unreachable
+or busy. Per-call latency and connection-reuse counters are kept per backend.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to open a connection, and to wait for the response (or the next chunk of a stream)
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '120'))
+
+# Retries after a connection failure or a busy response, and the backoff before the first one
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))
+LLM_RETRY_MAX_DELAY = 10.0
+
+# Keep-alive connections per backend
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '8'))
+
+# Responses meaning the backend didn't start on the request, so it's safe to send again
+RETRY_STATUSES = {429, 502, 503, 504}
+
+class LLMHttpClient:
+    """Keep-alive session for one LLM backend with retries and call statistics"""
+
+    def __init__(self, origin: str, pool_size: int = LLM_POOL_SIZE, max_retries: int = LLM_MAX_RETRIES,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT):
+        self.origin = origin
+        self.max_retries = max_retries
+        self.timeout = (connect_timeout, read_timeout)
+
+        # Retries are handled in request() so they can be jittered and counted
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'errors': 0,
+            'retries': 0,
+            'total_latency_ms': 0.0,
+            'max_latency_ms': 0.0,
+            'last_latency_ms': None
+        }
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before retry number attempt (0-based): full jitter, or the server's Retry-After"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), LLM_RETRY_MAX_DELAY)
+        return random.uniform(0, min(LLM_RETRY_BACKOFF * 2 ** attempt, LLM_RETRY_MAX_DELAY))
+
+    def request(self, method: str, url: str, timeout: Any = None, retries: Optional[int] = None,
+                **kwargs) -> requests.Response:
+        """Send a request over the pooled session
+
+        Connection failures and busy responses (429/502/503/504) are retried; a
+        read timeout isn't, since the backend may already be generating. Latency
+        is measured to the response headers, so for stream=True it is the time
+        to the first byte. The final response is returned whatever its status.
+        """
+        retries = self.max_retries if retries is None else retries
+        start_time = time.time()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+                except requests.exceptions.ConnectionError:
+                    # Includes an idle keep-alive connection the server has since closed
+                    if attempt >= retries:
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                        break
+                    delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                    response.close()
+                attempt += 1
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(delay)
+        except requests.exceptions.RequestException:
+            self._record(start_time, failed=True)
+            raise
+        self._record(start_time, failed=response.status_code >= 400)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, start_time: float, failed: bool):
+        latency_ms = (time.time() - start_time) * 1000
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['errors'] += int(failed)
+            self._stats['total_latency_ms'] += latency_ms
+            self._stats['max_latency_ms'] = max(self._stats['max_latency_ms'], latency_ms)
+            self._stats['last_latency_ms'] = latency_ms
+
+    def stats(self) -> Dict[str, Any]:
+        """Call counts, latency, and how many HTTP requests reused a kept-alive connection"""
+        # urllib3 counts requests sent and connections opened per connection pool
+        pools = self.adapter.poolmanager.pools
+        http_requests = connections_opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                http_requests += pool.num_requests
+                connections_opened += pool.num_connections
+
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats['calls']
+        stats.update({
+            'avg_latency_ms': round(stats['total_latency_ms'] / calls, 1) if calls else None,
+            'max_latency_ms': round(stats['max_latency_ms'], 1),
+            'last_latency_ms': round(stats['last_latency_ms'], 1) if stats['last_latency_ms'] is not None else None,
+            'http_requests': http_requests,
+            'connections_opened': connections_opened,
+            'connections_reused': max(http_requests - connections_opened, 0)
+        })
+        del stats['total_latency_ms']
+        return stats
+
+    def close(self):
+        self.session.close()
+
+# One client per backend, shared across threads
+_clients: Dict[str, LLMHttpClient] = {}
+_clients_lock = threading.Lock()
+
+def get_llm_http_client(url: str) -> LLMHttpClient:
+    """Shared client for the backend serving url (keyed by scheme, host and port)"""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    with _clients_lock:
+        client = _clients.get(origin)
+        if client is None:
+            client = _clients[origin] = LLMHttpClient(origin)
+        return client
+
+def get_llm_http_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics for every backend contacted so far, keyed by origin"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.origin: client.stats() for client in clients}
+
+def close_llm_http_clients():
+    """Close all pooled connections"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -7,26 +7,56 @@ Supports multiple local LLM backends for result summarization.
 import json
 import subprocess
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 import os
+from llm_http import get_llm_http_client, get_llm_http_stats
+from summary_cache import SummaryCache, get_summary_cache
+from result_digest import DIGEST_TOKEN_BUDGET, digest_results
+
+OLLAMA_URL = "http://localhost:11434"  # Default Ollama URL
+LLAMAFILE_URL = "http://localhost:8080/v1/chat/completions"  # llamafile typically runs on port 8080
+
+# Status checks and model lists: short timeout, no retries
+STATUS_TIMEOUT = 5
+
+# Part of the summary cache key; bump it whenever build_prompt changes
+PROMPT_VERSION = 2
+
+# Returned when the model answers with no content; shown to the user but never cached
+NO_RESPONSE = "No response generated"
+
+BACKEND_NAMES = {"ollama": "Ollama", "llamafile": "llamafile", "openai_compatible": "local LLM"}
 
 class LocalLLMSummarizer:
     """Interface for various local LLM backends."""
     
-    def __init__(self, backend: str = "ollama", model: str = "llama3.2"):
+    def __init__(self, backend: str = "ollama", model: str = "llama3.2",
+                 cache: Optional[SummaryCache] = None, use_cache: bool = True,
+                 digest_tokens: Optional[int] = None):
         self.backend = backend.lower()
         self.model = model
-        self.base_url = "http://localhost:11434"  # Default Ollama URL
+        self.base_url = OLLAMA_URL
+        self.cache = (cache or get_summary_cache()) if use_cache else None
+        # Token budget for the result digest in the prompt; 0 sends the raw result table instead
+        self.digest_tokens = DIGEST_TOKEN_BUDGET if digest_tokens is None else digest_tokens
     
-    def summarize_query_results(self, query: str, sql: str, results: str) -> str:
-        """Generate a summary of query results using local LLM."""
+    def build_prompt(self, query: str, sql: str, results: str) -> str:
+        """Prompt asking the model to summarize one query's results.
         
-        prompt = f"""You are a business analyst helping to interpret retail store data. 
+        The results are condensed into a digest of statistics (see result_digest.py)
+        so the prompt stays small however many rows the query returned.
+        """
+        if self.digest_tokens:
+            heading = "RESULTS (statistics computed from every returned row):"
+            results = digest_results(results, self.digest_tokens)
+        else:
+            heading = "RESULTS:"
+        return f"""You are a business analyst helping to interpret retail store data. 
 
 QUERY: {query}
 SQL: {sql}
 
-RESULTS:
+{heading}
 {results}
 
 Please provide a concise business summary (2-3 paragraphs) that includes:
@@ -36,104 +66,193 @@ Please provide a concise business summary (2-3 paragraphs) that includes:
 
 Focus on business value and avoid technical jargon. Be specific with numbers and store names where relevant.
 """
+    
+    def _cache_key(self, query: str, sql: str, results: str) -> str:
+        return SummaryCache.make_key(query, sql, results, self.backend, self.model,
+                                     f"{PROMPT_VERSION}/digest-{self.digest_tokens}")
+    
+    def summarize_query_results(self, query: str, sql: str, results: str, refresh: bool = False) -> str:
+        """Generate a summary of query results using local LLM.
         
-        if self.backend == "ollama":
-            return self._query_ollama(prompt)
-        elif self.backend == "llamafile":
-            return self._query_llamafile(prompt)
-        elif self.backend == "openai_compatible":
-            return self._query_openai_compatible(prompt)
-        else:
+        A summary of the same results by the same model comes from the cache
+        unless refresh is set. Failures are returned as an error message; they
+        and empty answers aren't cached.
+        """
+        if self.backend not in BACKEND_NAMES:
             raise ValueError(f"Unsupported backend: {self.backend}")
-    
-    def _query_ollama(self, prompt: str) -> str:
-        """Query Ollama local LLM using the chat API."""
+        
+        key = self._cache_key(query, sql, results)
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(key)
+            if cached:
+                return cached
+        
+        prompt = self.build_prompt(query, sql, results)
         try:
-            url = f"{self.base_url}/api/chat"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "stream": False
-            }
-            
-            response = requests.post(url, json=payload, timeout=120)
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result.get("message", {}).get("content", "No response generated")
-                return content
+            if self.backend == "ollama":
+                summary = self._query_ollama(prompt)
+            elif self.backend == "llamafile":
+                summary = self._query_llamafile(prompt)
             else:
-                return f"Ollama API error: {response.status_code} - {response.text}"
-                
+                summary = self._query_openai_compatible(prompt)
         except requests.exceptions.RequestException as e:
-            return f"Error connecting to Ollama: {e}"
+            return f"Error connecting to {BACKEND_NAMES[self.backend]}: {e}"
         except Exception as e:
             return f"Error generating summary: {e}"
+        
+        self._cache_summary(key, summary)
+        return summary or NO_RESPONSE
     
-    def _query_llamafile(self, prompt: str) -> str:
-        """Query llamafile local LLM."""
-        try:
-            # llamafile typically runs on port 8080
-            url = "http://localhost:8080/v1/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1000
-            }
+    def stream_query_results(self, query: str, sql: str, results: str, refresh: bool = False) -> Iterator[str]:
+        """Generate the summary incrementally, yielding text as the model produces it.
+        
+        A cached summary is yielded whole. Raises requests.RequestException or
+        RuntimeError if the backend fails. Closing the iterator early closes the
+        connection, which stops generation; only complete, non-empty summaries
+        are cached.
+        """
+        if self.backend not in BACKEND_NAMES:
+            raise ValueError(f"Unsupported backend: {self.backend}")
+        
+        key = self._cache_key(query, sql, results)
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(key)
+            if cached:
+                return iter([cached])
+        
+        prompt = self.build_prompt(query, sql, results)
+        if self.backend == "ollama":
+            tokens = self._stream_ollama(prompt)
+        elif self.backend == "llamafile":
+            tokens = self._stream_openai_compatible(LLAMAFILE_URL, prompt)
+        else:
+            tokens = self._stream_openai_compatible(
+                os.getenv("LOCAL_LLM_URL", "http://localhost:8000/v1/chat/completions"), prompt)
+        return self._cache_stream(key, tokens)
+    
+    def _cache_summary(self, key: str, summary: Optional[str]):
+        """Cache a summary unless the model produced nothing."""
+        if self.cache is not None and summary and summary.strip() and summary != NO_RESPONSE:
+            self.cache.put(key, summary, self.backend, self.model)
+    
+    def _cache_stream(self, key: str, tokens: Iterator[str]) -> Iterator[str]:
+        """Pass tokens through, caching the summary once the stream completes."""
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        self._cache_summary(key, "".join(parts))
+    
+    def _stream_ollama(self, prompt: str) -> Iterator[str]:
+        """Stream from Ollama's chat API, which sends one JSON object per line."""
+        url = f"{self.base_url}/api/chat"
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": True
+        }
+        
+        with get_llm_http_client(url).post(url, json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Ollama API error: {response.status_code} - {response.text}")
             
-            response = requests.post(url, json=payload, timeout=120)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                content = chunk.get("message", {}).get("content")
+                if content:
+                    yield content
+                if chunk.get("done"):
+                    break
+    
+    def _stream_openai_compatible(self, url: str, prompt: str) -> Iterator[str]:
+        """Stream from an OpenAI-compatible chat completions API (llamafile, vLLM, llama.cpp, ...)."""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 1000,
+            "stream": True
+        }
+        
+        with get_llm_http_client(url).post(url, json=payload, stream=True) as response:
             response.raise_for_status()
             
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-            
-        except requests.exceptions.RequestException as e:
-            return f"Error connecting to llamafile: {e}"
-        except Exception as e:
-            return f"Error generating summary: {e}"
+            # Server-Sent Events: "data: {...}" lines, ending with "data: [DONE]"
+            for line in response.iter_lines():
+                line = line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                content = (choices[0].get("delta") or {}).get("content") if choices else None
+                if content:
+                    yield content
     
-    def _query_openai_compatible(self, prompt: str) -> str:
+    def _query_ollama(self, prompt: str) -> str:
+        """Query Ollama local LLM using the chat API."""
+        url = f"{self.base_url}/api/chat"
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False
+        }
+        
+        response = get_llm_http_client(url).post(url, json=payload)
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama API error: {response.status_code} - {response.text}")
+        result = response.json()
+        return result.get("message", {}).get("content") or NO_RESPONSE
+    
+    def _query_llamafile(self, prompt: str) -> str:
+        """Query llamafile local LLM."""
+        return self._query_openai_compatible(prompt, LLAMAFILE_URL)
+    
+    def _query_openai_compatible(self, prompt: str, url: Optional[str] = None) -> str:
         """Query any OpenAI-compatible local LLM."""
-        try:
-            # Configure your local LLM endpoint
-            url = os.getenv("LOCAL_LLM_URL", "http://localhost:8000/v1/chat/completions")
-            
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1000
-            }
-            
-            response = requests.post(url, json=payload, timeout=120)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-            
-        except requests.exceptions.RequestException as e:
-            return f"Error connecting to local LLM: {e}"
-        except Exception as e:
-            return f"Error generating summary: {e}"
+        # Configure your local LLM endpoint
+        url = url or os.getenv("LOCAL_LLM_URL", "http://localhost:8000/v1/chat/completions")
+        
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 1000
+        }
+        
+        response = get_llm_http_client(url).post(url, json=payload)
+        response.raise_for_status()
+        
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
 
 def check_ollama_status() -> bool:
     """Check if Ollama is running and has the model."""
     try:
-        response = requests.get("http://localhost:11434/api/version", timeout=5)
+        response = get_llm_http_client(OLLAMA_URL).get(f"{OLLAMA_URL}/api/version",
+                                                      timeout=STATUS_TIMEOUT, retries=0)
         if response.status_code == 200:
             return True
     except:
         pass
     
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = get_llm_http_client(OLLAMA_URL).get(f"{OLLAMA_URL}/api/tags",
+                                                      timeout=STATUS_TIMEOUT, retries=0)
         return response.status_code == 200
     except:
         return False
@@ -141,7 +260,8 @@ def check_ollama_status() -> bool:
 def get_available_models() -> list:
     """Get list of available Ollama models."""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = get_llm_http_client(OLLAMA_URL).get(f"{OLLAMA_URL}/api/tags",
+                                                      timeout=STATUS_TIMEOUT, retries=0)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [model["name"] for model in models]
@@ -158,6 +278,9 @@ if __name__ == "__main__":
         print("✅ Ollama is running")
         models = get_available_models()
         print(f"📋 Available models: {models}")
+        for origin, stats in get_llm_http_stats().items():
+            print(f"🔌 {origin}: {stats['calls']} calls, {stats['connections_reused']} reused connections, "
+                  f"avg {stats['avg_latency_ms']} ms")
     else:
         print("❌ Ollama is not running. Please start it first.")
         print("💡 Install Ollama: https://ollama.ai")
@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Parallel Migration Engine for BT MIS Analytics
+Splits a dataset into row ranges and loads them concurrently, recording
+committed ranges in a checkpoint so reruns resume where they stopped.
+
+A failing batch is bisected to isolate bad rows in O(log n) round trips
+instead of falling back to one insert per row.
+
+StreamingMigrator copies a table straight from a source database or PostgREST
+endpoint into Postgres without going through a CSV.
+"""
+
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+import pandas as pd
+
+CHECKPOINT_TABLE = 'mis_migration_checkpoints'
+
+def compute_run_id(path: str) -> str:
+    """Identify a migration run by the content of its source file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def bisect_load(load_fn: Callable[[int, int], None], start: int, end: int,
+                failed: List[Tuple[int, str]],
+                is_row_error: Callable[[Exception], bool] = lambda e: True) -> int:
+    """Load rows [start, end); on failure split the range in half and retry each side
+
+    load_fn(start, end) must either load the rows or raise without side effects.
+    Rows that still fail on their own are appended to failed as (row, error).
+    Errors for which is_row_error() is False (lost connection, missing table)
+    are re-raised instead of bisected. Returns the number of rows loaded.
+    """
+    try:
+        load_fn(start, end)
+        return end - start
+    except Exception as e:
+        if not is_row_error(e):
+            raise
+        if end - start == 1:
+            failed.append((start, str(e)))
+            return 0
+    middle = (start + end) // 2
+    return (bisect_load(load_fn, start, middle, failed, is_row_error)
+            + bisect_load(load_fn, middle, end, failed, is_row_error))
+
+class PostgresRangeWriter:
+    """Loads row ranges of a DataFrame into Postgres over its own connection
+
+    Each range is loaded in one transaction together with its checkpoint row,
+    so a range is either fully committed and recorded or not at all. Bisection
+    uses savepoints inside that transaction.
+    """
+
+    def __init__(self, connection_string: str, df: pd.DataFrame, run_id: str, table: str = 'mis_long'):
+        import psycopg2
+
+        self.df = df
+        self.run_id = run_id
+        self.table = table
+        self.columns = [col for col in df.columns if col != 'id']
+        self.connection = psycopg2.connect(connection_string)
+        self.cursor = self.connection.cursor()
+
+    def _copy_rows(self, start: int, end: int):
+        """COPY rows [start, end) inside a savepoint; roll the savepoint back on failure"""
+        buffer = io.StringIO()
+        self.df.iloc[start:end][self.columns].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        self.cursor.execute("SAVEPOINT batch")
+        try:
+            self.cursor.copy_expert(
+                f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        except Exception:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT batch")
+            raise
+        self.cursor.execute("RELEASE SAVEPOINT batch")
+
+    def load_range(self, start: int, end: int) -> Tuple[int, List[Tuple[int, str]]]:
+        """Load a range and checkpoint it atomically"""
+        import psycopg2
+
+        failed: List[Tuple[int, str]] = []
+        try:
+            loaded = bisect_load(
+                self._copy_rows, start, end, failed,
+                is_row_error=lambda e: isinstance(e, (psycopg2.DataError, psycopg2.IntegrityError))
+            )
+            self.cursor.execute(
+                f"INSERT INTO {CHECKPOINT_TABLE} (run_id, range_start, range_end, rows_loaded, rows_failed) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (self.run_id, start, end, loaded, len(failed))
+            )
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return loaded, failed
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
+
+class SupabaseRangeWriter:
+    """Loads row ranges of a list of records through PostgREST
+
+    PostgREST has no multi-request transactions, so each successful sub-batch
+    is committed immediately and the range is checkpointed once it finishes.
+    A crash in the middle of a range can re-send that range on resume.
+    """
+
+    def __init__(self, supabase_url: str, supabase_key: str, records: List[Dict[str, Any]],
+                 table: str = 'mis_long'):
+        from supabase import create_client
+
+        self.records = records
+        self.table = table
+        self.supabase = create_client(supabase_url, supabase_key)
+
+    def _insert_rows(self, start: int, end: int):
+        self.supabase.table(self.table).insert(self.records[start:end]).execute()
+
+    def load_range(self, start: int, end: int) -> Tuple[int, List[Tuple[int, str]]]:
+        failed: List[Tuple[int, str]] = []
+        # Postgres data (22xxx) and constraint (23xxx) errors are row problems worth bisecting
+        loaded = bisect_load(
+            self._insert_rows, start, end, failed,
+            is_row_error=lambda e: str(getattr(e, 'code', '')).startswith(('22', '23'))
+        )
+        return loaded, failed
+
+    def close(self):
+        pass
+
+class PostgresCheckpointStore:
+    """Committed ranges are rows in the checkpoint table (written by PostgresRangeWriter)"""
+
+    def __init__(self, connection_string: str):
+        self.connection_string = connection_string
+
+    def completed_ranges(self, run_id: str) -> Dict[Tuple[int, int], int]:
+        """Committed (start, end) ranges of a run and the rows each loaded"""
+        import psycopg2
+
+        connection = psycopg2.connect(self.connection_string)
+        try:
+            with connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                            run_id TEXT NOT NULL,
+                            range_start INTEGER NOT NULL,
+                            range_end INTEGER NOT NULL,
+                            rows_loaded INTEGER NOT NULL,
+                            rows_failed INTEGER NOT NULL DEFAULT 0,
+                            committed_at TIMESTAMP DEFAULT NOW(),
+                            PRIMARY KEY (run_id, range_start)
+                        )
+                    """)
+                    cursor.execute(
+                        f"SELECT range_start, range_end, rows_loaded FROM {CHECKPOINT_TABLE} WHERE run_id = %s",
+                        (run_id,)
+                    )
+                    return {(start, end): loaded for start, end, loaded in cursor.fetchall()}
+        finally:
+            connection.close()
+
+    def mark_completed(self, run_id: str, start: int, end: int, loaded: int, failed: int):
+        """Already recorded in the load transaction"""
+
+class FileCheckpointStore:
+    """Checkpoint kept in a local JSON file, for targets without transactions (e.g. PostgREST)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def completed_ranges(self, run_id: str) -> Dict[Tuple[int, int], int]:
+        with self._lock:
+            return {(r[0], r[1]): r[2] for r in self._read().get(run_id, [])}
+
+    def mark_completed(self, run_id: str, start: int, end: int, loaded: int, failed: int):
+        with self._lock:
+            state = self._read()
+            state.setdefault(run_id, []).append([start, end, loaded, failed])
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+
+def pending_ranges(total_rows: int, done: Iterable[Tuple[int, int]], range_size: int) -> List[Tuple[int, int]]:
+    """Ranges of at most range_size rows covering the offsets in [0, total_rows) not yet in done
+
+    Works on the offsets covered rather than exact (start, end) pairs, so a
+    run resumed with a different range size never reloads committed rows.
+    """
+    pending = []
+    position = 0
+    for start, end in sorted(done) + [(total_rows, total_rows)]:
+        for gap_start in range(position, min(start, total_rows), range_size):
+            pending.append((gap_start, min(gap_start + range_size, start, total_rows)))
+        position = max(position, end)
+    return pending
+
+class ParallelMigrator:
+    """Runs range writers on worker threads and skips rows already checkpointed"""
+
+    def __init__(self, writer_factory: Callable[[], Any], checkpoint, run_id: str,
+                 range_size: int = 5000, workers: int = 4):
+        self.writer_factory = writer_factory
+        self.checkpoint = checkpoint
+        self.run_id = run_id
+        self.range_size = range_size
+        self.workers = workers
+
+    def run(self, total_rows: int) -> Dict[str, Any]:
+        """Load all pending ranges and return a summary
+
+        summary['already_loaded'] counts rows committed by earlier attempts of
+        the same run; summary['loaded'] only the rows loaded now.
+        """
+        done = self.checkpoint.completed_ranges(self.run_id)
+        pending = pending_ranges(total_rows, done, self.range_size)
+        already_loaded = sum(done.values())
+
+        print(f"🧭 Run {self.run_id}: {len(done)} ranges ({already_loaded} rows) already committed, "
+              f"{len(pending)} ranges to load with {self.workers} workers")
+
+        work: "queue.Queue[Tuple[int, int]]" = queue.Queue()
+        for r in pending:
+            work.put(r)
+
+        summary = {'loaded': 0, 'already_loaded': already_loaded, 'failed_rows': [], 'failed_ranges': [],
+                   'ranges_loaded': 0}
+        if not pending:
+            print("✅ Nothing left to load; every range of this run is committed")
+            summary['elapsed_seconds'] = 0.0
+            return summary
+
+        lock = threading.Lock()
+        start_time = time.time()
+
+        def worker():
+            try:
+                writer = self.writer_factory()
+            except Exception as e:
+                print(f"❌ Worker could not connect: {e}")
+                return
+            try:
+                while True:
+                    try:
+                        start, end = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        loaded, failed = writer.load_range(start, end)
+                        self.checkpoint.mark_completed(self.run_id, start, end, loaded, len(failed))
+                    except Exception as e:
+                        print(f"❌ Range {start}-{end} failed: {e}")
+                        with lock:
+                            summary['failed_ranges'].append((start, end, str(e)))
+                        continue
+                    with lock:
+                        summary['loaded'] += loaded
+                        summary['failed_rows'].extend(failed)
+                        summary['ranges_loaded'] += 1
+                        print(f"📦 Range {start}-{end}: {loaded} rows"
+                              f"{f', {len(failed)} bad rows isolated' if failed else ''} "
+                              f"({summary['ranges_loaded']}/{len(pending)})")
+            finally:
+                writer.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(min(self.workers, len(pending)) or 1)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        elapsed = time.time() - start_time
+        summary['elapsed_seconds'] = round(elapsed, 2)
+        print(f"🎉 Loaded {summary['loaded']} rows in {elapsed:.2f}s "
+              f"({summary['loaded'] / max(elapsed, 1e-9):,.0f} rows/s)")
+        for row, error in summary['failed_rows'][:10]:
+            print(f"⚠️  Row {row} rejected: {error}")
+        if summary['failed_ranges']:
+            print(f"⚠️  {len(summary['failed_ranges'])} ranges failed; rerun to retry them")
+        return summary
+
+def _copy_text_value(value) -> str:
+    """Render one value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+class PostgresKeysetReader:
+    """Reads a table from a source Postgres in id order, one page per round trip
+
+    Keyset pagination (WHERE id > last ORDER BY id LIMIT n) uses the primary key
+    index for every page, unlike OFFSET which rescans all skipped rows.
+    """
+
+    def __init__(self, connection_string: str, table: str = 'mis_long', page_size: int = 10000):
+        import psycopg2
+
+        self.table = table
+        self.page_size = page_size
+        self.connection = psycopg2.connect(connection_string)
+        self.connection.set_session(readonly=True, autocommit=True)
+
+    def columns(self) -> List[str]:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM {self.table} LIMIT 0")
+            return [desc[0] for desc in cursor.description]
+
+    def count(self, after_id: int) -> int:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table} WHERE id > %s", (after_id,))
+            return cursor.fetchone()[0]
+
+    def pages(self, columns: List[str], after_id: int):
+        """Yield lists of row tuples; id must be the first column"""
+        sql = (f"SELECT {', '.join(columns)} FROM {self.table} "
+               f"WHERE id > %s ORDER BY id LIMIT %s")
+        with self.connection.cursor() as cursor:
+            while True:
+                cursor.execute(sql, (after_id, self.page_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    return
+                yield rows
+                after_id = rows[-1][0]
+                if len(rows) < self.page_size:
+                    return
+
+    def close(self):
+        self.connection.close()
+
+class PostgrestKeysetReader:
+    """Reads a table through a PostgREST endpoint (e.g. Supabase) in id order"""
+
+    def __init__(self, supabase_url: str, supabase_key: str, table: str = 'mis_long',
+                 page_size: int = 1000, timeout: float = 60.0):
+        import requests
+
+        self.url = f"{supabase_url.rstrip('/')}/rest/v1/{table}"
+        self.page_size = page_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'apikey': supabase_key,
+            'Authorization': f"Bearer {supabase_key}"
+        })
+
+    def columns(self) -> List[str]:
+        response = self.session.get(self.url, params={'select': '*', 'limit': 1}, timeout=self.timeout)
+        response.raise_for_status()
+        rows = response.json()
+        return list(rows[0].keys()) if rows else []
+
+    def count(self, after_id: int) -> int:
+        response = self.session.get(
+            self.url, params={'select': 'id', 'id': f'gt.{after_id}'},
+            headers={'Prefer': 'count=exact', 'Range': '0-0'}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        # Content-Range: 0-0/154440 (or */0 when empty)
+        return int(response.headers.get('Content-Range', '*/0').split('/')[-1])
+
+    def pages(self, columns: List[str], after_id: int):
+        """Yield lists of row tuples; id must be the first column"""
+        # PostgREST caps responses at its max-rows setting (1000 on Supabase), so a
+        # short page does not mean the end; only an empty page does
+        while True:
+            response = self.session.get(self.url, params={
+                'select': ','.join(columns),
+                'id': f'gt.{after_id}',
+                'order': 'id.asc',
+                'limit': self.page_size
+            }, timeout=self.timeout)
+            response.raise_for_status()
+            records = response.json()
+            if not records:
+                return
+            yield [tuple(record.get(col) for col in columns) for record in records]
+            after_id = records[-1]['id']
+
+    def close(self):
+        self.session.close()
+
+class PostgresCopyWriter:
+    """Appends pages to a destination table with COPY, committing each page"""
+
+    def __init__(self, connection_string: str, table: str = 'mis_long'):
+        import psycopg2
+
+        self.table = table
+        self.connection = psycopg2.connect(connection_string)
+        self.cursor = self.connection.cursor()
+
+    def columns(self) -> List[str]:
+        self.cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position",
+            (self.table,)
+        )
+        columns = [row[0] for row in self.cursor.fetchall()]
+        self.connection.commit()
+        return columns
+
+    def max_id(self) -> int:
+        self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {self.table}")
+        max_id = self.cursor.fetchone()[0]
+        self.connection.commit()
+        return max_id
+
+    def write(self, columns: List[str], rows: List[tuple]):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_text_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        try:
+            self.cursor.copy_expert(f"COPY {self.table} ({', '.join(columns)}) FROM STDIN", buffer)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def finish(self):
+        """Move the id sequence past the copied ids so later inserts don't collide"""
+        self.cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(MAX(id), 1)) FROM {self.table}",
+            (self.table,)
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
+
+class StreamingMigrator:
+    """Pipes a source table into a destination: a reader thread fetches pages
+    while the main thread COPYs the previous ones
+
+    At most queue_size pages are held in memory. Ids are copied as-is and every
+    page is committed, so a rerun resumes after the highest id already present
+    in the destination.
+    """
+
+    def __init__(self, reader, writer, queue_size: int = 4, report_every: float = 5.0):
+        self.reader = reader
+        self.writer = writer
+        self.queue_size = queue_size
+        self.report_every = report_every
+
+    def run(self) -> Dict[str, Any]:
+        """Copy all rows with an id above the destination's highest id and return a summary"""
+        source_columns = set(self.reader.columns())
+        if 'id' not in source_columns:
+            raise ValueError("Source table has no id column to paginate on")
+        # id goes first: the readers take the next page's lower bound from it
+        columns = ['id'] + [col for col in self.writer.columns() if col in source_columns and col != 'id']
+
+        after_id = self.writer.max_id()
+        total = self.reader.count(after_id)
+        print(f"🧭 Streaming {total:,} rows with id > {after_id} ({len(columns)} columns)")
+
+        pages: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer_error: List[BaseException] = []
+        sentinel = object()
+
+        def put(item) -> bool:
+            # Block while the queue is full, but give up if the consumer has stopped
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for page in self.reader.pages(columns, after_id):
+                    if not put(page):
+                        return
+            except BaseException as e:
+                producer_error.append(e)
+            finally:
+                put(sentinel)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        start_time = time.time()
+        last_report = start_time
+        copied = 0
+        producer.start()
+
+        try:
+            while True:
+                page = pages.get()
+                if page is sentinel:
+                    break
+                self.writer.write(columns, page)
+                copied += len(page)
+
+                now = time.time()
+                if now - last_report >= self.report_every:
+                    last_report = now
+                    rate = copied / max(now - start_time, 1e-9)
+                    remaining = max(total - copied, 0) / max(rate, 1e-9)
+                    print(f"📦 {copied:,}/{total:,} rows ({copied / max(total, 1):.0%}), "
+                          f"{rate:,.0f} rows/s, ~{remaining:.0f}s left")
+        finally:
+            stop.set()
+            producer.join()
+
+        if producer_error:
+            raise producer_error[0]
+
+        if copied:
+            self.writer.finish()
+
+        elapsed = time.time() - start_time
+        print(f"🎉 Streamed {copied:,} rows in {elapsed:.2f}s ({copied / max(elapsed, 1e-9):,.0f} rows/s)")
+        return {'copied': copied, 'resumed_after_id': after_id, 'elapsed_seconds': round(elapsed, 2)}
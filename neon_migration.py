@@ -1,33 +1,71 @@
 #!/usr/bin/env python3
 """
 Neon PostgreSQL Migration Script for BT MIS Analytics
-Migrates data from Supabase to Neon PostgreSQL
+Loads clean_mis_long.csv into Neon PostgreSQL, or streams mis_long directly
+from a source database (Postgres or Supabase/PostgREST) with --mode stream
 """
 
+import argparse
+import io
 import pandas as pd
 import os
 from dotenv import load_dotenv
-from postgres_client import PostgreSQLClient
+from postgres_client import (PostgreSQLClient, ensure_fiscal_year_partitions, refresh_rollups,
+                             TABLE_LAYOUT, ROLLUPS_ENABLED)
+from migration_engine import (ParallelMigrator, PostgresRangeWriter, PostgresCheckpointStore, compute_run_id,
+                              StreamingMigrator, PostgresKeysetReader, PostgrestKeysetReader, PostgresCopyWriter)
 import time
 
 # Load environment variables
 load_dotenv()
 
+# Natural key of a tidy row; sync mode upserts on it
+NATURAL_KEY = ['store_name', 'parameter', 'month']
+
 class NeonMigrator:
     def __init__(self):
         self.postgres_client = PostgreSQLClient()
     
-    def create_table_schema(self):
+    def create_table_schema(self, layout: str = None):
         """Create the mis_long table in Neon PostgreSQL"""
         print("📋 Creating table schema in Neon PostgreSQL...")
         
-        if self.postgres_client.create_table():
+        if self.postgres_client.create_table(layout):
             print("✅ Table schema created successfully")
+            if (layout or TABLE_LAYOUT) == 'partitioned' and not self.postgres_client.is_partitioned():
+                print("⚠️  mis_long already exists as a flat table; drop it (or reload with the partitioned layout) to switch")
             return True
         else:
             print("❌ Error creating table schema")
             return False
     
+    def ensure_partitions(self, df: pd.DataFrame = None) -> bool:
+        """Add fiscal-year partitions for the months in df, or for rows parked in the default partition"""
+        if not self.postgres_client.is_partitioned():
+            return True
+        
+        cursor = self.postgres_client.cursor
+        try:
+            if df is not None:
+                months = pd.to_datetime(df['month'])
+                first, last = months.min().date(), months.max().date()
+            else:
+                cursor.execute("SELECT MIN(month), MAX(month) FROM mis_long_default")
+                first, last = cursor.fetchone()
+                if first is None:
+                    return True
+            
+            created = ensure_fiscal_year_partitions(cursor, 'mis_long', first, last)
+            self.postgres_client.connection.commit()
+        except Exception as e:
+            self.postgres_client.connection.rollback()
+            print(f"❌ Could not create partitions: {e}")
+            return False
+        
+        if created:
+            print(f"🗂️  Created partitions: {', '.join(created)}")
+        return True
+    
     def load_csv_data(self, csv_path: str = 'clean_mis_long.csv'):
         """Load and prepare CSV data for migration"""
         print(f"📊 Loading data from {csv_path}...")
@@ -73,6 +111,7 @@ class NeonMigrator:
             print("❌ Could not connect to PostgreSQL")
             return 0
         
+        start_time = time.time()
         total_batches = (len(df) + batch_size - 1) // batch_size
         successful_records = 0
         
@@ -101,9 +140,213 @@ class NeonMigrator:
                 continue
         
         self.postgres_client.disconnect()
-        print(f"🎉 Migration completed! {successful_records}/{len(df)} records migrated successfully")
+        elapsed = time.time() - start_time
+        print(f"🎉 Migration completed! {successful_records}/{len(df)} records migrated successfully in {elapsed:.2f}s")
         return successful_records
     
+    def copy_data(self, df: pd.DataFrame) -> int:
+        """Bulk load data with COPY FROM STDIN from an in-memory CSV buffer"""
+        print(f"🚀 Starting COPY of {len(df)} records...")
+        
+        if not self.postgres_client.connect():
+            print("❌ Could not connect to PostgreSQL")
+            return 0
+        
+        start_time = time.time()
+        
+        # Serialize the whole frame with pandas' C writer; empty fields load as NULL
+        columns = [col for col in df.columns if col != 'id']
+        buffer = io.StringIO()
+        df[columns].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        
+        try:
+            self.postgres_client.cursor.copy_expert(
+                f"COPY mis_long ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            self.postgres_client.connection.commit()
+        except Exception as e:
+            self.postgres_client.connection.rollback()
+            print(f"❌ COPY failed: {e}")
+            return 0
+        finally:
+            self.postgres_client.disconnect()
+        
+        elapsed = time.time() - start_time
+        print(f"🎉 COPY completed! {len(df)} records in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):,.0f} rows/s)")
+        return len(df)
+    
+    def migrate_data_parallel(self, df: pd.DataFrame, run_id: str, workers: int = 4,
+                              range_size: int = 5000) -> int:
+        """Load ranges concurrently over several connections, resuming from checkpoints"""
+        print(f"🚀 Starting parallel migration of {len(df)} records...")
+        
+        connection_string = self.postgres_client.connection_string
+        df = df.reset_index(drop=True)
+        
+        migrator = ParallelMigrator(
+            writer_factory=lambda: PostgresRangeWriter(connection_string, df, run_id),
+            checkpoint=PostgresCheckpointStore(connection_string),
+            run_id=run_id,
+            range_size=range_size,
+            workers=workers
+        )
+        summary = migrator.run(len(df))
+        
+        if summary['failed_ranges']:
+            return 0
+        # A resumed run counts the rows earlier attempts already committed
+        return summary['already_loaded'] + summary['loaded']
+    
+    def refresh_rollups(self) -> bool:
+        """Create or refresh the rollup materialized views after a load"""
+        if not ROLLUPS_ENABLED:
+            return True
+        
+        if not self.postgres_client.connection or self.postgres_client.connection.closed:
+            if not self.postgres_client.connect():
+                print("❌ Could not connect to PostgreSQL")
+                return False
+        
+        start_time = time.time()
+        try:
+            refreshed = refresh_rollups(self.postgres_client.cursor)
+            self.postgres_client.connection.commit()
+        except Exception as e:
+            self.postgres_client.connection.rollback()
+            print(f"⚠️  Could not refresh rollup views: {e}")
+            return False
+        
+        action = "Refreshed" if refreshed else "Created"
+        print(f"📈 {action} rollup views in {time.time() - start_time:.2f}s")
+        return True
+    
+    def stream_from_source(self, source: str, source_key: str = None, page_size: int = 10000,
+                           queue_size: int = 4) -> int:
+        """Copy mis_long from a source Postgres URL or PostgREST base URL, page by page
+        
+        Returns the number of rows copied, or None on failure.
+        """
+        print("🚀 Streaming mis_long from source into Neon...")
+        
+        reader = writer = None
+        try:
+            if source.startswith(('postgres://', 'postgresql://')):
+                reader = PostgresKeysetReader(source, page_size=page_size)
+            else:
+                source_key = source_key or os.getenv('SUPABASE_ANON_KEY')
+                if not source_key:
+                    print("❌ A PostgREST source needs --source-key or SUPABASE_ANON_KEY")
+                    return None
+                # PostgREST caps each response at its max-rows setting anyway
+                reader = PostgrestKeysetReader(source, source_key, page_size=min(page_size, 1000))
+            writer = PostgresCopyWriter(self.postgres_client.connection_string)
+            
+            summary = StreamingMigrator(reader, writer, queue_size=queue_size).run()
+        except Exception as e:
+            print(f"❌ Streaming migration failed: {e}")
+            print("💡 Pages already copied are committed; rerun to resume after the last copied id")
+            return None
+        finally:
+            if reader:
+                reader.close()
+            if writer:
+                writer.close()
+        
+        return summary['copied']
+    
+    def ensure_natural_key(self):
+        """Add row_hash and a unique (store_name, parameter, month) index, removing older duplicates first"""
+        cursor = self.postgres_client.cursor
+        cursor.execute("ALTER TABLE mis_long ADD COLUMN IF NOT EXISTS row_hash TEXT")
+        cursor.execute("SELECT to_regclass('uq_mis_long_natural_key')")
+        if cursor.fetchone()[0] is None:
+            # Earlier full loads may have inserted the same rows several times; keep the newest copy
+            cursor.execute("""
+                DELETE FROM mis_long a
+                USING mis_long b
+                WHERE a.id < b.id
+                  AND a.store_name = b.store_name
+                  AND a.parameter = b.parameter
+                  AND a.month = b.month
+            """)
+            if cursor.rowcount:
+                print(f"🧹 Removed {cursor.rowcount} duplicate rows before adding the natural key")
+            cursor.execute(
+                "CREATE UNIQUE INDEX uq_mis_long_natural_key ON mis_long (store_name, parameter, month)"
+            )
+        self.postgres_client.connection.commit()
+    
+    def sync_data(self, df: pd.DataFrame) -> int:
+        """Upsert only new or changed rows, compared by per-row content hash
+        
+        Returns the number of rows upserted (0 when already up to date), or None on failure.
+        """
+        print(f"🔄 Starting delta sync of {len(df)} records...")
+        
+        if not self.postgres_client.connect():
+            print("❌ Could not connect to PostgreSQL")
+            return None
+        
+        start_time = time.time()
+        columns = [col for col in df.columns if col not in ('id', 'row_hash')]
+        
+        duplicates = df.duplicated(subset=NATURAL_KEY, keep='last')
+        if duplicates.any():
+            print(f"⚠️  Collapsing {duplicates.sum()} source rows that repeat a (store_name, parameter, month) key")
+            df = df[~duplicates]
+        
+        df = df[columns].copy()
+        df['row_hash'] = pd.util.hash_pandas_object(df, index=False).map('{:016x}'.format)
+        
+        try:
+            self.ensure_natural_key()
+            cursor = self.postgres_client.cursor
+            
+            cursor.execute("SELECT store_name, parameter, month::text, row_hash FROM mis_long")
+            existing = pd.DataFrame(cursor.fetchall(), columns=NATURAL_KEY + ['existing_hash'])
+            
+            merged = df.merge(existing, on=NATURAL_KEY, how='left')
+            changed = merged[merged['row_hash'] != merged['existing_hash']][columns + ['row_hash']]
+            print(f"📊 {len(changed)} of {len(df)} rows are new or changed")
+            
+            if len(changed) == 0:
+                return 0
+            
+            # Stage the delta with COPY, then upsert it in one statement
+            buffer = io.StringIO()
+            changed.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            
+            sync_columns = columns + ['row_hash']
+            cursor.execute(
+                "CREATE TEMP TABLE mis_long_stage ON COMMIT DROP AS "
+                f"SELECT {', '.join(sync_columns)} FROM mis_long WITH NO DATA"
+            )
+            cursor.copy_expert(
+                f"COPY mis_long_stage ({', '.join(sync_columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in sync_columns if col not in NATURAL_KEY)
+            cursor.execute(f"""
+                INSERT INTO mis_long ({', '.join(sync_columns)})
+                SELECT {', '.join(sync_columns)} FROM mis_long_stage
+                ON CONFLICT (store_name, parameter, month) DO UPDATE SET {updates}
+                WHERE mis_long.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+            """)
+            upserted = cursor.rowcount
+            self.postgres_client.connection.commit()
+        except Exception as e:
+            self.postgres_client.connection.rollback()
+            print(f"❌ Sync failed: {e}")
+            return None
+        finally:
+            self.postgres_client.disconnect()
+        
+        print(f"🎉 Sync completed! {upserted} rows upserted in {time.time() - start_time:.2f}s")
+        return upserted
+    
     def _insert_batch_values(self, batch_df: pd.DataFrame, batch_num: int) -> int:
         """Insert batch using PostgreSQL VALUES syntax"""
         try:
@@ -182,25 +425,62 @@ class NeonMigrator:
             print(f"❌ Verification failed: {e}")
             return False
     
-    def run_migration(self, csv_path: str = 'clean_mis_long.csv'):
-        """Run the complete migration process"""
+    def run_migration(self, csv_path: str = 'clean_mis_long.csv', mode: str = 'copy',
+                      workers: int = 4, range_size: int = 5000, run_id: str = None,
+                      source: str = None, source_key: str = None, layout: str = None):
+        """Run the complete migration process (mode: 'copy', 'parallel', 'sync', 'stream' or batched 'insert')"""
         print("🚀 Starting Neon PostgreSQL Migration for BT MIS Analytics")
         print("=" * 60)
         
         # Step 1: Create table schema
-        if not self.create_table_schema():
+        if not self.create_table_schema(layout):
             return False
         
+        if mode == 'stream':
+            if not source:
+                print("❌ Stream mode needs --source (a Postgres URL or a Supabase/PostgREST URL)")
+                return False
+            successful_records = self.stream_from_source(source, source_key)
+            if successful_records is None:
+                return False
+            if successful_records == 0:
+                print("✅ Destination already has every source row")
+            # Streamed months are only known afterwards; move them out of the default partition
+            if not self.ensure_partitions():
+                return False
+            if successful_records:
+                self.refresh_rollups()
+            return self.verify_migration()
+        
         # Step 2: Load CSV data
         df = self.load_csv_data(csv_path)
         if df is None:
             return False
+        if not self.ensure_partitions(df):
+            return False
         
         # Step 3: Migrate data
-        successful_records = self.migrate_data(df)
+        if mode == 'copy':
+            successful_records = self.copy_data(df)
+        elif mode == 'sync':
+            successful_records = self.sync_data(df)
+            if successful_records is None:
+                return False
+            if successful_records == 0:
+                print("✅ Database already up to date")
+                return self.verify_migration()
+        elif mode == 'parallel':
+            successful_records = self.migrate_data_parallel(
+                df, run_id or compute_run_id(csv_path), workers, range_size
+            )
+        else:
+            successful_records = self.migrate_data(df)
         if successful_records == 0:
             return False
         
+        # Rollups are refreshed only after a successful load; a failure leaves the previous data
+        self.refresh_rollups()
+        
         # Step 4: Verify migration
         if not self.verify_migration():
             return False
@@ -214,9 +494,25 @@ class NeonMigrator:
 
 def main():
     """Main function to run the migration"""
+    parser = argparse.ArgumentParser(description='Migrate clean_mis_long.csv into Neon PostgreSQL')
+    parser.add_argument('--csv', default='clean_mis_long.csv', help='Tidy CSV to load (default: clean_mis_long.csv)')
+    parser.add_argument('--mode', choices=['copy', 'parallel', 'sync', 'stream', 'insert'], default='copy',
+                        help='copy: bulk COPY FROM STDIN (default); parallel: concurrent, resumable ranges; '
+                             'sync: idempotent upsert of new/changed rows; stream: copy from --source database; '
+                             'insert: batched INSERT statements')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent connections for parallel mode (default: 4)')
+    parser.add_argument('--range-size', type=int, default=5000, help='Rows per range in parallel mode (default: 5000)')
+    parser.add_argument('--run-id', help='Checkpoint run id for parallel mode (default: hash of the CSV content)')
+    parser.add_argument('--source', help='Stream mode source: postgresql:// URL or Supabase project URL')
+    parser.add_argument('--layout', choices=['flat', 'partitioned'],
+                        help='Schema for a new mis_long table (default: PG_TABLE_LAYOUT or flat)')
+    parser.add_argument('--source-key', help='API key for a Supabase/PostgREST source (default: SUPABASE_ANON_KEY)')
+    args = parser.parse_args()
+    
     try:
         migrator = NeonMigrator()
-        success = migrator.run_migration()
+        success = migrator.run_migration(args.csv, args.mode, args.workers, args.range_size, args.run_id,
+                                         args.source, args.source_key, args.layout)
         
         if success:
             print("\n✅ Next steps:")
@@ -11,12 +11,14 @@ Usage:
 import argparse
 import json
 import sys
+import time
 from pathlib import Path
 import os
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import openai
 from dotenv import load_dotenv
-from postgres_client import execute_sql_query as postgres_execute_query
+from postgres_client import (execute_sql_query as postgres_execute_query, run_sql_query, format_result,
+                             get_postgres_client, ROLLUP_VIEWS, MAX_RESULT_ROWS, QueryCancelledError)
 
 # Load environment variables (optional for Railway deployment)
 load_dotenv(override=False)
@@ -46,6 +48,76 @@ Key insights about the data:
 - Area is typically in square feet, revenue in currency units, transactions as counts
 """
 
+# Seconds the list of rollup views is trusted before the schema is checked again
+ROLLUP_CONTEXT_TTL = int(os.getenv('PG_ROLLUP_CONTEXT_TTL', '300'))
+
+_rollup_context = None
+_rollup_context_expire = 0.0
+
+def format_rollup_context(available: List[str]) -> str:
+    """Schema notes for the given rollup views"""
+    if not available:
+        return ""
+    lines = ["", "Pre-aggregated rollup views (materialized, refreshed after every load; "
+             "NULL values are excluded):"]
+    for name in available:
+        view = ROLLUP_VIEWS[name]
+        lines.append(f"View: {name} - {view['description']}")
+        lines.append(f"Columns: {view['columns']}")
+    lines.append("Prefer a rollup view over mis_long whenever the question can be answered at its grain "
+                 "(e.g. totals by region and month, or by store and fiscal year); they are much smaller. "
+                 "Use mis_long for per-store monthly detail or filters on other columns.")
+    return "\n".join(lines)
+
+def _cached_rollup_context() -> Optional[str]:
+    """The cached rollup notes, or None when they must be looked up again"""
+    if _rollup_context is not None and time.time() < _rollup_context_expire:
+        return _rollup_context
+    return None
+
+def _cache_rollup_context(available: List[str]) -> str:
+    """Format the rollup notes, caching them only when views exist
+
+    An empty list isn't cached: the views are created by the next load (e.g. an
+    /api/admin/reload in this process) and should be advertised right away.
+    """
+    global _rollup_context, _rollup_context_expire
+    context = format_rollup_context(available)
+    if context:
+        _rollup_context = context
+        _rollup_context_expire = time.time() + ROLLUP_CONTEXT_TTL
+    return context
+
+def clear_rollup_context():
+    """Forget the cached rollup notes so the next query checks the schema again"""
+    global _rollup_context
+    _rollup_context = None
+
+def get_rollup_context() -> str:
+    """Schema notes for the rollup views present in the database (cached for ROLLUP_CONTEXT_TTL seconds)"""
+    cached = _cached_rollup_context()
+    if cached is not None:
+        return cached
+    try:
+        available = get_postgres_client().available_rollups()
+    except Exception:
+        # Don't cache a failed lookup; the database may just be unreachable right now
+        return ""
+    return _cache_rollup_context(available)
+
+async def get_rollup_context_async() -> str:
+    """get_rollup_context for the async client"""
+    from postgres_async_client import get_async_postgres_client
+    
+    cached = _cached_rollup_context()
+    if cached is not None:
+        return cached
+    try:
+        available = await get_async_postgres_client().available_rollups()
+    except Exception:
+        return ""
+    return _cache_rollup_context(available)
+
 def get_openai_client():
     """Initialize and return OpenAI client."""
     api_key = os.getenv('OPENAI_API_KEY')
@@ -54,13 +126,20 @@ def get_openai_client():
     
     return openai.OpenAI(api_key=api_key)
 
-def generate_sql_query(natural_query: str, openai_client: openai.OpenAI) -> str:
-    """Generate SQL query from natural language using OpenAI."""
+def get_async_openai_client():
+    """Initialize and return an async OpenAI client (for the ASGI app)."""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in your .env file or Railway environment variables.")
     
+    return openai.AsyncOpenAI(api_key=api_key)
+
+def build_sql_messages(natural_query: str, rollup_context: str) -> List[Dict[str, str]]:
+    """Chat messages asking the model to translate a question into SQL"""
     system_prompt = f"""You are an expert SQL query generator for retail store analytics. 
     
 Database Schema:
-{DATABASE_SCHEMA}
+{DATABASE_SCHEMA}{rollup_context}
 
 Instructions:
 1. Generate PostgreSQL-compatible SQL queries
@@ -85,72 +164,155 @@ Generate a single, well-formed SQL query for the user's question."""
 
 Return only the SQL query, no explanations or markdown formatting."""
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def clean_sql_response(content: str) -> str:
+    """Strip markdown fences from the model's answer"""
+    return content.strip().replace('```sql', '').replace('```', '').strip()
+
+def generate_sql_query(natural_query: str, openai_client: openai.OpenAI) -> str:
+    """Generate SQL query from natural language using OpenAI."""
     try:
         response = openai_client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=build_sql_messages(natural_query, get_rollup_context()),
             temperature=0.1,
             max_tokens=500
         )
         
-        sql_query = response.choices[0].message.content.strip()
+        return clean_sql_response(response.choices[0].message.content)
         
-        # Clean up the SQL query
-        sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+    except Exception as e:
+        raise Exception(f"Error generating SQL query: {e}")
+
+async def generate_sql_query_async(natural_query: str, openai_client: openai.AsyncOpenAI) -> str:
+    """Async version of generate_sql_query."""
+    try:
+        response = await openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=build_sql_messages(natural_query, await get_rollup_context_async()),
+            temperature=0.1,
+            max_tokens=500
+        )
         
-        return sql_query
+        return clean_sql_response(response.choices[0].message.content)
         
     except Exception as e:
         raise Exception(f"Error generating SQL query: {e}")
 
-def execute_sql_query(sql_query: str) -> str:
-    """Execute SQL query using PostgreSQL and return results."""
+def count_matching_rows(sql_query: str, result: Dict[str, Any], exact: bool = False,
+                        query_id: Optional[str] = None, deadline: Optional[float] = None) -> Optional[Tuple[int, str]]:
+    """Count strategy for a capped query: returns (rows, method) or None if no count is available
+    
+    - 'exact': the capped fetch already saw every row, so counting is free
+    - 'counted': the caller opted in to running COUNT(*) over the full query
+    - 'estimate': the planner's row estimate from EXPLAIN, without running the query again
+    """
+    if not result['truncated']:
+        return len(result['rows']), 'exact'
+    
+    client = get_postgres_client()
     try:
-        # Add LIMIT if not present to prevent overwhelming output
-        sql_upper = sql_query.upper().strip()
-        has_limit = 'LIMIT' in sql_upper
-        
-        if not has_limit and not sql_upper.endswith(';'):
-            sql_with_limit = sql_query + " LIMIT 1000;"
-        elif not has_limit:
-            sql_with_limit = sql_query.rstrip(';') + " LIMIT 1000;"
+        if exact:
+            return client.count_rows(sql_query, query_id=query_id, deadline=deadline), 'counted'
+        return client.estimate_rows(sql_query, query_id=query_id, deadline=deadline), 'estimate'
+    except Exception:
+        # The rows are already fetched; a count that fails or times out just isn't shown
+        return None
+
+async def count_matching_rows_async(sql_query: str, result: Dict[str, Any], exact: bool = False,
+                                    query_id: Optional[str] = None,
+                                    deadline: Optional[float] = None) -> Optional[Tuple[int, str]]:
+    """Async version of count_matching_rows"""
+    from postgres_async_client import get_async_postgres_client
+    
+    if not result['truncated']:
+        return len(result['rows']), 'exact'
+    
+    client = get_async_postgres_client()
+    try:
+        if exact:
+            return await client.count_rows(sql_query, query_id=query_id, deadline=deadline), 'counted'
+        return await client.estimate_rows(sql_query, query_id=query_id, deadline=deadline), 'estimate'
+    except Exception:
+        return None
+
+def limit_for_display(sql_query: str) -> Tuple[bool, str, str]:
+    """Returns (has_limit, query without trailing semicolon, query to run)
+    
+    Queries without a LIMIT get one row past the display cap, which tells
+    whether there are more.
+    """
+    has_limit = 'LIMIT' in sql_query.upper()
+    base_query = sql_query.strip().rstrip(';')
+    return has_limit, base_query, sql_query if has_limit else f"{base_query} LIMIT {MAX_RESULT_ROWS + 1}"
+
+def row_count_note(result: Dict[str, Any], counted: Optional[Tuple[int, str]]) -> str:
+    """Footer describing the total for a result capped for display"""
+    shown = len(result['rows'])
+    note = ""
+    if counted is not None:
+        rows, method = counted
+        if method == 'counted':
+            note += f"\n\n📊 Total matching rows: {rows:,} (exact count)"
+        elif rows > shown:
+            note += f"\n\n📊 About {rows:,} matching rows (approximate, planner estimate)"
         else:
-            sql_with_limit = sql_query
+            note += f"\n\n📊 More than {shown:,} matching rows"
+    return note + f"\n⚠️  Showing first {shown:,} rows (limited for display)"
+
+def execute_sql_query(sql_query: str, query_id: Optional[str] = None, deadline: Optional[float] = None,
+                      exact_count: bool = False) -> str:
+    """Execute SQL query using PostgreSQL and return results.
+    
+    Queries without a LIMIT are capped for display. Their total is reported from the
+    capped fetch when it saw every row, otherwise as an approximate planner estimate,
+    or as an exact COUNT(*) when exact_count is set.
+    Raises QueryCancelledError if the query times out, passes its deadline or is cancelled.
+    """
+    try:
+        if not sql_query.upper().strip().startswith(('SELECT', 'WITH')):
+            return postgres_execute_query(sql_query, query_id=query_id, deadline=deadline)
         
-        # Execute the query using PostgreSQL
-        output = postgres_execute_query(sql_with_limit)
+        has_limit, base_query, sql_with_limit = limit_for_display(sql_query)
+        result = run_sql_query(sql_with_limit, query_id=query_id, deadline=deadline)
+        output = format_result(result)
         
-        # If no explicit LIMIT was added, try to get total count
-        if not has_limit:
-            try:
-                # For simple queries, we can try to get a count
-                if 'FROM mis_long' in sql_query.upper() and 'GROUP BY' not in sql_query.upper():
-                    # Try to get count for simple SELECT queries
-                    count_query = f"SELECT COUNT(*) as total_rows FROM ({sql_query.rstrip(';')})"
-                    count_output = postgres_execute_query(count_query)
-                    
-                    # Extract count from output (simplified parsing)
-                    if "Total rows:" in count_output:
-                        lines = count_output.split('\n')
-                        for line in lines:
-                            if "Total rows:" in line:
-                                count_str = line.split("Total rows:")[1].strip()
-                                try:
-                                    count = int(count_str.replace(',', ''))
-                                    output += f"\n\n📊 Total matching rows: {count:,}"
-                                    if count > 1000:
-                                        output += f"\n⚠️  Showing first 1,000 rows (limited for display)"
-                                except:
-                                    pass
-                                break
-            except:
-                pass
+        if not has_limit and result['truncated']:
+            counted = count_matching_rows(base_query, result, exact_count, query_id, deadline)
+            output += row_count_note(result, counted)
+        
+        return output
+        
+    except QueryCancelledError:
+        raise
+    except Exception as e:
+        return f"Error executing query: {e}"
+
+async def execute_sql_query_async(sql_query: str, query_id: Optional[str] = None,
+                                  deadline: Optional[float] = None, exact_count: bool = False) -> str:
+    """Async version of execute_sql_query, on the asyncpg pool from postgres_async_client.py"""
+    from postgres_async_client import execute_sql_query as async_execute_query, run_sql_query as async_run_query
+    
+    try:
+        if not sql_query.upper().strip().startswith(('SELECT', 'WITH')):
+            return await async_execute_query(sql_query, query_id=query_id, deadline=deadline)
+        
+        has_limit, base_query, sql_with_limit = limit_for_display(sql_query)
+        result = await async_run_query(sql_with_limit, query_id=query_id, deadline=deadline)
+        output = format_result(result)
+        
+        if not has_limit and result['truncated']:
+            counted = await count_matching_rows_async(base_query, result, exact_count, query_id, deadline)
+            output += row_count_note(result, counted)
         
         return output
         
+    except QueryCancelledError:
+        raise
     except Exception as e:
         return f"Error executing query: {e}"
 
@@ -159,6 +321,8 @@ def main():
     parser = argparse.ArgumentParser(description='Convert natural language to SQL for BT Store data')
     parser.add_argument('query', help='Natural language question about the store data')
     parser.add_argument('--interactive', '-i', action='store_true', help='Run in interactive mode')
+    parser.add_argument('--exact-count', action='store_true',
+                        help='Run COUNT(*) for capped results instead of using the planner estimate')
     
     args = parser.parse_args()
     
@@ -190,7 +354,7 @@ def main():
                     
                     # Execute query
                     print(f"\n📊 Results:")
-                    results = execute_sql_query(sql_query)
+                    results = execute_sql_query(sql_query, exact_count=args.exact_count)
                     print(results)
                     
                 except KeyboardInterrupt:
@@ -210,7 +374,7 @@ def main():
             
             # Execute query
             print(f"\n📊 Results:")
-            results = execute_sql_query(sql_query)
+            results = execute_sql_query(sql_query, exact_count=args.exact_count)
             print(results)
             
     except Exception as e:
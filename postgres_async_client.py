@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Async PostgreSQL Client for BT MIS Analytics
+asyncpg counterpart of postgres_client.py for ASGI deployments. Queries wait on
+the network without holding a thread, so one process can keep hundreds of them
+in flight over its own connection pool.
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import asyncpg
+from dotenv import load_dotenv
+from postgres_client import (MAX_RESULT_ROWS, STREAM_BATCH_SIZE, STATEMENT_TIMEOUT_MS, QUERY_WORK_MEM,
+                             QUERY_ID_PATTERN, ROLLUP_VIEWS, PoolTimeoutError, QueryCancelledError,
+                             format_result, record_query)
+
+# Load environment variables (optional for Railway deployment)
+load_dotenv(override=False)
+
+# libpq-only URL parameters that asyncpg would otherwise send as server settings
+LIBPQ_ONLY_PARAMS = {'channel_binding', 'gssencmode', 'keepalives', 'keepalives_idle',
+                     'keepalives_interval', 'keepalives_count', 'tcp_user_timeout'}
+
+def asyncpg_dsn(connection_string: str) -> str:
+    """Drop connection-string parameters asyncpg does not understand (e.g. Neon's channel_binding)"""
+    parts = urlsplit(connection_string)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in LIBPQ_ONLY_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+class AsyncPostgreSQLClient:
+    """Async client for the mis_long database, with the same query limits as PostgreSQLClient
+
+    The pool belongs to the event loop it was created on; create one client
+    per loop (get_async_postgres_client does this for the ASGI app) and
+    close() it on shutdown.
+    """
+
+    def __init__(self, connection_string: Optional[str] = None):
+        self.connection_string = connection_string or os.getenv('DATABASE_URL')
+
+        if not self.connection_string:
+            raise ValueError("DATABASE_URL must be set in .env file or Railway environment variables")
+
+        self.min_size = int(os.getenv('PG_ASYNC_POOL_MIN_SIZE', '1'))
+        self.max_size = int(os.getenv('PG_ASYNC_POOL_MAX_SIZE', '50'))
+        self.acquire_timeout = float(os.getenv('PG_POOL_TIMEOUT', '30'))
+
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self._acquiring = 0
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'in_flight': 0,
+            'peak_in_flight': 0,
+            'total_wait_ms': 0.0
+        }
+
+    async def pool(self) -> asyncpg.Pool:
+        """Connection pool used for query execution (created on first use)"""
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        asyncpg_dsn(self.connection_string),
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        max_inactive_connection_lifetime=float(os.getenv('PG_POOL_MAX_IDLE', '300')),
+                        # Transaction-mode poolers (Neon's -pooler hosts) can't keep prepared statements
+                        statement_cache_size=0 if '-pooler' in self.connection_string else 100
+                    )
+        return self._pool
+
+    async def close(self):
+        """Close the connection pool"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a pooled connection; raises PoolTimeoutError if none frees up in time"""
+        pool = await self.pool()
+        start_time = time.time()
+        if self.stats['in_flight'] + self._acquiring >= self.max_size:
+            self.stats['waits'] += 1
+        self._acquiring += 1
+        try:
+            connection = await pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise PoolTimeoutError(
+                f"No database connection available after {self.acquire_timeout:.0f}s "
+                f"({self.max_size} connections in use)"
+            ) from None
+        finally:
+            self._acquiring -= 1
+
+        self.stats['checkouts'] += 1
+        self.stats['total_wait_ms'] += (time.time() - start_time) * 1000
+        self.stats['in_flight'] += 1
+        self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.stats['in_flight'])
+        try:
+            yield connection
+        finally:
+            self.stats['in_flight'] -= 1
+            # Release resets the session; a connection left mid-query by a cancelled task is terminated
+            await pool.release(connection)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool size and checkout metrics"""
+        stats = dict(self.stats)
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 1)
+        stats['max_size'] = self.max_size
+        if self._pool is not None:
+            stats['size'] = self._pool.get_size()
+            stats['idle'] = self._pool.get_idle_size()
+        return stats
+
+    def _query_budget(self, timeout_ms: Optional[int], deadline: Optional[float]):
+        """Effective statement timeout and what it stems from ('statement_timeout' or 'deadline')"""
+        timeout_ms = timeout_ms or STATEMENT_TIMEOUT_MS
+        if deadline is not None:
+            remaining_ms = int((deadline - time.time()) * 1000)
+            if remaining_ms <= 0:
+                raise QueryCancelledError('deadline', 0, timeout_ms)
+            if remaining_ms < timeout_ms:
+                return remaining_ms, 'deadline'
+        return timeout_ms, 'statement_timeout'
+
+    async def _set_limits(self, connection, timeout_ms: int, query_id: Optional[str]):
+        """Apply per-query limits and the cancel tag to the current transaction"""
+        await connection.execute(
+            "SELECT set_config('statement_timeout', $1, true), set_config('work_mem', $2, true)",
+            str(timeout_ms), QUERY_WORK_MEM
+        )
+        if query_id:
+            await connection.execute("SELECT set_config('application_name', $1, true)", f"mis-query-{query_id}")
+
+    @asynccontextmanager
+    async def _read_only(self, timeout_ms: Optional[int], query_id: Optional[str], deadline: Optional[float]):
+        """Read-only transaction with per-query limits; yields (connection, timeout_ms, reason, start_time)
+
+        A statement stopped by statement_timeout or pg_cancel_backend surfaces as
+        QueryCancelledError. If the calling task itself is cancelled (e.g. the
+        ASGI request goes away), asyncpg cancels the statement on the server.
+        """
+        start_time = time.time()
+        timeout_ms, reason = self._query_budget(timeout_ms, deadline)
+        try:
+            async with self.connection() as connection:
+                async with connection.transaction(readonly=True):
+                    await self._set_limits(connection, timeout_ms, query_id)
+                    yield connection, timeout_ms, reason, start_time
+        except asyncpg.exceptions.QueryCanceledError as e:
+            cancelled = 'user request' in str(e)
+            raise QueryCancelledError('cancelled' if cancelled else reason,
+                                      (time.time() - start_time) * 1000, timeout_ms) from None
+
+    async def _fetch_scalar(self, sql_query: str, timeout_ms: Optional[int] = None,
+                            query_id: Optional[str] = None, deadline: Optional[float] = None):
+        """Run a single-value statement (EXPLAIN, COUNT) under the same limits as fetch_rows"""
+        async with self._read_only(timeout_ms, query_id, deadline) as (connection, _, _, _):
+            return await connection.fetchval(sql_query)
+
+    async def fetch_rows(self, sql_query: str, max_rows: int = MAX_RESULT_ROWS,
+                         batch_size: int = STREAM_BATCH_SIZE, timeout_ms: Optional[int] = None,
+                         query_id: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Run a row-returning query; returns columns, up to max_rows rows and whether more exist
+
+        Rows are read through a server-side cursor in batches of batch_size, so at
+        most max_rows + 1 rows are transferred however broad the query is.
+        Raises QueryCancelledError on timeout or when cancel_query(query_id) is called.
+        """
+        async with self._read_only(timeout_ms, query_id, deadline) as (connection, timeout_ms, reason, start_time):
+            statement = await connection.prepare(sql_query)
+            columns = [attribute.name for attribute in statement.get_attributes()]
+
+            cursor = await statement.cursor()
+            rows = []
+            # Fetch one row past the cap to know whether the result was truncated
+            remaining = max_rows + 1
+            while remaining > 0:
+                batch = await cursor.fetch(min(batch_size, remaining))
+                rows.extend(tuple(record) for record in batch)
+                if len(batch) < min(batch_size, remaining):
+                    break
+                remaining -= len(batch)
+                # statement_timeout applies per FETCH; enforce the budget for the whole query here
+                elapsed_ms = (time.time() - start_time) * 1000
+                if remaining > 0 and elapsed_ms > timeout_ms:
+                    raise QueryCancelledError(reason, elapsed_ms, timeout_ms)
+
+        return {'columns': columns, 'rows': rows[:max_rows], 'truncated': len(rows) > max_rows}
+
+    async def estimate_rows(self, sql_query: str, **limits) -> int:
+        """Planner row estimate for a query, from EXPLAIN (FORMAT JSON); the query is not run"""
+        plan = await self._fetch_scalar(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}", **limits)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    async def count_rows(self, sql_query: str, **limits) -> int:
+        """Exact row count of a query (runs it in full)"""
+        return int(await self._fetch_scalar(
+            f"SELECT COUNT(*) FROM ({sql_query.strip().rstrip(';')}) AS counted", **limits
+        ))
+
+    async def execute_query(self, sql_query: str, timeout_ms: Optional[int] = None,
+                            query_id: Optional[str] = None, deadline: Optional[float] = None) -> str:
+        """Execute SQL query read-only on a pooled connection and return results as formatted string
+
+        Timeouts and cancellations raise QueryCancelledError; other failures
+        are returned as an error string.
+        """
+        try:
+            if sql_query.strip().upper().startswith(('SELECT', 'WITH', 'VALUES', 'TABLE')):
+                return format_result(await self.fetch_rows(sql_query, timeout_ms=timeout_ms,
+                                                           query_id=query_id, deadline=deadline))
+
+            # Writes are rejected by the read-only transaction
+            async with self._read_only(timeout_ms, query_id, deadline) as (connection, _, _, _):
+                await connection.execute(sql_query)
+            return "Query executed successfully"
+
+        except QueryCancelledError:
+            raise
+        except PoolTimeoutError as e:
+            return f"Error: {e}"
+        except Exception as e:
+            return f"Error executing query: {e}"
+
+    async def cancel_query(self, query_id: str) -> bool:
+        """Cancel the statement running under query_id in any worker. Returns True if one was found."""
+        if not QUERY_ID_PATTERN.match(query_id or ''):
+            return False
+        async with self.connection() as connection:
+            cancelled = await connection.fetch(
+                "SELECT pg_cancel_backend(pid) FROM pg_stat_activity "
+                "WHERE application_name = $1 AND pid <> pg_backend_pid()",
+                f"mis-query-{query_id}"
+            )
+        return any(row[0] for row in cancelled)
+
+    async def available_rollups(self) -> List[str]:
+        """Rollup views from ROLLUP_VIEWS that exist in the database"""
+        async with self.connection() as connection:
+            rows = await connection.fetch(
+                "SELECT matviewname FROM pg_matviews WHERE schemaname = current_schema() "
+                "AND matviewname = ANY($1::text[])",
+                list(ROLLUP_VIEWS)
+            )
+        existing = {row[0] for row in rows}
+        return [name for name in ROLLUP_VIEWS if name in existing]
+
+    async def test_connection(self) -> bool:
+        """Test database connection"""
+        try:
+            async with self.connection() as connection:
+                return await connection.fetchval("SELECT 1") == 1
+        except Exception as e:
+            print(f"Connection test failed: {e}")
+            return False
+
+# Global instance, bound to the event loop that first used it
+async_postgres_client = None
+
+def get_async_postgres_client() -> AsyncPostgreSQLClient:
+    """Get or create the global async PostgreSQL client instance"""
+    global async_postgres_client
+    if async_postgres_client is None:
+        async_postgres_client = AsyncPostgreSQLClient()
+    return async_postgres_client
+
+async def close_async_postgres_client():
+    """Close the global client's pool (call on application shutdown)"""
+    global async_postgres_client
+    if async_postgres_client is not None:
+        await async_postgres_client.close()
+        async_postgres_client = None
+
+def get_async_pool_stats() -> Optional[Dict[str, Any]]:
+    """Async pool metrics, or None if the async client hasn't been used"""
+    if async_postgres_client is None:
+        return None
+    return async_postgres_client.get_stats()
+
+async def execute_sql_query(sql_query: str, query_id: Optional[str] = None,
+                            deadline: Optional[float] = None) -> str:
+    """Async version of postgres_client.execute_sql_query
+
+    Raises QueryCancelledError when the query times out or is cancelled.
+    """
+    client = get_async_postgres_client()
+    if query_id and not QUERY_ID_PATTERN.match(query_id):
+        query_id = None
+    start_time = time.time()
+    try:
+        output = await client.execute_query(sql_query, query_id=query_id, deadline=deadline)
+    except QueryCancelledError:
+        record_query(sql_query, (time.time() - start_time) * 1000, False)
+        raise
+    record_query(sql_query, (time.time() - start_time) * 1000, not output.startswith('Error'))
+    return output
+
+async def run_sql_query(sql_query: str, query_id: Optional[str] = None,
+                        deadline: Optional[float] = None) -> Dict[str, Any]:
+    """Like execute_sql_query, but return fetch_rows() data instead of formatted text
+
+    Raises QueryCancelledError on timeout/cancel and propagates other database errors.
+    """
+    client = get_async_postgres_client()
+    if query_id and not QUERY_ID_PATTERN.match(query_id):
+        query_id = None
+    start_time = time.time()
+    try:
+        result = await client.fetch_rows(sql_query, query_id=query_id, deadline=deadline)
+    except Exception:
+        record_query(sql_query, (time.time() - start_time) * 1000, False)
+        raise
+    record_query(sql_query, (time.time() - start_time) * 1000, True)
+    return result
+
+async def cancel_query(query_id: str) -> bool:
+    """Cancel a running query started with this query_id"""
+    return await get_async_postgres_client().cancel_query(query_id)
+
+async def _benchmark(concurrency: int, sleep_seconds: float):
+    """Run concurrent sleeping queries to show how many one process keeps in flight"""
+    client = get_async_postgres_client()
+    if not await client.test_connection():
+        print("❌ PostgreSQL connection failed!")
+        print("💡 Make sure your .env file has correct DATABASE_URL")
+        return
+    print("✅ PostgreSQL connection successful!")
+
+    start_time = time.time()
+    results = await asyncio.gather(*(
+        client.fetch_rows(f"SELECT {i} AS n, pg_sleep({sleep_seconds})") for i in range(concurrency)
+    ), return_exceptions=True)
+    elapsed = time.time() - start_time
+
+    failed = [r for r in results if isinstance(r, Exception)]
+    print(f"🚀 {concurrency} queries of {sleep_seconds}s each finished in {elapsed:.2f}s "
+          f"({len(failed)} failed)")
+    print(f"📊 Pool: {client.get_stats()}")
+    if failed:
+        print(f"❌ First error: {failed[0]}")
+    await close_async_postgres_client()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Test the async PostgreSQL client')
+    parser.add_argument('--concurrency', type=int, default=50, help='Concurrent test queries (default: 50)')
+    parser.add_argument('--sleep', type=float, default=0.5, help='Seconds each test query sleeps (default: 0.5)')
+    args = parser.parse_args()
+
+    asyncio.run(_benchmark(args.concurrency, args.sleep))
@@ -5,15 +5,418 @@ Uses direct PostgreSQL connection for full SQL support
 """
 
 import os
+import re
+import threading
+import time
+import uuid
 import psycopg2
 import pandas as pd
+from contextlib import contextmanager
+from datetime import date
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import json
 
 # Load environment variables (optional for Railway deployment)
 load_dotenv(override=False)
 
+# Hard cap on rows returned for display, and server-side cursor batch size
+MAX_RESULT_ROWS = int(os.getenv('PG_MAX_RESULT_ROWS', '1000'))
+STREAM_BATCH_SIZE = int(os.getenv('PG_STREAM_BATCH_SIZE', '500'))
+
+# Per-query limits for execute_query; every query runs in a read-only transaction
+STATEMENT_TIMEOUT_MS = int(os.getenv('PG_STATEMENT_TIMEOUT_MS', '30000'))
+QUERY_WORK_MEM = os.getenv('PG_WORK_MEM', '32MB')
+
+# Queries tagged with an id run under application_name 'mis-query-<id>' so any
+# worker process can find and cancel them through pg_stat_activity
+QUERY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,48}$')
+
+# Append executed SQL to this JSONL file for index_advisor.py (disabled when unset)
+QUERY_LOG_PATH = os.getenv('PG_QUERY_LOG')
+_query_log_lock = threading.Lock()
+
+def record_query(sql_query: str, duration_ms: float, ok: bool):
+    """Append one executed statement to the query log"""
+    if not QUERY_LOG_PATH:
+        return
+    entry = json.dumps({
+        'ts': time.time(),
+        'sql': sql_query,
+        'duration_ms': round(duration_ms, 2),
+        'ok': ok
+    })
+    try:
+        with _query_log_lock:
+            with open(QUERY_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(entry + '\n')
+    except OSError as e:
+        print(f"⚠️  Could not write query log {QUERY_LOG_PATH}: {e}")
+
+# mis_long layout for create_table: 'flat' or 'partitioned' (by fiscal year of month)
+TABLE_LAYOUT = os.getenv('PG_TABLE_LAYOUT', 'flat')
+FISCAL_YEAR_START_MONTH = int(os.getenv('PG_FISCAL_YEAR_START_MONTH', '4'))
+
+def fiscal_year(month: date, start_month: int = FISCAL_YEAR_START_MONTH) -> int:
+    """Fiscal year a date falls in, named after the year it ends in (April 2024 -> FY2025)"""
+    if start_month > 1 and month.month >= start_month:
+        return month.year + 1
+    return month.year
+
+def ensure_fiscal_year_partitions(cursor, table: str, first_month: date, last_month: date,
+                                  start_month: int = FISCAL_YEAR_START_MONTH) -> List[str]:
+    """Create {table}_fyYYYY partitions covering first_month..last_month
+    
+    Rows for a new fiscal year that already landed in the default partition
+    are moved into the new partition. Returns the partitions created.
+    """
+    cursor.execute("SELECT to_regclass(%s)", (f"{table}_default",))
+    has_default = cursor.fetchone()[0] is not None
+    
+    created = []
+    for year in range(fiscal_year(first_month, start_month), fiscal_year(last_month, start_month) + 1):
+        partition = f"{table}_fy{year}"
+        cursor.execute("SELECT to_regclass(%s)", (partition,))
+        if cursor.fetchone()[0] is not None:
+            continue
+        
+        lower = date(year - 1 if start_month > 1 else year, start_month, 1)
+        upper = date(lower.year + 1, start_month, 1)
+        
+        # A new partition can't be attached while the default partition holds rows in its range
+        if has_default:
+            cursor.execute(f"CREATE TEMP TABLE {table}_moving (LIKE {table}_default)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {table}_default WHERE month >= %s AND month < %s RETURNING *) "
+                f"INSERT INTO {table}_moving SELECT * FROM moved",
+                (lower, upper)
+            )
+        cursor.execute(
+            f"CREATE TABLE {partition} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            (lower, upper)
+        )
+        if has_default:
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM {table}_moving")
+            cursor.execute(f"DROP TABLE {table}_moving")
+        created.append(partition)
+    return created
+
+# Standard rollups kept as materialized views over mis_long and refreshed after
+# each load (set PG_ROLLUPS=false to skip creating them)
+ROLLUPS_ENABLED = os.getenv('PG_ROLLUPS', 'true').lower() not in ('0', 'false', 'no')
+
+ROLLUP_VIEWS = {
+    'mis_rollup_month': {
+        'description': 'Chain-wide totals per month and parameter',
+        'columns': 'month (DATE), parameter (TEXT), total_value (DOUBLE PRECISION), '
+                   'avg_value (DOUBLE PRECISION), store_count (BIGINT)',
+        'key': ['month', 'parameter'],
+        'sql': """
+            SELECT month, parameter,
+                   SUM(value) AS total_value, AVG(value) AS avg_value,
+                   COUNT(DISTINCT store_name) AS store_count
+            FROM mis_long
+            WHERE value IS NOT NULL AND month IS NOT NULL
+            GROUP BY month, parameter
+        """
+    },
+    'mis_rollup_region_month': {
+        'description': 'Totals per region, month and parameter',
+        'columns': 'region (TEXT), month (DATE), parameter (TEXT), total_value (DOUBLE PRECISION), '
+                   'avg_value (DOUBLE PRECISION), store_count (BIGINT)',
+        'key': ['region', 'month', 'parameter'],
+        'sql': """
+            SELECT COALESCE(region, 'Unknown') AS region, month, parameter,
+                   SUM(value) AS total_value, AVG(value) AS avg_value,
+                   COUNT(DISTINCT store_name) AS store_count
+            FROM mis_long
+            WHERE value IS NOT NULL AND month IS NOT NULL
+            GROUP BY 1, month, parameter
+        """
+    },
+    'mis_rollup_store_fy': {
+        'description': f'Totals per store, fiscal year (starting in month {FISCAL_YEAR_START_MONTH}, '
+                       'named after the year it ends in) and parameter',
+        'columns': 'store_name (TEXT), region (TEXT), fiscal_year (INTEGER), parameter (TEXT), '
+                   'total_value (DOUBLE PRECISION), avg_value (DOUBLE PRECISION), months_reported (BIGINT)',
+        'key': ['store_name', 'fiscal_year', 'parameter'],
+        'sql': f"""
+            SELECT store_name, MAX(region) AS region,
+                   EXTRACT(YEAR FROM month + INTERVAL '{(13 - FISCAL_YEAR_START_MONTH) % 12} months')::INTEGER AS fiscal_year,
+                   parameter,
+                   SUM(value) AS total_value, AVG(value) AS avg_value,
+                   COUNT(*) AS months_reported
+            FROM mis_long
+            WHERE value IS NOT NULL AND month IS NOT NULL AND store_name IS NOT NULL
+            GROUP BY store_name, 3, parameter
+        """
+    }
+}
+
+def ensure_rollups(cursor) -> List[str]:
+    """Create (and populate) any missing rollup views with the unique index CONCURRENTLY refresh needs"""
+    created = []
+    for name, view in ROLLUP_VIEWS.items():
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(f"CREATE MATERIALIZED VIEW {name} AS {view['sql']}")
+            cursor.execute(f"CREATE UNIQUE INDEX {name}_key ON {name} ({', '.join(view['key'])})")
+            created.append(name)
+    return created
+
+def refresh_rollups(cursor) -> List[str]:
+    """Create missing rollups and refresh the rest without blocking readers. Returns the refreshed views."""
+    created = ensure_rollups(cursor)
+    refreshed = []
+    for name in ROLLUP_VIEWS:
+        if name not in created:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+            refreshed.append(name)
+    return refreshed
+
+def drop_rollups(cursor) -> List[str]:
+    """Drop the rollup views (they pin the table they were built on). Returns the views that existed."""
+    dropped = []
+    for name in ROLLUP_VIEWS:
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(f"DROP MATERIALIZED VIEW {name}")
+            dropped.append(name)
+    return dropped
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+class QueryCancelledError(Exception):
+    """Raised when a query is stopped by its timeout, its deadline or an explicit cancel"""
+    
+    def __init__(self, reason: str, elapsed_ms: float, timeout_ms: Optional[int] = None):
+        self.reason = reason  # 'statement_timeout', 'deadline' or 'cancelled'
+        self.elapsed_ms = int(elapsed_ms)
+        self.timeout_ms = timeout_ms
+        if reason == 'cancelled':
+            message = f"Query cancelled after {self.elapsed_ms:,} ms"
+        else:
+            message = f"Query timed out after {self.elapsed_ms:,} ms (limit {timeout_ms:,} ms)"
+        super().__init__(message)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'error_type': 'query_cancelled' if self.reason == 'cancelled' else 'query_timeout',
+            'reason': self.reason,
+            'elapsed_ms': self.elapsed_ms,
+            'timeout_ms': self.timeout_ms
+        }
+
+class PostgreSQLPool:
+    """Thread-safe PostgreSQL connection pool
+    
+    Connections are checked out per request, health-checked on borrow when
+    they have been idle for a while, and recycled once they exceed their
+    maximum lifetime or idle time.
+    """
+    
+    def __init__(self, connection_string: str, min_size: int = 1, max_size: int = 10,
+                 timeout: float = 30.0, max_lifetime: float = 1800.0, max_idle: float = 300.0,
+                 health_check_after: float = 5.0):
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        
+        self._condition = threading.Condition()
+        self._idle = []  # (connection, created_at, last_used), most recently used last
+        self._created_at = {}  # id(connection) -> creation time
+        self._size = 0
+        self._closed = False
+        
+        self.stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'recycled_lifetime': 0,
+            'recycled_idle': 0,
+            'total_wait_ms': 0.0
+        }
+    
+    def _open(self):
+        """Open a new connection (called without holding the lock)"""
+        connection = psycopg2.connect(self.connection_string)
+        with self._condition:
+            self._created_at[id(connection)] = time.time()
+            self.stats['connections_created'] += 1
+        return connection
+    
+    def _discard(self, connection):
+        """Close a connection and free its slot"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._created_at.pop(id(connection), None)
+            self._size -= 1
+            self.stats['connections_closed'] += 1
+            self._condition.notify()
+    
+    def _is_healthy(self, connection, last_used: float) -> bool:
+        """Run a cheap round trip when the connection has been idle for a while"""
+        if connection.closed:
+            return False
+        if time.time() - last_used < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def getconn(self):
+        """Borrow a connection, waiting up to the pool timeout"""
+        deadline = time.time() + self.timeout
+        waited = False
+        wait_start = time.time()
+        
+        while True:
+            candidate = None
+            with self._condition:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                
+                if self._idle:
+                    candidate = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeoutError(f"No database connection available after {self.timeout:.0f}s")
+                    waited = True
+                    self._condition.wait(remaining)
+                    continue
+            
+            if candidate is None:
+                # A slot was reserved above; open the connection outside the lock
+                try:
+                    connection = self._open()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                break
+            
+            connection, created_at, last_used = candidate
+            now = time.time()
+            if now - created_at > self.max_lifetime:
+                reason = 'recycled_lifetime'
+            elif now - last_used > self.max_idle and self._size > self.min_size:
+                reason = 'recycled_idle'
+            elif not self._is_healthy(connection, last_used):
+                reason = 'health_check_failures'
+            else:
+                break
+            
+            with self._condition:
+                self.stats[reason] += 1
+            self._discard(connection)
+        
+        with self._condition:
+            self.stats['checkouts'] += 1
+            if waited:
+                self.stats['waits'] += 1
+                self.stats['total_wait_ms'] += (time.time() - wait_start) * 1000
+        return connection
+    
+    def putconn(self, connection, discard: bool = False):
+        """Return a borrowed connection; broken connections are closed instead of reused"""
+        if not discard and not connection.closed:
+            try:
+                # Never hand out a connection in the middle of a transaction
+                connection.rollback()
+            except Exception:
+                discard = True
+        
+        if discard or connection.closed or self._closed:
+            self._discard(connection)
+            return
+        
+        with self._condition:
+            created_at = self._created_at.get(id(connection), time.time())
+            self._idle.append((connection, created_at, time.time()))
+            self._condition.notify()
+    
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it
+
+        The connection is also returned on GeneratorExit and KeyboardInterrupt,
+        so a generator abandoned inside the with block doesn't hold its slot.
+        """
+        connection = self.getconn()
+        discard = False
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(connection, discard=discard)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool metrics for monitoring"""
+        with self._condition:
+            stats = dict(self.stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+            stats['avg_wait_ms'] = round(stats['total_wait_ms'] / stats['waits'], 2) if stats['waits'] else 0.0
+            stats['total_wait_ms'] = round(stats['total_wait_ms'], 2)
+        return stats
+    
+    def close(self):
+        """Close all idle connections; borrowed ones are closed when returned"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+def format_result(result: Dict[str, Any]) -> str:
+    """Format a fetch_rows() result for display"""
+    if not result['rows']:
+        return "No results found"
+    
+    output = []
+    
+    # Add header
+    header = " | ".join(f"{col:>15}" for col in result['columns'])
+    output.append(header)
+    output.append("-" * len(header))
+    
+    for row in result['rows']:
+        output.append(" | ".join(f"{str(val):>15}" for val in row))
+    
+    # Add summary
+    row_count = len(result['rows'])
+    if result['truncated']:
+        output.append(f"\n... more rows not shown (limited to {row_count:,} for display)")
+        output.append(f"\nTotal rows: {row_count}+")
+    else:
+        output.append(f"\nTotal rows: {row_count}")
+    
+    return "\n".join(output)
+
 class PostgreSQLClient:
     """Client for interacting with PostgreSQL database"""
     
@@ -25,6 +428,24 @@ class PostgreSQLClient:
         
         self.connection = None
         self.cursor = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def pool(self) -> PostgreSQLPool:
+        """Connection pool used for query execution (created on first use)"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = PostgreSQLPool(
+                        self.connection_string,
+                        min_size=int(os.getenv('PG_POOL_MIN_SIZE', '1')),
+                        max_size=int(os.getenv('PG_POOL_MAX_SIZE', '10')),
+                        timeout=float(os.getenv('PG_POOL_TIMEOUT', '30')),
+                        max_lifetime=float(os.getenv('PG_POOL_MAX_LIFETIME', '1800')),
+                        max_idle=float(os.getenv('PG_POOL_MAX_IDLE', '300'))
+                    )
+        return self._pool
     
     def connect(self):
         """Establish connection to PostgreSQL database"""
@@ -43,65 +464,218 @@ class PostgreSQLClient:
         if self.connection:
             self.connection.close()
     
-    def execute_query(self, sql_query: str) -> str:
-        """Execute SQL query and return results as formatted string"""
+    def close_pool(self):
+        """Close the connection pool"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+    
+    def _query_budget(self, timeout_ms: Optional[int], deadline: Optional[float]):
+        """Effective statement timeout and what it stems from ('statement_timeout' or 'deadline')"""
+        timeout_ms = timeout_ms or STATEMENT_TIMEOUT_MS
+        if deadline is not None:
+            remaining_ms = int((deadline - time.time()) * 1000)
+            if remaining_ms <= 0:
+                raise QueryCancelledError('deadline', 0, timeout_ms)
+            if remaining_ms < timeout_ms:
+                return remaining_ms, 'deadline'
+        return timeout_ms, 'statement_timeout'
+    
+    def _begin_read_only(self, connection, timeout_ms: int, query_id: Optional[str]):
+        """Start a read-only transaction with per-query limits and an optional cancel tag"""
+        with connection.cursor() as setup:
+            setup.execute("SET TRANSACTION READ ONLY")
+            setup.execute(
+                "SELECT set_config('statement_timeout', %s, true), set_config('work_mem', %s, true)",
+                (str(timeout_ms), QUERY_WORK_MEM)
+            )
+            if query_id:
+                setup.execute("SELECT set_config('application_name', %s, true)", (f"mis-query-{query_id}",))
+    
+    def _fetch_scalar(self, sql_query: str, timeout_ms: Optional[int] = None,
+                      query_id: Optional[str] = None, deadline: Optional[float] = None):
+        """Run a single-value statement (EXPLAIN, COUNT) under the same limits as stream_query"""
+        start_time = time.time()
+        timeout_ms, reason = self._query_budget(timeout_ms, deadline)
+        with self.pool.connection() as connection:
+            try:
+                self._begin_read_only(connection, timeout_ms, query_id)
+                with connection.cursor() as cursor:
+                    cursor.execute(sql_query)
+                    return cursor.fetchone()[0]
+            except psycopg2.extensions.QueryCanceledError as e:
+                cancelled = 'user request' in str(e)
+                raise QueryCancelledError('cancelled' if cancelled else reason,
+                                          (time.time() - start_time) * 1000, timeout_ms) from None
+    
+    def fetch_rows(self, sql_query: str, max_rows: int = MAX_RESULT_ROWS, timeout_ms: Optional[int] = None,
+                   query_id: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Run a row-returning query; returns columns, up to max_rows rows and whether more exist"""
+        # Fetch one row past the cap to know whether the result was truncated
+        stream = self.stream_query(sql_query, max_rows=max_rows + 1, timeout_ms=timeout_ms,
+                                   query_id=query_id, deadline=deadline)
         try:
-            if not self.connection or self.connection.closed:
-                if not self.connect():
-                    return "Error: Could not connect to database"
-            
-            # Execute the query
-            self.cursor.execute(sql_query)
-            
-            # Check if it's a SELECT query
-            if sql_query.strip().upper().startswith('SELECT'):
-                # Fetch results
-                results = self.cursor.fetchall()
-                columns = [desc[0] for desc in self.cursor.description]
+            columns = next(stream)
+            rows = list(stream)
+        finally:
+            stream.close()
+        return {'columns': columns, 'rows': rows[:max_rows], 'truncated': len(rows) > max_rows}
+    
+    def estimate_rows(self, sql_query: str, **limits) -> int:
+        """Planner row estimate for a query, from EXPLAIN (FORMAT JSON); the query is not run"""
+        plan = self._fetch_scalar(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}", **limits)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    
+    def count_rows(self, sql_query: str, **limits) -> int:
+        """Exact row count of a query (runs it in full)"""
+        return int(self._fetch_scalar(
+            f"SELECT COUNT(*) FROM ({sql_query.strip().rstrip(';')}) AS counted", **limits
+        ))
+    
+    def stream_query(self, sql_query: str, max_rows: int = MAX_RESULT_ROWS,
+                     batch_size: int = STREAM_BATCH_SIZE, timeout_ms: Optional[int] = None,
+                     query_id: Optional[str] = None, deadline: Optional[float] = None) -> Iterator:
+        """Stream a SELECT through a named (server-side) cursor
+        
+        Yields the list of column names first, then result rows one at a
+        time. At most max_rows rows are fetched from the server, in batches
+        of batch_size, so a broad query never materializes in worker memory.
+        Closing the generator early closes the cursor and returns the
+        connection to the pool. fetch_rows() still collects the capped rows
+        into a list for format_result().
+        
+        The query runs in a read-only transaction with statement_timeout
+        (timeout_ms, capped by the absolute deadline) and work_mem set locally.
+        Raises QueryCancelledError on timeout or when cancel_query(query_id) is called.
+        """
+        start_time = time.time()
+        timeout_ms, reason = self._query_budget(timeout_ms, deadline)
+        
+        def elapsed_ms() -> float:
+            return (time.time() - start_time) * 1000
+        
+        with self.pool.connection() as connection:
+            cursor = None
+            try:
+                self._begin_read_only(connection, timeout_ms, query_id)
                 
-                if results:
-                    return self._format_results(results, columns)
-                else:
-                    return "No results found"
-            else:
-                # For non-SELECT queries, commit the transaction
-                self.connection.commit()
-                return "Query executed successfully"
+                cursor = connection.cursor(name=f"mis_stream_{uuid.uuid4().hex}")
+                cursor.itersize = batch_size
+                cursor.execute(sql_query)
+                
+                remaining = max_rows
+                rows = cursor.fetchmany(min(batch_size, remaining))
+                yield [desc[0] for desc in cursor.description]
+                
+                while rows:
+                    for row in rows:
+                        yield row
+                    # A short batch means the server has no more rows
+                    if len(rows) < min(batch_size, remaining):
+                        break
+                    remaining -= len(rows)
+                    if remaining <= 0:
+                        break
+                    # statement_timeout applies per FETCH; enforce the budget for the whole query here
+                    if elapsed_ms() > timeout_ms:
+                        raise QueryCancelledError(reason, elapsed_ms(), timeout_ms)
+                    rows = cursor.fetchmany(min(batch_size, remaining))
+            except psycopg2.extensions.QueryCanceledError as e:
+                cancelled = 'user request' in str(e)
+                raise QueryCancelledError('cancelled' if cancelled else reason, elapsed_ms(), timeout_ms) from None
+            finally:
+                if cursor is not None:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        # Closing a named cursor fails in an aborted transaction; putconn rolls it back
+                        pass
+    
+    def execute_query(self, sql_query: str, timeout_ms: Optional[int] = None,
+                      query_id: Optional[str] = None, deadline: Optional[float] = None) -> str:
+        """Execute SQL query read-only on a pooled connection and return results as formatted string
+        
+        Timeouts and cancellations raise QueryCancelledError; other failures
+        are returned as an error string.
+        """
+        try:
+            # Queries that return rows are streamed through a server-side cursor
+            if sql_query.strip().upper().startswith(('SELECT', 'WITH', 'VALUES', 'TABLE')):
+                return format_result(self.fetch_rows(sql_query, timeout_ms=timeout_ms,
+                                                     query_id=query_id, deadline=deadline))
+            
+            with self.pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Writes are rejected by the read-only transaction
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                                   (str(timeout_ms or STATEMENT_TIMEOUT_MS),))
+                    cursor.execute(sql_query)
+                    return "Query executed successfully"
                 
+        except QueryCancelledError:
+            raise
+        except PoolTimeoutError as e:
+            return f"Error: {e}"
         except Exception as e:
             return f"Error executing query: {e}"
     
-    def _format_results(self, results: List[tuple], columns: List[str]) -> str:
-        """Format query results for display"""
-        if not results:
-            return "No results found"
-        
-        # Convert to DataFrame for better formatting
-        df = pd.DataFrame(results, columns=columns)
-        
-        # Format the output similar to DuckDB's table format
-        output = []
+    def cancel_query(self, query_id: str) -> bool:
+        """Cancel the statement running under query_id in any worker. Returns True if one was found."""
+        if not QUERY_ID_PATTERN.match(query_id or ''):
+            return False
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_cancel_backend(pid) FROM pg_stat_activity "
+                    "WHERE application_name = %s AND pid <> pg_backend_pid()",
+                    (f"mis-query-{query_id}",)
+                )
+                return any(row[0] for row in cursor.fetchall())
+    
+    def create_table(self, layout: Optional[str] = None):
+        """Create the mis_long table in PostgreSQL
         
-        # Add header
-        header = " | ".join(f"{col:>15}" for col in columns)
-        output.append(header)
-        output.append("-" * len(header))
+        layout 'flat' (default, PG_TABLE_LAYOUT) is a plain table with single-column
+        B-tree indexes. 'partitioned' range-partitions by fiscal year of month so
+        month-bounded queries prune whole years, with a BRIN index on month and
+        (parameter, month) INCLUDE (value) for index-only parameter lookups.
+        Fiscal-year partitions are added by the loaders as data arrives.
+        """
+        layout = layout or TABLE_LAYOUT
+        if layout not in ('flat', 'partitioned'):
+            raise ValueError(f"Unknown table layout: {layout}")
         
-        # Add rows (limit to 1000 for display)
-        for _, row in df.head(1000).iterrows():
-            row_str = " | ".join(f"{str(val):>15}" for val in row.values)
-            output.append(row_str)
+        if layout == 'partitioned':
+            return self._execute_ddl("""
+        CREATE TABLE IF NOT EXISTS mis_long (
+            id SERIAL,
+            store_name TEXT,
+            parameter TEXT,
+            cafe_code TEXT,
+            region TEXT,
+            category TEXT,
+            for_ssg TEXT,
+            area_store DOUBLE PRECISION,
+            store_start_date DATE,
+            vintage TEXT,
+            month DATE NOT NULL,
+            value DOUBLE PRECISION,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (id, month)
+        ) PARTITION BY RANGE (month);
         
-        # Add summary
-        if len(df) > 1000:
-            output.append(f"\n... and {len(df) - 1000} more rows")
+        -- Catches rows outside the fiscal-year partitions until one is created for them
+        CREATE TABLE IF NOT EXISTS mis_long_default PARTITION OF mis_long DEFAULT;
         
-        output.append(f"\nTotal rows: {len(df)}")
+        -- Months are loaded in order, so BRIN summarises each partition in a few pages
+        CREATE INDEX IF NOT EXISTS idx_mis_long_month_brin ON mis_long USING BRIN (month);
+        CREATE INDEX IF NOT EXISTS idx_mis_long_parameter_month ON mis_long(parameter, month) INCLUDE (value);
+        CREATE INDEX IF NOT EXISTS idx_mis_long_store_name ON mis_long(store_name);
+        """)
         
-        return "\n".join(output)
-    
-    def create_table(self):
-        """Create the mis_long table in PostgreSQL"""
         create_table_sql = """
         CREATE TABLE IF NOT EXISTS mis_long (
             id SERIAL PRIMARY KEY,
@@ -126,19 +700,47 @@ class PostgreSQLClient:
         CREATE INDEX IF NOT EXISTS idx_mis_long_region ON mis_long(region);
         CREATE INDEX IF NOT EXISTS idx_mis_long_category ON mis_long(category);
         """
-        
+        return self._execute_ddl(create_table_sql)
+    
+    def _execute_ddl(self, ddl: str) -> bool:
+        """Run schema statements on the migration connection"""
         try:
             if not self.connection or self.connection.closed:
                 if not self.connect():
                     return False
             
-            self.cursor.execute(create_table_sql)
+            self.cursor.execute(ddl)
             self.connection.commit()
             return True
         except Exception as e:
+            self.connection.rollback()
             print(f"Error creating table: {e}")
             return False
     
+    def available_rollups(self) -> List[str]:
+        """Rollup views that exist in the database"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT matviewname FROM pg_matviews "
+                    "WHERE schemaname = current_schema() AND matviewname = ANY(%s)",
+                    (list(ROLLUP_VIEWS),)
+                )
+                existing = {row[0] for row in cursor.fetchall()}
+        return [name for name in ROLLUP_VIEWS if name in existing]
+    
+    def is_partitioned(self, table: str = 'mis_long') -> bool:
+        """Whether a table uses declarative partitioning"""
+        if not self.connection or self.connection.closed:
+            if not self.connect():
+                return False
+        self.cursor.execute(
+            "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(%s)", (table,)
+        )
+        row = self.cursor.fetchone()
+        self.connection.commit()
+        return bool(row and row[0])
+    
     def get_table_info(self) -> str:
         """Get information about the mis_long table"""
         try:
@@ -183,18 +785,62 @@ class PostgreSQLClient:
 
 # Global instance
 postgres_client = None
+_client_lock = threading.Lock()
 
 def get_postgres_client() -> PostgreSQLClient:
     """Get or create the global PostgreSQL client instance"""
     global postgres_client
     if postgres_client is None:
-        postgres_client = PostgreSQLClient()
+        with _client_lock:
+            if postgres_client is None:
+                postgres_client = PostgreSQLClient()
     return postgres_client
 
-def execute_sql_query(sql_query: str) -> str:
-    """Execute SQL query using PostgreSQL (replaces DuckDB function)"""
+def get_pool_stats() -> Optional[Dict[str, Any]]:
+    """Connection pool metrics, or None if no query has run yet"""
+    if postgres_client is None or postgres_client._pool is None:
+        return None
+    return postgres_client._pool.get_stats()
+
+def execute_sql_query(sql_query: str, query_id: Optional[str] = None,
+                      deadline: Optional[float] = None) -> str:
+    """Execute SQL query using PostgreSQL (replaces DuckDB function)
+    
+    Raises QueryCancelledError when the query times out or is cancelled.
+    """
     client = get_postgres_client()
-    return client.execute_query(sql_query)
+    if query_id and not QUERY_ID_PATTERN.match(query_id):
+        query_id = None
+    start_time = time.time()
+    try:
+        output = client.execute_query(sql_query, query_id=query_id, deadline=deadline)
+    except QueryCancelledError:
+        record_query(sql_query, (time.time() - start_time) * 1000, False)
+        raise
+    record_query(sql_query, (time.time() - start_time) * 1000, not output.startswith('Error'))
+    return output
+
+def run_sql_query(sql_query: str, query_id: Optional[str] = None,
+                  deadline: Optional[float] = None) -> Dict[str, Any]:
+    """Like execute_sql_query, but return fetch_rows() data instead of formatted text
+    
+    Raises QueryCancelledError on timeout/cancel and propagates other database errors.
+    """
+    client = get_postgres_client()
+    if query_id and not QUERY_ID_PATTERN.match(query_id):
+        query_id = None
+    start_time = time.time()
+    try:
+        result = client.fetch_rows(sql_query, query_id=query_id, deadline=deadline)
+    except Exception:
+        record_query(sql_query, (time.time() - start_time) * 1000, False)
+        raise
+    record_query(sql_query, (time.time() - start_time) * 1000, True)
+    return result
+
+def cancel_query(query_id: str) -> bool:
+    """Cancel a running query started with this query_id"""
+    return get_postgres_client().cancel_query(query_id)
 
 if __name__ == "__main__":
     # Test the client
@@ -0,0 +1,779 @@
+#!/usr/bin/env python3
+"""
+SQL to PostgREST Translator for BT MIS Analytics
+Parses a single-table SELECT into a small AST and pushes projection, filters,
+ordering and limits down into PostgREST query parameters. Anything PostgREST
+can't evaluate raises PushdownError instead of falling back to fetching
+unfiltered rows.
+
+Usage:
+    python postgrest_query.py "SELECT store_name, value FROM mis_long WHERE parameter = 'Revenue' LIMIT 5"
+"""
+
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+class PushdownError(ValueError):
+    """Raised for SQL that can't be expressed as PostgREST query parameters"""
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<ws>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<qident>"(?:[^"]|"")+")
+  | (?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><>|!=|<=|>=|::|\|\||[=<>(),.*;+\-/%])
+""", re.VERBOSE | re.DOTALL)
+
+COMPARISON_OPS = {'=': 'eq', '<>': 'neq', '!=': 'neq', '<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte'}
+FLIPPED_OPS = {'=': '=', '<>': '<>', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+NEGATED_OPS = {'eq': 'neq', 'neq': 'eq', 'lt': 'gte', 'lte': 'gt', 'gt': 'lte', 'gte': 'lt'}
+ARITHMETIC_OPS = {'+', '-', '*', '/', '%', '||'}
+AGGREGATES = {'SUM', 'AVG', 'COUNT', 'MIN', 'MAX', 'STDDEV', 'VARIANCE', 'ARRAY_AGG', 'STRING_AGG'}
+
+# Characters that make PostgREST misread a value inside in.(...) or or=(...)
+RESERVED_VALUE_CHARS = set(',.:()"\\ ')
+
+def tokenize(sql: str) -> List[Tuple[str, str]]:
+    """Split SQL into (kind, text) tokens; kind is string, qident, number, ident or op"""
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = TOKEN_PATTERN.match(sql, position)
+        if not match:
+            raise PushdownError(f"could not parse SQL near {sql[position:position + 20]!r}")
+        if match.lastgroup != 'ws':
+            tokens.append((match.lastgroup, match.group()))
+        position = match.end()
+    return tokens
+
+# AST nodes are plain tuples tagged by their first element:
+#   ('column', name)                      ('literal', value)
+#   ('func', NAME, [args])                ('extract', field, operand)
+#   ('compare', op, left, right)          ('in', operand, [values], negated)
+#   ('between', operand, low, high, negated)
+#   ('is', operand, 'null'|'true'|'false', negated)
+#   ('like', operand, pattern, negated, case_insensitive)
+#   ('and', [items])  ('or', [items])  ('not', item)
+
+class SelectStatement:
+    """Parsed SELECT: columns [(expr, alias)] or None for *, table, where, order [(expr, desc, nulls)], limit, offset"""
+
+    def __init__(self):
+        self.columns = None
+        self.table = None
+        self.where = None
+        self.order = []
+        self.limit = None
+        self.offset = None
+        self.group_by = []
+
+class _Parser:
+    """Recursive-descent parser for the SELECT subset PostgREST can serve"""
+
+    def __init__(self, sql: str):
+        self.tokens = tokenize(sql)
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else ('end', '')
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def at_keyword(self, *words: str) -> bool:
+        kind, text = self.peek()
+        return kind == 'ident' and text.upper() in words
+
+    def accept_keyword(self, *words: str) -> bool:
+        if self.at_keyword(*words):
+            self.position += 1
+            return True
+        return False
+
+    def expect_keyword(self, word: str):
+        if not self.accept_keyword(word):
+            raise PushdownError(f"expected {word} near {self.peek()[1]!r}")
+
+    def accept_op(self, op: str) -> bool:
+        if self.peek() == ('op', op):
+            self.position += 1
+            return True
+        return False
+
+    def expect_op(self, op: str):
+        if not self.accept_op(op):
+            raise PushdownError(f"expected '{op}' near {self.peek()[1]!r}")
+
+    def identifier(self) -> str:
+        kind, text = self.next()
+        if kind == 'qident':
+            return text[1:-1].replace('""', '"')
+        if kind == 'ident':
+            return text.lower()
+        raise PushdownError(f"expected a column or table name near {text!r}")
+
+    def parse(self, allow_group_by: bool = False) -> SelectStatement:
+        statement = SelectStatement()
+        if self.at_keyword('WITH'):
+            raise PushdownError("WITH (common table expressions)")
+        self.expect_keyword('SELECT')
+        if self.at_keyword('DISTINCT'):
+            raise PushdownError("SELECT DISTINCT")
+        self.accept_keyword('ALL')
+
+        if self.accept_op('*'):
+            statement.columns = None
+        else:
+            statement.columns = [self.select_item()]
+            while self.accept_op(','):
+                statement.columns.append(self.select_item())
+
+        self.expect_keyword('FROM')
+        if self.peek() == ('op', '('):
+            raise PushdownError("subquery in FROM")
+        statement.table = self.identifier()
+        if self.accept_op('.'):
+            # schema-qualified: keep the table name
+            statement.table = self.identifier()
+        if self.accept_keyword('AS') or (self.peek()[0] in ('ident', 'qident') and not self.at_keyword(
+                'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET', 'JOIN', 'INNER', 'LEFT', 'RIGHT',
+                'FULL', 'CROSS', 'NATURAL', 'UNION', 'INTERSECT', 'EXCEPT', 'WINDOW', 'FETCH')):
+            self.identifier()
+
+        if self.at_keyword('JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'NATURAL') or self.peek() == ('op', ','):
+            raise PushdownError("JOIN")
+        if self.accept_keyword('WHERE'):
+            statement.where = self.boolean_or()
+        if self.at_keyword('GROUP'):
+            if not allow_group_by:
+                raise PushdownError("GROUP BY aggregation")
+            self.next()
+            self.expect_keyword('BY')
+            statement.group_by = [self.operand()]
+            while self.accept_op(','):
+                statement.group_by.append(self.operand())
+        if self.at_keyword('HAVING'):
+            raise PushdownError("HAVING")
+        if self.at_keyword('WINDOW'):
+            raise PushdownError("window functions")
+        if self.accept_keyword('ORDER'):
+            self.expect_keyword('BY')
+            statement.order = [self.order_item()]
+            while self.accept_op(','):
+                statement.order.append(self.order_item())
+        # LIMIT and OFFSET may come in either order
+        for _ in range(2):
+            if self.accept_keyword('LIMIT'):
+                statement.limit = None if self.accept_keyword('ALL') else self.integer('LIMIT')
+            elif self.accept_keyword('OFFSET'):
+                statement.offset = self.integer('OFFSET')
+                self.accept_keyword('ROWS', 'ROW')
+        self.accept_op(';')
+
+        if self.at_keyword('UNION', 'INTERSECT', 'EXCEPT'):
+            raise PushdownError(self.peek()[1].upper())
+        if self.peek()[0] != 'end':
+            raise PushdownError(f"unexpected {self.peek()[1]!r}")
+        return statement
+
+    def integer(self, clause: str) -> int:
+        kind, text = self.next()
+        if kind != 'number' or not text.isdigit():
+            raise PushdownError(f"{clause} must be a constant integer")
+        return int(text)
+
+    def select_item(self):
+        expression = self.operand()
+        alias = None
+        if self.accept_keyword('AS') or self.peek()[0] == 'qident' or (
+                self.peek()[0] == 'ident' and not self.at_keyword('FROM')):
+            alias = self.identifier()
+        return expression, alias
+
+    def order_item(self):
+        expression = self.operand()
+        desc = False
+        if self.accept_keyword('DESC'):
+            desc = True
+        else:
+            self.accept_keyword('ASC')
+        nulls = None
+        if self.accept_keyword('NULLS'):
+            if self.accept_keyword('FIRST'):
+                nulls = 'nullsfirst'
+            else:
+                self.expect_keyword('LAST')
+                nulls = 'nullslast'
+        return expression, desc, nulls
+
+    def boolean_or(self):
+        items = [self.boolean_and()]
+        while self.accept_keyword('OR'):
+            items.append(self.boolean_and())
+        return items[0] if len(items) == 1 else ('or', items)
+
+    def boolean_and(self):
+        items = [self.boolean_not()]
+        while self.accept_keyword('AND'):
+            items.append(self.boolean_not())
+        return items[0] if len(items) == 1 else ('and', items)
+
+    def boolean_not(self):
+        if self.accept_keyword('NOT'):
+            return ('not', self.boolean_not())
+        if self.peek() == ('op', '(') and not self.at_subquery(1):
+            # A parenthesized condition; operands never start with '(' in this subset
+            self.next()
+            condition = self.boolean_or()
+            self.expect_op(')')
+            return condition
+        return self.predicate()
+
+    def at_subquery(self, offset: int = 0) -> bool:
+        kind, text = self.peek(offset)
+        return kind == 'ident' and text.upper() in ('SELECT', 'WITH')
+
+    def predicate(self):
+        left = self.operand()
+        kind, text = self.peek()
+
+        if kind == 'op' and text in COMPARISON_OPS:
+            self.next()
+            if self.at_keyword('ANY', 'ALL', 'SOME'):
+                raise PushdownError(f"{self.peek()[1].upper()}(...) comparison")
+            return ('compare', text, left, self.operand())
+
+        negated = self.accept_keyword('NOT')
+        if self.accept_keyword('IN'):
+            self.expect_op('(')
+            if self.at_subquery():
+                raise PushdownError("IN (subquery)")
+            values = [self.operand()]
+            while self.accept_op(','):
+                values.append(self.operand())
+            self.expect_op(')')
+            return ('in', left, values, negated)
+        if self.accept_keyword('BETWEEN'):
+            if self.at_keyword('SYMMETRIC'):
+                raise PushdownError("BETWEEN SYMMETRIC")
+            low = self.operand()
+            self.expect_keyword('AND')
+            return ('between', left, low, self.operand(), negated)
+        if self.at_keyword('LIKE', 'ILIKE'):
+            case_insensitive = self.next()[1].upper() == 'ILIKE'
+            return ('like', left, self.operand(), negated, case_insensitive)
+        if negated:
+            raise PushdownError(f"unexpected {self.peek()[1]!r} after NOT")
+        if self.accept_keyword('IS'):
+            negated = self.accept_keyword('NOT')
+            if self.accept_keyword('DISTINCT'):
+                raise PushdownError("IS DISTINCT FROM")
+            kind, text = self.next()
+            if text.upper() not in ('NULL', 'TRUE', 'FALSE'):
+                raise PushdownError(f"IS {text}")
+            return ('is', left, text.lower(), negated)
+        if left[0] == 'column':
+            # A bare boolean column
+            return ('is', left, 'true', False)
+        raise PushdownError(f"unsupported condition near {text!r}")
+
+    def operand(self):
+        node = self.primary()
+        while self.accept_op('::'):
+            type_name = self.identifier()
+            if node[0] != 'literal':
+                raise PushdownError(f"cast of a column to {type_name}")
+            # Literal casts ('2024-01-01'::date) keep their text; PostgREST casts it to the column type
+            if self.at_keyword('PRECISION', 'VARYING'):
+                self.next()
+        kind, text = self.peek()
+        if kind == 'op' and text in ARITHMETIC_OPS:
+            raise PushdownError(f"arithmetic expression ('{text}')")
+        if self.at_keyword('OVER'):
+            raise PushdownError("window functions")
+        return node
+
+    def primary(self):
+        kind, text = self.peek()
+
+        if kind == 'number':
+            self.next()
+            return ('literal', float(text) if any(c in text for c in '.eE') else int(text))
+        if kind == 'op' and text == '-' and self.peek(1)[0] == 'number':
+            self.next()
+            value = self.primary()[1]
+            return ('literal', -value)
+        if kind == 'string':
+            self.next()
+            return ('literal', text[1:-1].replace("''", "'"))
+        if kind == 'op' and text == '(':
+            if self.at_subquery(1):
+                raise PushdownError("subquery")
+            self.next()
+            node = self.operand()
+            self.expect_op(')')
+            return node
+        if kind == 'op' and text == '*':
+            raise PushdownError("'*' mixed with other select items")
+        if kind not in ('ident', 'qident'):
+            raise PushdownError(f"unexpected {text!r}")
+
+        word = text.upper() if kind == 'ident' else None
+        if word in ('TRUE', 'FALSE'):
+            self.next()
+            return ('literal', word == 'TRUE')
+        if word == 'NULL':
+            self.next()
+            return ('literal', None)
+        if word in ('DATE', 'TIMESTAMP') and self.peek(1)[0] == 'string':
+            self.next()
+            value = self.primary()[1]
+            return ('literal', value)
+        if word in ('CURRENT_DATE', 'CURRENT_TIMESTAMP', 'NOW', 'LOCALTIMESTAMP', 'INTERVAL'):
+            raise PushdownError(f"{text} (relative dates are evaluated by the database)")
+        if word == 'CASE':
+            raise PushdownError("CASE expression")
+        if word == 'EXISTS':
+            raise PushdownError("EXISTS (subquery)")
+        if word == 'EXTRACT' and self.peek(1) == ('op', '('):
+            self.next()
+            self.next()
+            field = self.identifier()
+            self.expect_keyword('FROM')
+            operand = self.operand()
+            self.expect_op(')')
+            return ('extract', field, operand)
+        if word == 'CAST' and self.peek(1) == ('op', '('):
+            self.next()
+            self.next()
+            node = self.operand()
+            self.expect_keyword('AS')
+            type_name = self.identifier()
+            while self.peek()[0] == 'ident':
+                self.next()
+            self.expect_op(')')
+            if node[0] != 'literal':
+                raise PushdownError(f"cast of a column to {type_name}")
+            return node
+
+        name = self.identifier()
+        if self.accept_op('('):
+            if self.accept_op('*'):
+                args = [('star',)]
+            elif self.accept_op(')'):
+                return ('func', name.upper(), [])
+            else:
+                if self.accept_keyword('DISTINCT'):
+                    raise PushdownError(f"{name.upper()}(DISTINCT ...)")
+                args = [self.operand()]
+                while self.accept_op(','):
+                    args.append(self.operand())
+            self.expect_op(')')
+            if self.at_keyword('FILTER', 'WITHIN'):
+                raise PushdownError(f"{name.upper()}(...) {self.peek()[1].upper()}")
+            return ('func', name.upper(), args)
+        if self.accept_op('.'):
+            # table- or alias-qualified column
+            name = self.identifier()
+        return ('column', name)
+
+def parse_select(sql: str, allow_group_by: bool = False) -> SelectStatement:
+    """Parse a single-table SELECT; raises PushdownError for anything outside the supported subset"""
+    return _Parser(sql).parse(allow_group_by)
+
+class PostgrestQuery:
+    """A translated query: GET {table} with params
+
+    When count_only is set, the result is the total from Content-Range of a
+    request sent with 'Prefer: count=exact', reported as column count_alias.
+    """
+
+    def __init__(self, table: str, select: str, filters: List[Tuple[str, str]], order: Optional[str],
+                 limit: Optional[int], offset: Optional[int], count_only: bool = False,
+                 count_alias: str = 'count'):
+        self.table = table
+        self.select = select
+        self.filters = filters
+        self.order = order
+        self.limit = limit
+        self.offset = offset
+        self.count_only = count_only
+        self.count_alias = count_alias
+
+    def params(self, default_limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Query-string parameters; default_limit applies when the SQL has no LIMIT"""
+        params = [('select', self.select)] + list(self.filters)
+        if self.order:
+            params.append(('order', self.order))
+        limit = self.limit if self.limit is not None else default_limit
+        if limit is not None:
+            params.append(('limit', str(limit)))
+        if self.offset:
+            params.append(('offset', str(self.offset)))
+        return params
+
+    def __repr__(self):
+        return f"PostgrestQuery({self.table!r}, {self.params()!r}, count_only={self.count_only})"
+
+def _literal_text(value: Any) -> str:
+    """A literal as PostgREST expects it in a filter value"""
+    if value is None:
+        raise PushdownError("comparison with NULL (use IS NULL)")
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _quoted(text: str) -> str:
+    """Double-quote a value for use inside in.(...) or a logic tree when it contains reserved characters"""
+    if text and not RESERVED_VALUE_CHARS.intersection(text):
+        return text
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _column_name(node, context: str) -> str:
+    if node[0] == 'column':
+        return node[1]
+    if node[0] == 'func':
+        if node[1] in AGGREGATES:
+            raise PushdownError(f"aggregate {node[1]}() in {context}")
+        raise PushdownError(f"function {node[1]}() in {context}")
+    if node[0] == 'extract':
+        raise PushdownError(f"EXTRACT({node[1].upper()} ...) in {context}")
+    raise PushdownError(f"constant in {context}")
+
+def _literal(node, context: str) -> Any:
+    if node[0] != 'literal':
+        if node[0] == 'column':
+            raise PushdownError(f"comparison between columns in {context}")
+        _column_name(node, context)
+    return node[1]
+
+def _year_of(node) -> Optional[str]:
+    """Column whose calendar year is taken by EXTRACT(YEAR FROM col) or DATE_PART('year', col)"""
+    if node[0] == 'extract' and node[1] == 'year' and node[2][0] == 'column':
+        return node[2][1]
+    if (node[0] == 'func' and node[1] == 'DATE_PART' and len(node[2]) == 2
+            and node[2][0] == ('literal', 'year') and node[2][1][0] == 'column'):
+        return node[2][1][1]
+    return None
+
+def _year_bound(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or int(value) != value:
+        raise PushdownError(f"year compared with {value!r}")
+    return int(value)
+
+class _Condition:
+    """One PostgREST filter: a column operator (key=column) or a logic group (key=and/or)"""
+
+    def __init__(self, key: str, operator: str = '', value: str = '', items: Optional[List['_Condition']] = None,
+                 negated: bool = False):
+        self.key = key
+        self.operator = operator
+        self.value = value
+        self.items = items
+        self.negated = negated
+
+    def param(self) -> Tuple[str, str]:
+        """As a top-level query parameter: ('month', 'gte.2024-01-01') or ('or', '(...)')"""
+        if self.items is not None:
+            return (f"not.{self.key}" if self.negated else self.key, self.inline_items())
+        prefix = 'not.' if self.negated else ''
+        return (self.key, f"{prefix}{self.operator}.{self.value}")
+
+    def inline(self) -> str:
+        """As an element of a logic tree: month.gte.2024-01-01 or or(...)"""
+        if self.items is not None:
+            return f"{'not.' if self.negated else ''}{self.key}{self.inline_items()}"
+        prefix = 'not.' if self.negated else ''
+        value = self.value
+        if self.operator not in ('in', 'is'):
+            value = _quoted(value)
+        return f"{self.key}.{prefix}{self.operator}.{value}"
+
+    def inline_items(self) -> str:
+        return '(' + ','.join(item.inline() for item in self.items) + ')'
+
+def _group(key: str, items: List[_Condition]) -> _Condition:
+    return items[0] if len(items) == 1 else _Condition(key, items=items)
+
+def _negate(condition: _Condition) -> _Condition:
+    if condition.items is None and not condition.negated and condition.operator in NEGATED_OPS:
+        return _Condition(condition.key, NEGATED_OPS[condition.operator], condition.value)
+    return _Condition(condition.key, condition.operator, condition.value, condition.items, not condition.negated)
+
+def _year_conditions(column: str, op: str, year: int) -> List[_Condition]:
+    """Date-range filters equivalent to comparing the year of a date column"""
+    start = lambda y: date(y, 1, 1).isoformat()
+    if op == '=':
+        return [_Condition(column, 'gte', start(year)), _Condition(column, 'lt', start(year + 1))]
+    if op in ('<>', '!='):
+        return [_Condition('or', items=[_Condition(column, 'lt', start(year)),
+                                         _Condition(column, 'gte', start(year + 1))])]
+    return {
+        '>=': [_Condition(column, 'gte', start(year))],
+        '>': [_Condition(column, 'gte', start(year + 1))],
+        '<': [_Condition(column, 'lt', start(year))],
+        '<=': [_Condition(column, 'lt', start(year + 1))]
+    }[op]
+
+def _conditions(node) -> List[_Condition]:
+    """Translate a WHERE node into conditions that must all hold"""
+    kind = node[0]
+
+    if kind == 'and':
+        return [condition for item in node[1] for condition in _conditions(item)]
+    if kind == 'or':
+        return [_Condition('or', items=[_group('and', _conditions(item)) for item in node[1]])]
+    if kind == 'not':
+        inner = _conditions(node[1])
+        if len(inner) == 1:
+            return [_negate(inner[0])]
+        return [_Condition('and', items=inner, negated=True)]
+
+    if kind == 'compare':
+        op, left, right = node[1], node[2], node[3]
+        if left[0] == 'literal' and right[0] != 'literal':
+            op, left, right = FLIPPED_OPS[op], right, left
+        year_column = _year_of(left)
+        if year_column:
+            return _year_conditions(year_column, op, _year_bound(_literal(right, 'WHERE')))
+        column = _column_name(left, 'WHERE')
+        return [_Condition(column, COMPARISON_OPS[op], _literal_text(_literal(right, 'WHERE')))]
+
+    if kind == 'in':
+        operand, values, negated = node[1], node[2], node[3]
+        year_column = _year_of(operand)
+        if year_column:
+            options = [_group('and', _year_conditions(year_column, '=', _year_bound(_literal(v, 'WHERE'))))
+                       for v in values]
+            condition = _group('or', options)
+            return [_negate(condition)] if negated else [condition]
+        column = _column_name(operand, 'WHERE')
+        listed = ','.join(_quoted(_literal_text(_literal(v, 'WHERE'))) for v in values)
+        return [_Condition(column, 'in', f"({listed})", negated=negated)]
+
+    if kind == 'between':
+        operand, low, high, negated = node[1], node[2], node[3], node[4]
+        year_column = _year_of(operand)
+        if year_column:
+            conditions = (_year_conditions(year_column, '>=', _year_bound(_literal(low, 'WHERE'))) +
+                          _year_conditions(year_column, '<=', _year_bound(_literal(high, 'WHERE'))))
+        else:
+            column = _column_name(operand, 'WHERE')
+            conditions = [_Condition(column, 'gte', _literal_text(_literal(low, 'WHERE'))),
+                          _Condition(column, 'lte', _literal_text(_literal(high, 'WHERE')))]
+        if negated:
+            return [_Condition('or', items=[_negate(condition) for condition in conditions])]
+        return conditions
+
+    if kind == 'is':
+        column = _column_name(node[1], 'WHERE')
+        return [_Condition(column, 'is', node[2], negated=node[3])]
+
+    if kind == 'like':
+        column = _column_name(node[1], 'WHERE')
+        pattern = _literal(node[2], 'WHERE')
+        if not isinstance(pattern, str):
+            raise PushdownError("LIKE with a non-string pattern")
+        # PostgREST uses * as the multi-character wildcard in URLs
+        return [_Condition(column, 'ilike' if node[4] else 'like', pattern.replace('%', '*'), negated=node[3])]
+
+    raise PushdownError(f"unsupported condition {kind}")
+
+def _order_column(expression, columns) -> str:
+    """Column to order by: a column, a select alias or a 1-based select position"""
+    if expression[0] == 'literal' and isinstance(expression[1], int) and not isinstance(expression[1], bool):
+        if columns is None or not 1 <= expression[1] <= len(columns):
+            raise PushdownError(f"ORDER BY position {expression[1]}")
+        expression = columns[expression[1] - 1][0]
+    elif expression[0] == 'column' and columns:
+        for selected, alias in columns:
+            if alias == expression[1]:
+                expression = selected
+                break
+    return _column_name(expression, 'ORDER BY')
+
+def translate_sql(sql: str) -> PostgrestQuery:
+    """Translate a SELECT on one table into PostgREST parameters
+
+    Pushed down: column projection and aliases, comparisons, IN, BETWEEN, LIKE/ILIKE,
+    IS [NOT] NULL, AND/OR/NOT, EXTRACT(YEAR ...)/DATE_PART('year', ...) comparisons
+    (as date ranges), ORDER BY, LIMIT/OFFSET, and a bare COUNT(*) (as an exact count).
+    Raises PushdownError naming the first construct PostgREST can't evaluate.
+    """
+    statement = parse_select(sql)
+    conditions = _conditions(statement.where) if statement.where else []
+    groups = [condition for condition in conditions if condition.items is not None]
+    if len(groups) > 1:
+        # Several OR groups ANDed together go out as one and=(...) tree
+        conditions = [c for c in conditions if c.items is None] + [_Condition('and', items=groups)]
+    filters = [condition.param() for condition in conditions]
+    columns = statement.columns
+
+    if columns and any(expr[0] == 'func' and expr[1] == 'COUNT' and expr[2] == [('star',)] for expr, _ in columns):
+        if len(columns) > 1:
+            raise PushdownError("COUNT(*) alongside other columns (needs GROUP BY)")
+        # Counted from the Content-Range of a count=exact request; no rows are needed
+        return PostgrestQuery(statement.table, '*', filters, None, 1, None, count_only=True,
+                              count_alias=columns[0][1] or 'count')
+
+    if columns is None:
+        select = '*'
+    else:
+        selected = []
+        for expression, alias in columns:
+            name = _column_name(expression, 'SELECT')
+            selected.append(f"{alias}:{name}" if alias and alias != name else name)
+        select = ','.join(selected)
+
+    order = []
+    for expression, desc, nulls in statement.order:
+        item = f"{_order_column(expression, columns)}.{'desc' if desc else 'asc'}"
+        order.append(f"{item}.{nulls}" if nulls else item)
+
+    return PostgrestQuery(statement.table, select, filters, ','.join(order) or None,
+                          statement.limit, statement.offset)
+
+# Aggregates and operators accepted by mis_aggregate (supabase_aggregate_functions.sql)
+RPC_AGGREGATES = {'SUM', 'AVG', 'MIN', 'MAX', 'COUNT'}
+RPC_OPERATORS = {'eq': '=', 'neq': '<>', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>='}
+NEGATED_RPC_OPERATORS = {'=': '<>', '<>': '=', '<': '>=', '<=': '>', '>': '<=', '>=': '<',
+                         'in': 'not in', 'not in': 'in', 'is null': 'is not null', 'is not null': 'is null',
+                         'like': 'not like', 'not like': 'like', 'ilike': 'not ilike', 'not ilike': 'ilike'}
+
+def _rpc_filters(node) -> List[Dict[str, Any]]:
+    """Translate a WHERE node into mis_aggregate filters (a conjunction; OR isn't supported)"""
+    kind = node[0]
+
+    if kind == 'and':
+        return [item for child in node[1] for item in _rpc_filters(child)]
+    if kind == 'or':
+        raise PushdownError("OR in an aggregate query")
+    if kind == 'not':
+        inner = _rpc_filters(node[1])
+        if len(inner) != 1:
+            raise PushdownError("NOT over several conditions in an aggregate query")
+        return [dict(inner[0], op=NEGATED_RPC_OPERATORS[inner[0]['op']])]
+
+    # Simple predicates share the PostgREST translation; only the operator spelling differs
+    filters = []
+    for condition in _conditions(node):
+        if condition.items is not None:
+            raise PushdownError("OR in an aggregate query")
+        if condition.operator == 'in':
+            values = [_literal_text(_literal(v, 'WHERE')) for v in node[2]]
+            filters.append({'column': condition.key, 'op': 'not in' if condition.negated else 'in', 'value': values})
+        elif condition.operator == 'is':
+            if condition.value == 'null':
+                filters.append({'column': condition.key, 'op': 'is not null' if condition.negated else 'is null'})
+            else:
+                filters.append({'column': condition.key, 'op': '<>' if condition.negated else '=',
+                                'value': condition.value})
+        elif condition.operator in ('like', 'ilike'):
+            op = f"not {condition.operator}" if condition.negated else condition.operator
+            filters.append({'column': condition.key, 'op': op, 'value': _literal(node[2], 'WHERE')})
+        else:
+            filters.append({'column': condition.key, 'op': RPC_OPERATORS[condition.operator],
+                            'value': condition.value})
+    return filters
+
+def translate_aggregate(sql: str) -> Tuple[Dict[str, Any], List[str]]:
+    """Translate a GROUP BY / aggregate query on mis_long into mis_aggregate RPC arguments
+
+    Returns (params, columns): the RPC arguments and the output columns in SELECT
+    order. row_limit is None when the SQL has no LIMIT. Raises PushdownError for
+    anything the function can't compute (OR, HAVING, expressions, DISTINCT, ...).
+    """
+    statement = parse_select(sql, allow_group_by=True)
+    if statement.table != 'mis_long':
+        raise PushdownError(f"aggregation over {statement.table} (mis_aggregate only reads mis_long)")
+    if statement.columns is None:
+        raise PushdownError("SELECT * in an aggregate query")
+    if statement.offset:
+        raise PushdownError("OFFSET in an aggregate query")
+
+    group_by = []
+    for expression in statement.group_by:
+        if expression[0] == 'literal' and isinstance(expression[1], int) and not isinstance(expression[1], bool):
+            if not 1 <= expression[1] <= len(statement.columns):
+                raise PushdownError(f"GROUP BY position {expression[1]}")
+            expression = statement.columns[expression[1] - 1][0]
+        group_by.append(_column_name(expression, 'GROUP BY'))
+
+    measures = []
+    columns = []
+    for expression, alias in statement.columns:
+        if expression[0] == 'func' and expression[1] in AGGREGATES:
+            fn, args = expression[1], expression[2]
+            if fn not in RPC_AGGREGATES or len(args) != 1:
+                raise PushdownError(f"aggregate {fn}()")
+            if args[0] == ('star',):
+                if fn != 'COUNT':
+                    raise PushdownError(f"{fn}(*)")
+                column = '*'
+            else:
+                column = _column_name(args[0], f"{fn}()")
+            name = alias or fn.lower()
+            if name in columns:
+                raise PushdownError(f"duplicate output column {name}")
+            measures.append({'fn': fn.lower(), 'column': column, 'alias': name})
+            columns.append(name)
+        else:
+            column = _column_name(expression, 'SELECT')
+            if column not in group_by:
+                raise PushdownError(f"column {column} must appear in GROUP BY")
+            if alias and alias != column:
+                raise PushdownError(f"alias on grouped column {column}")
+            columns.append(column)
+    if not measures:
+        raise PushdownError("GROUP BY without an aggregate")
+
+    order_by = []
+    for expression, desc, nulls in statement.order:
+        if expression[0] == 'literal' and isinstance(expression[1], int) and not isinstance(expression[1], bool):
+            if not 1 <= expression[1] <= len(columns):
+                raise PushdownError(f"ORDER BY position {expression[1]}")
+            name = columns[expression[1] - 1]
+        elif expression[0] == 'func' and expression[1] in AGGREGATES:
+            # ORDER BY SUM(value) refers to the matching measure
+            column = '*' if expression[2] == [('star',)] else _column_name(expression[2][0], 'ORDER BY')
+            matches = [m['alias'] for m in measures if m['fn'] == expression[1].lower() and m['column'] == column]
+            if not matches:
+                raise PushdownError(f"ORDER BY {expression[1]}() that isn't selected")
+            name = matches[0]
+        else:
+            name = _column_name(expression, 'ORDER BY')
+        if name not in group_by and name not in columns:
+            raise PushdownError(f"ORDER BY {name}")
+        # None keeps Postgres's default placement of NULLs, the same as exec_sql running the SQL
+        order_by.append({'column': name, 'desc': desc, 'nulls': {'nullsfirst': 'first', 'nullslast': 'last'}.get(nulls)})
+
+    params = {
+        'group_by': group_by,
+        'measures': measures,
+        'filters': _rpc_filters(statement.where) if statement.where else [],
+        'order_by': order_by,
+        'row_limit': statement.limit
+    }
+    return params, columns
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    try:
+        translated = translate_sql(sys.argv[1])
+    except PushdownError as e:
+        print(f"❌ Can't push down to PostgREST: {e}")
+        sys.exit(1)
+    print(f"🔗 GET /rest/v1/{translated.table}" + (" (exact count)" if translated.count_only else ""))
+    for key, value in translated.params():
+        print(f"   {key}={value}")
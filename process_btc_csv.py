@@ -8,8 +8,10 @@ Usage:
 """
 
 import argparse
+import os
 import sys
 import re
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import List, Optional, Union
@@ -18,6 +20,24 @@ import warnings
 # Suppress pandas warnings for cleaner output
 warnings.filterwarnings('ignore', category=pd.errors.PerformanceWarning)
 
+METADATA_COLUMNS = [
+    "store_name", "parameter", "cafe_code", "region",
+    "category", "for_ssg", "area_store", "store_start_date", "vintage"
+]
+
+# Strings accepted by float() once commas, % and parentheses are handled
+NUMBER_PATTERN = r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$"
+
+# One row per key in the output; neon_migration.py sync mode upserts on the same key
+NATURAL_KEY = ["store_name", "parameter", "month"]
+
+# A store is trading in a month when one of these has a non-zero value; Area,
+# Gross Margin etc. are filled in (often with 0) whether or not the store traded
+ACTIVITY_PARAMETERS = ["Revenue", "Transactions"]
+
+# Metadata cells that mark a store as closed (Store Start Date / Vintage read "Closed")
+CLOSED_MARKER_COLUMNS = ["store_start_date", "vintage", "for_ssg", "area_store"]
+
 def find_header_row(df: pd.DataFrame) -> int:
     """
     Find the row index where the real headers are located.
@@ -178,194 +198,213 @@ def parse_numeric_value(raw_value: Union[str, float, int], is_percent_parameter:
     
     return numeric_value
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Process BTC store CSV from cross-tab to tidy long format",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  python process_btc_csv.py --input "BTC store for CSV.csv" --output "clean_mis_long.csv"
-  python process_btc_csv.py -i data.csv -o output.csv --verbose
-        """
-    )
+def parse_numeric_array(values, is_percent_parameter=None) -> np.ndarray:
+    """
+    Vectorized parse_numeric_value for an Arrow string array.
+    Returns a float64 NumPy array with NaN for empty or non-numeric cells.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
     
-    parser.add_argument(
-        "--input", "-i", 
-        required=True, 
-        help="Path to input CSV file"
+    cleaned = pc.replace_substring(pc.utf8_trim_whitespace(values), ",", "")
+    is_percent = pc.fill_null(pc.match_substring(cleaned, "%"), False)
+    cleaned = pc.utf8_trim_whitespace(pc.replace_substring(cleaned, "%", ""))
+    
+    # Handle parentheses for negative numbers (e.g., "(123.45)")
+    cleaned = pc.replace_substring_regex(cleaned, r"^\(\s*(\d+(?:\.\d+)?)\s*\)$", r"-\1")
+    
+    # Anything that is not a plain number ("--", "Closed", "NA", ...) becomes null
+    is_number = pc.fill_null(pc.match_substring_regex(cleaned, NUMBER_PATTERN), False)
+    numbers = pc.cast(pc.if_else(is_number, cleaned, pa.scalar(None, pa.string())), pa.float64())
+    
+    if is_percent_parameter is not None:
+        is_percent = pc.or_(is_percent, is_percent_parameter)
+    numbers = pc.if_else(is_percent, pc.divide(numbers, 100.0), numbers)
+    
+    return numbers.to_numpy()
+
+def read_cross_tab_arrow(input_path: Path, verbose: bool = False):
+    """
+    Read the raw cross-tab with pyarrow's multi-threaded CSV reader.
+    Cells stay as Arrow strings through header detection and value parsing;
+    month values only become NumPy floats at the end.
+    
+    Returns (df_data, month_columns) with normalized column names and month
+    columns already parsed to final numeric values.
+    """
+    import csv
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+    
+    # Read every column as string, like pd.read_csv(dtype=str)
+    with open(input_path, newline="", encoding="utf-8-sig") as f:
+        column_count = max((len(row) for _, row in zip(range(10), csv.reader(f))), default=0)
+    
+    table = pv.read_csv(
+        input_path,
+        read_options=pv.ReadOptions(autogenerate_column_names=True, use_threads=True),
+        convert_options=pv.ConvertOptions(
+            column_types={f"f{i}": pa.string() for i in range(column_count)},
+            strings_can_be_null=True
+        )
     )
-    parser.add_argument(
-        "--output", "-o", 
-        required=True, 
-        help="Path to output CSV file (long format)"
+    
+    if verbose:
+        print(f"📊 Raw data shape: ({table.num_rows}, {table.num_columns})")
+    
+    # Header detection only needs the first few rows
+    header_row_idx = find_header_row(table.slice(0, 10).to_pandas())
+    
+    if verbose:
+        print(f"🔍 Found header row at index: {header_row_idx}")
+    
+    headers = [table.column(i)[header_row_idx].as_py() for i in range(table.num_columns)]
+    headers = [str(h) if h is not None else f"Unnamed_{i}" for i, h in enumerate(headers)]
+    data = table.slice(header_row_idx + 1)
+    
+    # Remove completely empty columns
+    keep = [i for i in range(data.num_columns) if data.column(i).null_count < data.num_rows]
+    columns = normalize_column_names([headers[i] for i in keep])
+    
+    if verbose:
+        print(f"📋 Columns after cleanup: {[headers[i] for i in keep]}")
+    
+    metadata_idx = [(col, i) for col, i in zip(columns, keep) if col in METADATA_COLUMNS]
+    month_idx = [(col, i) for col, i in zip(columns, keep) if col not in METADATA_COLUMNS and is_month_column(col)]
+    
+    is_percent_parameter = None
+    if "parameter" in columns:
+        parameter = data.column(keep[columns.index("parameter")])
+        is_percent_parameter = pc.fill_null(pc.equal(pc.utf8_trim_whitespace(parameter), "%"), False)
+    
+    df_data = pd.DataFrame({col: data.column(i).to_pandas() for col, i in metadata_idx})
+    df_months = pd.DataFrame(
+        {col: parse_numeric_array(data.column(i), is_percent_parameter) for col, i in month_idx},
+        index=df_data.index
     )
-    parser.add_argument(
-        "--verbose", "-v", 
-        action="store_true", 
-        help="Enable verbose output"
+    df_data = pd.concat([df_data, df_months], axis=1)
+    
+    return df_data, [col for col, _ in month_idx]
+
+def find_closed_stores(df_data: pd.DataFrame) -> set:
+    """
+    Stores with a "Closed" marker in any of their metadata cells.
+    Must run before store_start_date and area_store are parsed.
+    """
+    columns = [col for col in CLOSED_MARKER_COLUMNS if col in df_data.columns]
+    if not columns or "store_name" not in df_data.columns:
+        return set()
+    
+    marked = np.zeros(len(df_data), dtype=bool)
+    for col in columns:
+        marked |= df_data[col].astype("string").str.strip().str.lower().eq("closed").fillna(False).to_numpy()
+    return set(df_data.loc[marked, "store_name"].dropna().map(lambda name: str(name).strip()))
+
+def build_store_lifecycle(df_long: pd.DataFrame, closed_stores: Optional[set] = None) -> pd.DataFrame:
+    """
+    Derive one row per store with its open/close period from the long data.
+    A store counts as active in a month if Revenue or Transactions is non-zero.
+    Stores marked "Closed" in the source, or whose last active month is before
+    the latest month any store traded in, are closed.
+    """
+    df_valid = df_long[df_long["store_name"].notna() & df_long["month"].notna()]
+    is_activity = df_valid["parameter"].fillna("").astype(str).str.strip().isin(ACTIVITY_PARAMETERS)
+    df_active = df_valid[is_activity & df_valid["value"].notna() & (df_valid["value"] != 0)]
+    
+    lifecycle = df_active.groupby("store_name").agg(
+        first_active_month=("month", "min"),
+        last_active_month=("month", "max"),
+        active_months=("month", "nunique")
     )
     
-    args = parser.parse_args()
+    # Keep stores that never report a value so they are not lost entirely
+    metadata = df_valid.groupby("store_name")[["cafe_code", "region", "category"]].first()
+    lifecycle = metadata.join(lifecycle, how="left")
+    lifecycle["active_months"] = lifecycle["active_months"].fillna(0).astype(int)
     
-    input_path = Path(args.input)
-    output_path = Path(args.output)
+    # Trailing months nobody has reported yet shouldn't close every store
+    latest_month = df_active["month"].max()
+    lifecycle["status"] = "open"
+    lifecycle.loc[lifecycle["last_active_month"] < latest_month, "status"] = "closed"
+    if closed_stores:
+        lifecycle.loc[lifecycle.index.isin(closed_stores), "status"] = "closed"
+    lifecycle.loc[lifecycle["last_active_month"].isna(), "status"] = "never_opened"
     
-    if not input_path.exists():
-        print(f"ERROR: Input file '{input_path}' not found", file=sys.stderr)
-        sys.exit(1)
+    return lifecycle.reset_index()
+
+def _write_csv_atomic(df: pd.DataFrame, path: Path):
+    """Write a fully quoted CSV next to its destination, then rename it over the old file."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    df.to_csv(tmp_path, index=False, encoding="utf-8", quoting=1)  # quoting=1 means quote all fields
+    os.replace(tmp_path, path)
+
+def write_csv_output(df_tidy: pd.DataFrame, output_path: Path,
+                     df_lifecycle: Optional[pd.DataFrame] = None,
+                     lifecycle_path: Optional[Path] = None) -> Path:
+    """
+    Write the tidy data (and lifecycle table, if any) as quoted CSV
+    plus a DuckDB loading script. Returns the path of the SQL script.
     
-    try:
-        if args.verbose:
-            print(f"📖 Reading CSV file: {input_path}")
-        
-        # Read CSV without assuming headers
-        df_raw = pd.read_csv(input_path, header=None, dtype=str)
-        
-        if args.verbose:
-            print(f"📊 Raw data shape: {df_raw.shape}")
-        
-        # Find the header row
-        header_row_idx = find_header_row(df_raw)
-        
-        if args.verbose:
-            print(f"🔍 Found header row at index: {header_row_idx}")
-        
-        # Extract headers and data
-        headers = df_raw.iloc[header_row_idx].tolist()
-        df_data = df_raw.iloc[header_row_idx + 1:].reset_index(drop=True)
-        df_data.columns = [str(h) if not pd.isna(h) else f"Unnamed_{i}" for i, h in enumerate(headers)]
-        
-        # Remove completely empty columns
-        df_data = df_data.dropna(axis=1, how="all")
-        
-        if args.verbose:
-            print(f"📋 Columns after cleanup: {list(df_data.columns)}")
-        
-        # Normalize column names
-        df_data.columns = normalize_column_names(list(df_data.columns))
-        
-        # Identify month columns
-        metadata_columns = [
-            "store_name", "parameter", "cafe_code", "region", 
-            "category", "for_ssg", "area_store", "store_start_date", "vintage"
-        ]
-        
-        month_columns = [col for col in df_data.columns if col not in metadata_columns]
-        month_columns = [col for col in month_columns if is_month_column(col)]
-        
-        if args.verbose:
-            print(f"📅 Found {len(month_columns)} month columns: {month_columns[:5]}{'...' if len(month_columns) > 5 else ''}")
-        
-        # Clean metadata columns
-        for col in ["store_name", "parameter"]:
-            if col in df_data.columns:
-                df_data[col] = df_data[col].apply(clean_string_value)
-        
-        for col in ["cafe_code", "region", "category", "for_ssg", "vintage"]:
-            if col in df_data.columns:
-                df_data[col] = df_data[col].apply(clean_string_value)
-        
-        # Parse store start date
-        if "store_start_date" in df_data.columns:
-            df_data["store_start_date"] = pd.to_datetime(df_data["store_start_date"], errors="coerce")
-        
-        # Parse area_store as numeric
-        if "area_store" in df_data.columns:
-            df_data["area_store"] = df_data["area_store"].apply(
-                lambda x: parse_numeric_value(x) if pd.notna(x) else None
-            )
-        
-        if args.verbose:
-            print("🔄 Melting data to long format...")
-        
-        # Melt to long format
-        id_vars = [col for col in metadata_columns if col in df_data.columns]
-        df_long = df_data.melt(
-            id_vars=id_vars,
-            value_vars=month_columns,
-            var_name="month_raw",
-            value_name="value_raw"
-        )
-        
-        if args.verbose:
-            print(f"📏 Long format shape: {df_long.shape}")
-        
-        # Parse month columns to timestamps
-        df_long["month"] = df_long["month_raw"].apply(parse_month_column)
-        
-        # Clean numeric values
-        df_long["is_percent_parameter"] = (
-            df_long["parameter"]
-            .fillna("")
-            .astype(str)
-            .str.strip()
-            .eq("%")
-        )
-        
-        df_long["value"] = df_long.apply(
-            lambda row: parse_numeric_value(
-                row["value_raw"], 
-                bool(row["is_percent_parameter"])
-            ),
-            axis=1
-        )
-        
-        # Create final tidy dataset
-        final_columns = [
-            "store_name", "parameter", "cafe_code", "region", "category",
-            "for_ssg", "area_store", "store_start_date", "vintage", "month", "value"
-        ]
-        
-        df_tidy = df_long[final_columns].copy()
-        
-        # Remove rows with missing essential data
-        df_tidy = df_tidy[
-            df_tidy["store_name"].notna() & 
-            df_tidy["parameter"].notna() & 
-            df_tidy["month"].notna()
-        ]
-        
-        # Sort for readability
-        df_tidy = df_tidy.sort_values(["store_name", "parameter", "month"]).reset_index(drop=True)
-        
-        if args.verbose:
-            print(f"✅ Final tidy dataset shape: {df_tidy.shape}")
-            print(f"📊 Unique stores: {df_tidy['store_name'].nunique()}")
-            print(f"📊 Unique parameters: {df_tidy['parameter'].unique()}")
-            print(f"📊 Date range: {df_tidy['month'].min()} to {df_tidy['month'].max()}")
-        
-        # Write output CSV with proper escaping for store names with commas
-        df_tidy.to_csv(output_path, index=False, encoding="utf-8", quoting=1)  # quoting=1 means quote all fields
-        
-        # Generate DuckDB SQL script
-        sql_script = f"""-- DuckDB table creation and data loading script
+    Files are written to a temporary name and renamed into place, so readers
+    of the CSV (e.g. DuckDB subprocesses) never see a partially written file.
+    """
+    output_path = Path(output_path)
+    
+    # Write output CSV with proper escaping for store names with commas
+    _write_csv_atomic(df_tidy, output_path)
+    
+    if df_lifecycle is not None:
+        if lifecycle_path is None:
+            lifecycle_path = output_path.parent / "store_lifecycle.csv"
+        _write_csv_atomic(df_lifecycle, Path(lifecycle_path))
+        lifecycle_sql = f"""
+-- Store open/close periods (sparse mode)
+CREATE TABLE IF NOT EXISTS store_lifecycle (
+store_name TEXT,
+cafe_code TEXT,
+region TEXT,
+category TEXT,
+first_active_month DATE,
+last_active_month DATE,
+active_months INTEGER,
+status TEXT
+);
+
+COPY store_lifecycle FROM '{lifecycle_path.absolute()}' (HEADER, AUTO_DETECT TRUE);
+"""
+    else:
+        lifecycle_sql = ""
+    
+    # Generate DuckDB SQL script
+    sql_script = f"""-- DuckDB table creation and data loading script
 -- Generated for BTC store MIS data
 
 -- Create the table with appropriate data types
 CREATE TABLE IF NOT EXISTS mis_long (
-    store_name TEXT,
-    parameter TEXT,
-    cafe_code TEXT,
-    region TEXT,
-    category TEXT,
-    for_ssg TEXT,
-    area_store DOUBLE,
-    store_start_date DATE,
-    vintage TEXT,
-    month DATE,
-    value DOUBLE
+store_name TEXT,
+parameter TEXT,
+cafe_code TEXT,
+region TEXT,
+category TEXT,
+for_ssg TEXT,
+area_store DOUBLE,
+store_start_date DATE,
+vintage TEXT,
+month DATE,
+value DOUBLE
 );
 
 -- Load data from CSV
 COPY mis_long FROM '{output_path.absolute()}' (HEADER, AUTO_DETECT TRUE);
-
+{lifecycle_sql}
 -- Verify data loaded correctly
 SELECT 
-    COUNT(*) as total_rows,
-    COUNT(DISTINCT store_name) as unique_stores,
-    COUNT(DISTINCT parameter) as unique_parameters,
-    MIN(month) as earliest_month,
-    MAX(month) as latest_month
+COUNT(*) as total_rows,
+COUNT(DISTINCT store_name) as unique_stores,
+COUNT(DISTINCT parameter) as unique_parameters,
+MIN(month) as earliest_month,
+MAX(month) as latest_month
 FROM mis_long;
 
 -- Example queries:
@@ -411,13 +450,483 @@ FROM mis_long;
 -- GROUP BY store_name, region, category
 -- ORDER BY revenue DESC;
 """
+    
+    sql_path = output_path.parent / "duckdb_load.sql"
+    sql_path.write_text(sql_script, encoding="utf-8")
+    
+    return sql_path
+
+def _column_sql_types(df: pd.DataFrame, dialect: str) -> List[str]:
+    """
+    Map DataFrame dtypes to column definitions for CREATE TABLE statements.
+    """
+    float_type = {"duckdb": "DOUBLE", "sqlite": "REAL", "postgres": "DOUBLE PRECISION"}[dialect]
+    date_type = "TEXT" if dialect == "sqlite" else "DATE"
+    
+    definitions = []
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            sql_type = date_type
+        elif pd.api.types.is_integer_dtype(dtype):
+            sql_type = "INTEGER"
+        elif pd.api.types.is_float_dtype(dtype):
+            sql_type = float_type
+        else:
+            sql_type = "TEXT"
+        definitions.append(f"{col} {sql_type}")
+    return definitions
+
+def write_to_duckdb(df: pd.DataFrame, table_name: str, database: str) -> int:
+    """
+    Replace a DuckDB table with the DataFrame contents.
+    The frame is registered as a view (zero-copy scan) instead of going through CSV.
+    """
+    import duckdb
+    
+    select_list = ", ".join(
+        f"CAST({col} AS DATE) AS {col}" if pd.api.types.is_datetime64_any_dtype(dtype) else col
+        for col, dtype in df.dtypes.items()
+    )
+    
+    con = duckdb.connect(database)
+    try:
+        con.register("etl_frame", df)
+        con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT {select_list} FROM etl_frame")
+        con.unregister("etl_frame")
+    finally:
+        con.close()
+    
+    return len(df)
+
+def write_to_sqlite(df: pd.DataFrame, table_name: str, database: str) -> int:
+    """
+    Replace the contents of a SQLite table using a single executemany call.
+    Dates are stored as ISO strings (YYYY-MM-DD), missing values as NULL.
+    """
+    import sqlite3
+    
+    columns = list(df.columns)
+    df_out = df.copy()
+    for col in columns:
+        if pd.api.types.is_datetime64_any_dtype(df_out[col]):
+            df_out[col] = df_out[col].dt.strftime("%Y-%m-%d")
+    df_out = df_out.astype(object).where(df_out.notna(), None)
+    
+    con = sqlite3.connect(database)
+    try:
+        with con:
+            con.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(_column_sql_types(df, 'sqlite'))})")
+            con.execute(f"DELETE FROM {table_name}")
+            placeholders = ", ".join(["?"] * len(columns))
+            con.executemany(
+                f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})",
+                df_out.itertuples(index=False, name=None)
+            )
+    finally:
+        con.close()
+    
+    return len(df)
+
+def _index_names(cursor, table: str) -> dict:
+    """
+    Index names of a Postgres table keyed by definition without the index and table names,
+    e.g. ("UNIQUE", "USING btree (store_name, parameter, month)") -> ["uq_mis_long_natural_key"].
+    """
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(%s)
+        ORDER BY c.oid
+        """,
+        (table,)
+    )
+    names = {}
+    for name, definition in cursor.fetchall():
+        match = re.match(r"CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (.*)$", definition)
+        if match:
+            names.setdefault((match.group(1) or "", match.group(2)), []).append(name)
+    return names
+
+def _swap_renames(cursor, table_name: str, next_table: str) -> List[tuple]:
+    """
+    Renames that give {next_table}'s partitions and indexes the names of their live
+    counterparts once the tables are swapped: ("TABLE" | "INDEX", current name, final name).
+    Indexes without a live counterpart get the next_table prefix replaced by table_name.
+    """
+    cursor.execute(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        (next_table,)
+    )
+    pairs = [(next_table, table_name)]
+    for (partition,) in cursor.fetchall():
+        if partition.startswith(next_table):
+            pairs.append((partition, table_name + partition[len(next_table):]))
+    
+    renames = []
+    for new_relation, live_relation in pairs:
+        if new_relation != next_table:
+            renames.append(("TABLE", new_relation, live_relation))
+        live_names = _index_names(cursor, live_relation)
+        for key, indexes in _index_names(cursor, new_relation).items():
+            final_names = live_names.get(key, [])
+            for position, index in enumerate(indexes):
+                if position < len(final_names):
+                    final_name = final_names[position]
+                elif index.startswith(new_relation):
+                    final_name = live_relation + index[len(new_relation):]
+                else:
+                    continue
+                if final_name != index:
+                    renames.append(("INDEX", index, final_name))
+    return renames
+
+def write_to_postgres(df: pd.DataFrame, table_name: str, database: Optional[str] = None) -> int:
+    """
+    Replace a Postgres table via COPY FROM STDIN using a blue/green swap.
+    Uses DATABASE_URL when no connection string is given.
+    
+    The data is loaded into {table}_next (same columns, defaults and indexes)
+    and renamed over the live table in the same transaction. Readers keep
+    seeing the old data until commit, and the rename waits for in-flight
+    queries instead of failing them. A partitioned live table is rebuilt
+    with the same layout and fiscal-year partitions for the loaded months.
+    """
+    import io
+    import psycopg2
+    from psycopg2.extensions import quote_ident
+    from postgres_client import ensure_fiscal_year_partitions, drop_rollups, ensure_rollups, ROLLUPS_ENABLED
+    
+    connection_string = database or os.getenv("DATABASE_URL")
+    if not connection_string:
+        raise ValueError("DATABASE_URL must be set (or pass --database) for the postgres sink")
+    
+    columns = list(df.columns)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, date_format="%Y-%m-%d")
+    buffer.seek(0)
+    
+    next_table = f"{table_name}_next"
+    old_table = f"{table_name}_old"
+    
+    connection = psycopg2.connect(connection_string)
+    try:
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(_column_sql_types(df, 'postgres'))})"
+                )
+                cursor.execute(f"DROP TABLE IF EXISTS {next_table}")
+                cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", (table_name,))
+                if cursor.fetchone()[0] == "p":
+                    cursor.execute(
+                        f"CREATE TABLE {next_table} (LIKE {table_name} INCLUDING ALL) PARTITION BY RANGE (month)"
+                    )
+                    cursor.execute(f"CREATE TABLE {next_table}_default PARTITION OF {next_table} DEFAULT")
+                    months = pd.to_datetime(df["month"])
+                    ensure_fiscal_year_partitions(cursor, next_table, months.min().date(), months.max().date())
+                else:
+                    cursor.execute(f"CREATE TABLE {next_table} (LIKE {table_name} INCLUDING ALL)")
+                cursor.copy_expert(
+                    f"COPY {next_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+                
+                # SERIAL sequences are owned by the live table; hand them over before it is dropped
+                cursor.execute(
+                    """
+                    SELECT attname, pg_get_serial_sequence(%s, attname)
+                    FROM pg_attribute
+                    WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+                    """,
+                    (table_name, table_name)
+                )
+                for column, sequence in cursor.fetchall():
+                    if sequence:
+                        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {next_table}.{column}")
+                
+                renames = _swap_renames(cursor, table_name, next_table)
+                
+                # Rollup views depend on the live table and would block dropping it; rebuild them below
+                rollups = drop_rollups(cursor) if table_name == "mis_long" else []
+                
+                cursor.execute(f"ALTER TABLE {table_name} RENAME TO {old_table}")
+                cursor.execute(f"ALTER TABLE {next_table} RENAME TO {table_name}")
+                cursor.execute(f"DROP TABLE {old_table}")
+                
+                # Give the copied indexes and partitions the live table's names again
+                for kind, relation, final_name in renames:
+                    cursor.execute(f"ALTER {kind} {quote_ident(relation, cursor)} "
+                                   f"RENAME TO {quote_ident(final_name, cursor)}")
+                
+                if rollups or (table_name == "mis_long" and ROLLUPS_ENABLED):
+                    ensure_rollups(cursor)
+    finally:
+        connection.close()
+    
+    return len(df)
+
+def write_to_sink(sink: str, df: pd.DataFrame, table_name: str, database: Optional[str] = None) -> int:
+    """
+    Write a DataFrame straight into a database table without an intermediate CSV file.
+    Supported sinks: duckdb, sqlite, postgres.
+    """
+    if sink == "duckdb":
+        return write_to_duckdb(df, table_name, database or "mis.duckdb")
+    elif sink == "sqlite":
+        return write_to_sqlite(df, table_name, database or "mis.sqlite")
+    elif sink == "postgres":
+        return write_to_postgres(df, table_name, database)
+    else:
+        raise ValueError(f"Unsupported sink: {sink}")
+
+def run_pipeline(input_path: Union[str, Path], reader: str = "pandas", sparse: bool = False,
+                 verbose: bool = False):
+    """
+    Run the full cross-tab to tidy long ETL and return (df_tidy, df_lifecycle).
+    df_lifecycle is None unless sparse mode is enabled.
+    """
+    input_path = Path(input_path)
+    
+    metadata_columns = METADATA_COLUMNS
+    
+    if reader == "arrow":
+        df_data, month_columns = read_cross_tab_arrow(input_path, verbose)
+    else:
+        # Read CSV without assuming headers
+        df_raw = pd.read_csv(input_path, header=None, dtype=str)
+        
+        if verbose:
+            print(f"📊 Raw data shape: {df_raw.shape}")
+        
+        # Find the header row
+        header_row_idx = find_header_row(df_raw)
+        
+        if verbose:
+            print(f"🔍 Found header row at index: {header_row_idx}")
+        
+        # Extract headers and data
+        headers = df_raw.iloc[header_row_idx].tolist()
+        df_data = df_raw.iloc[header_row_idx + 1:].reset_index(drop=True)
+        df_data.columns = [str(h) if not pd.isna(h) else f"Unnamed_{i}" for i, h in enumerate(headers)]
+        
+        # Remove completely empty columns
+        df_data = df_data.dropna(axis=1, how="all")
+        
+        if verbose:
+            print(f"📋 Columns after cleanup: {list(df_data.columns)}")
+        
+        # Normalize column names
+        df_data.columns = normalize_column_names(list(df_data.columns))
+        
+        # Identify month columns
+        month_columns = [col for col in df_data.columns if col not in metadata_columns]
+        month_columns = [col for col in month_columns if is_month_column(col)]
+    
+    if verbose:
+        print(f"📅 Found {len(month_columns)} month columns: {month_columns[:5]}{'...' if len(month_columns) > 5 else ''}")
+    
+    # Clean metadata columns
+    for col in ["store_name", "parameter"]:
+        if col in df_data.columns:
+            df_data[col] = df_data[col].apply(clean_string_value)
+    
+    for col in ["cafe_code", "region", "category", "for_ssg", "vintage"]:
+        if col in df_data.columns:
+            df_data[col] = df_data[col].apply(clean_string_value)
+    
+    # "Closed" markers are lost once store_start_date and area_store are parsed
+    closed_stores = find_closed_stores(df_data) if sparse else None
+    
+    # Parse store start date
+    if "store_start_date" in df_data.columns:
+        df_data["store_start_date"] = pd.to_datetime(df_data["store_start_date"], errors="coerce")
+    
+    # Parse area_store as numeric
+    if "area_store" in df_data.columns:
+        df_data["area_store"] = df_data["area_store"].apply(
+            lambda x: parse_numeric_value(x) if pd.notna(x) else None
+        )
+    
+    if verbose:
+        print("🔄 Melting data to long format...")
+    
+    # Melt to long format
+    id_vars = [col for col in metadata_columns if col in df_data.columns]
+    df_long = df_data.melt(
+        id_vars=id_vars,
+        value_vars=month_columns,
+        var_name="month_raw",
+        value_name="value_raw"
+    )
+    
+    if verbose:
+        print(f"📏 Long format shape: {df_long.shape}")
+    
+    # Parse month columns to timestamps (once per column label)
+    month_lookup = {col: parse_month_column(col) for col in month_columns}
+    df_long["month"] = pd.to_datetime(df_long["month_raw"].map(month_lookup))
+    
+    # Clean numeric values
+    df_long["is_percent_parameter"] = (
+        df_long["parameter"]
+        .fillna("")
+        .astype(str)
+        .str.strip()
+        .eq("%")
+    )
+    
+    if reader == "arrow":
+        # Already parsed (including % handling) by read_cross_tab_arrow
+        df_long["value"] = df_long["value_raw"]
+    else:
+        df_long["value"] = df_long.apply(
+            lambda row: parse_numeric_value(
+                row["value_raw"], 
+                bool(row["is_percent_parameter"])
+            ),
+            axis=1
+        )
+    
+    # Create final tidy dataset
+    final_columns = [
+        "store_name", "parameter", "cafe_code", "region", "category",
+        "for_ssg", "area_store", "store_start_date", "vintage", "month", "value"
+    ]
+    
+    df_tidy = df_long[final_columns].copy()
+    
+    # Remove rows with missing essential data
+    df_tidy = df_tidy[
+        df_tidy["store_name"].notna() & 
+        df_tidy["parameter"].notna() & 
+        df_tidy["month"].notna()
+    ]
+    
+    # The source repeats some blocks (e.g. Transactions); keep the last copy like sync mode does,
+    # so a table with the (store_name, parameter, month) unique index can be reloaded
+    duplicates = df_tidy.duplicated(subset=NATURAL_KEY, keep="last")
+    if duplicates.any():
+        if verbose:
+            print(f"🧹 Dropped {duplicates.sum():,} rows repeating a (store_name, parameter, month) key")
+        df_tidy = df_tidy[~duplicates]
+    
+    # In sparse mode empty/"--"/"Closed" cells are captured by the lifecycle table instead
+    df_lifecycle = None
+    if sparse:
+        df_lifecycle = build_store_lifecycle(df_long, closed_stores)
+        dense_rows = len(df_tidy)
+        df_tidy = df_tidy[df_tidy["value"].notna()]
+        
+        if verbose:
+            print(f"🧹 Sparse mode dropped {dense_rows - len(df_tidy):,} empty cells")
+    
+    # Sort for readability
+    df_tidy = df_tidy.sort_values(["store_name", "parameter", "month"]).reset_index(drop=True)
+    
+    if verbose:
+        print(f"✅ Final tidy dataset shape: {df_tidy.shape}")
+        print(f"📊 Unique stores: {df_tidy['store_name'].nunique()}")
+        print(f"📊 Unique parameters: {df_tidy['parameter'].unique()}")
+        print(f"📊 Date range: {df_tidy['month'].min()} to {df_tidy['month'].max()}")
+    
+    return df_tidy, df_lifecycle
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Process BTC store CSV from cross-tab to tidy long format",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python process_btc_csv.py --input "BTC store for CSV.csv" --output "clean_mis_long.csv"
+  python process_btc_csv.py -i data.csv -o output.csv --verbose
+  python process_btc_csv.py -i data.csv -o output.csv --sparse
+  python process_btc_csv.py -i data.csv -o output.csv --reader arrow
+  python process_btc_csv.py -i data.csv --sink duckdb --database mis.duckdb
+  python process_btc_csv.py -i data.csv --sink postgres   # uses DATABASE_URL
+        """
+    )
+    
+    parser.add_argument(
+        "--input", "-i", 
+        required=True, 
+        help="Path to input CSV file"
+    )
+    parser.add_argument(
+        "--output", "-o", 
+        help="Path to output CSV file (long format), required for the csv sink"
+    )
+    parser.add_argument(
+        "--reader",
+        choices=["pandas", "arrow"],
+        default="pandas",
+        help="CSV reader backend (default: pandas). arrow uses pyarrow's multi-threaded reader and vectorized parsing"
+    )
+    parser.add_argument(
+        "--sink",
+        choices=["csv", "duckdb", "sqlite", "postgres"],
+        default="csv",
+        help="Where to write the tidy data (default: csv). Database sinks replace the table contents"
+    )
+    parser.add_argument(
+        "--database",
+        help="Database file for duckdb/sqlite sinks, or connection string for postgres (default: DATABASE_URL)"
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Drop cells without a numeric value and write store open/close periods to a lifecycle table"
+    )
+    parser.add_argument(
+        "--lifecycle-output",
+        help="Path to store lifecycle CSV in sparse mode (default: store_lifecycle.csv next to output)"
+    )
+    parser.add_argument(
+        "--verbose", "-v", 
+        action="store_true", 
+        help="Enable verbose output"
+    )
+    
+    args = parser.parse_args()
+    
+    if args.sink == "csv" and not args.output:
+        parser.error("--output is required for the csv sink")
+    
+    input_path = Path(args.input)
+    output_path = Path(args.output) if args.output else None
+    lifecycle_path = Path(args.lifecycle_output) if args.lifecycle_output else None
+    
+    if not input_path.exists():
+        print(f"ERROR: Input file '{input_path}' not found", file=sys.stderr)
+        sys.exit(1)
+    
+    try:
+        if args.verbose:
+            print(f"📖 Reading CSV file: {input_path}")
+        
+        df_tidy, df_lifecycle = run_pipeline(input_path, args.reader, args.sparse, args.verbose)
         
-        sql_path = output_path.parent / "duckdb_load.sql"
-        sql_path.write_text(sql_script, encoding="utf-8")
+        # Write the tidy data to the selected sink
+        if args.sink == "csv":
+            sql_path = write_csv_output(df_tidy, output_path, df_lifecycle, lifecycle_path)
+        else:
+            write_to_sink(args.sink, df_tidy, "mis_long", args.database)
+            if df_lifecycle is not None:
+                write_to_sink(args.sink, df_lifecycle, "store_lifecycle", args.database)
         
         print(f"✅ Successfully processed {len(df_tidy):,} rows")
-        print(f"📄 Output CSV: {output_path}")
-        print(f"🦆 DuckDB SQL: {sql_path}")
+        if args.sink == "csv":
+            print(f"📄 Output CSV: {output_path}")
+            if df_lifecycle is not None:
+                print(f"🏬 Store lifecycle: {lifecycle_path or output_path.parent / 'store_lifecycle.csv'} ({len(df_lifecycle)} stores)")
+            print(f"🦆 DuckDB SQL: {sql_path}")
+        else:
+            print(f"🗄️  Loaded mis_long into {args.sink}: {args.database or 'default database'}")
+            if df_lifecycle is not None:
+                print(f"🏬 Store lifecycle: store_lifecycle table ({len(df_lifecycle)} stores)")
         
         if args.verbose:
             print(f"\n📈 Data Summary:")
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Result Digest for BTC Store Analytics
+Condenses a query result into compact statistics for the summarization prompt:
+totals and ranges, top and bottom rows with their shares, growth over time,
+outliers and the most common categories. Statistics are computed with
+vectorized pandas/NumPy operations and the digest is trimmed to a token
+budget, so the prompt (and local LLM latency) stays the same size however
+many rows the query returned.
+
+Usage:
+    python result_digest.py results.txt --tokens 600
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+# Approximate prompt tokens the digest may use
+DIGEST_TOKEN_BUDGET = int(os.getenv('SUMMARY_DIGEST_TOKENS', '800'))
+
+# Rows listed in top/bottom/growth/outlier sections
+DIGEST_TOP_K = int(os.getenv('SUMMARY_DIGEST_TOP_K', '5'))
+
+# Results this small are passed through whole when they fit the budget
+FULL_TABLE_ROWS = 15
+
+# Rough tokens-per-character ratio of English text and numbers for LLaMA-style tokenizers
+CHARS_PER_TOKEN = 4
+
+# Robust z-score (median/MAD) above which a value is reported as an outlier
+OUTLIER_Z = 3.5
+
+# Growth is only ranked from a positive starting value of at least this fraction of the
+# median start; from a negative or near-zero base a percentage is meaningless
+GROWTH_MIN_START_FRACTION = 0.05
+
+# Numeric columns that identify rows rather than measure anything
+IDENTIFIER_SUFFIXES = ('id', '_id', '_code')
+TIME_COLUMN_NAMES = {'year', 'fiscal_year', 'month', 'quarter', 'week', 'date'}
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def parse_result_table(text: str) -> Tuple[pd.DataFrame, List[str]]:
+    """Parse a format_result() table back into string cells, plus the note lines after it
+
+    Raises ValueError if the text isn't a result table (e.g. an error message).
+    """
+    lines = text.split('\n')
+    if len(lines) < 2 or not lines[1] or set(lines[1]) != {'-'}:
+        raise ValueError("not a result table")
+    columns = [name.strip() for name in lines[0].split(' | ')]
+
+    rows = []
+    notes = []
+    skipped = 0
+    position = 2
+    for position in range(2, len(lines)):
+        line = lines[position]
+        if not line:
+            break
+        cells = [cell.strip() for cell in line.split(' | ')]
+        if len(cells) == len(columns):
+            rows.append(cells)
+        else:
+            # A value containing the column separator; it can't be split reliably
+            skipped += 1
+    else:
+        position = len(lines)
+    notes = [line.strip() for line in lines[position:] if line.strip()]
+    if skipped:
+        notes.append(f"{skipped} rows could not be parsed and are excluded from the statistics")
+    return pd.DataFrame(rows, columns=columns), notes
+
+def _convert_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Turn text columns that are (almost) all numbers or ISO dates into numeric/datetime columns"""
+    converted = {}
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_datetime64_any_dtype(column):
+            converted[name] = column
+            continue
+        values = column.replace({'None': np.nan, 'NaN': np.nan, 'nan': np.nan, '': np.nan})
+        present = values.notna().sum()
+        numbers = pd.to_numeric(values, errors='coerce')
+        if present and numbers.notna().sum() >= 0.9 * present:
+            converted[name] = numbers
+            continue
+        dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+        if present and dates.notna().sum() >= 0.9 * present:
+            converted[name] = dates
+            continue
+        converted[name] = values
+    return pd.DataFrame(converted)
+
+def result_to_frame(results: Union[str, pd.DataFrame, Dict[str, Any]]) -> Tuple[pd.DataFrame, List[str]]:
+    """Typed DataFrame from formatted text, a DataFrame, or a fetch_rows() result"""
+    if isinstance(results, str):
+        df, notes = parse_result_table(results)
+    elif isinstance(results, pd.DataFrame):
+        df, notes = results.copy(), []
+    else:
+        df = pd.DataFrame(results['rows'], columns=results['columns'])
+        notes = ["More rows matched than were returned"] if results.get('truncated') else []
+    return _convert_types(df), notes
+
+def _fmt(value: Any) -> str:
+    """Compact number or date for the prompt"""
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d') if value.time() == pd.Timestamp(0).time() else str(value)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 'n/a'
+    if isinstance(value, (int, np.integer)):
+        return f"{value:,}"
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.2f}"
+    return str(value)
+
+def _pct(value: float) -> str:
+    return f"{value:+.1%}" if np.isfinite(value) else 'n/a'
+
+class _Columns:
+    """Roles of a result's columns: labels (text), time, measures (numbers)"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.dates = []
+        self.measures = []
+        self.labels = []
+        for name in df.columns:
+            column = df[name]
+            lowered = str(name).lower()
+            if pd.api.types.is_datetime64_any_dtype(column):
+                self.dates.append(name)
+            elif pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+                if lowered in TIME_COLUMN_NAMES:
+                    self.dates.append(name)
+                elif not lowered.endswith(IDENTIFIER_SUFFIXES):
+                    self.measures.append(name)
+            else:
+                self.labels.append(name)
+        # Prefer a period column (month, year) over other dates such as store_start_date
+        periods = [name for name in self.dates if str(name).lower() in TIME_COLUMN_NAMES]
+        self.time = (periods or self.dates or [None])[0]
+        # SQL aggregates usually come last, e.g. SELECT store_name, SUM(value) AS total
+        self.primary = self.measures[-1] if self.measures else None
+        # mis_long rows keep different metrics (Revenue, Area, ...) in one value column,
+        # so totals and shares across parameters would add up unlike units
+        self.unit = next((name for name in self.labels
+                          if str(name).lower() == 'parameter' and df[name].nunique() > 1), None)
+
+    def row_labels(self, df: pd.DataFrame) -> Optional[pd.Series]:
+        """'Store / Parameter' style label for each row from the first two text columns"""
+        if not self.labels:
+            return None
+        names = self.labels[:2]
+        if self.unit is not None and self.unit not in names:
+            names = [self.labels[0], self.unit]
+        parts = [df[name].astype(str).where(df[name].notna(), 'n/a') for name in names]
+        return parts[0].str.cat(parts[1:], sep=' / ') if len(parts) > 1 else parts[0]
+
+def _overview(df: pd.DataFrame, roles: _Columns, notes: List[str]) -> List[str]:
+    lines = [f"Rows: {len(df):,}"] + notes
+    described = []
+    for name in df.columns:
+        column = df[name]
+        if name in roles.dates and pd.api.types.is_datetime64_any_dtype(column):
+            described.append(f"{name} (date {_fmt(column.min())} to {_fmt(column.max())})")
+        elif name in roles.dates:
+            described.append(f"{name} ({_fmt(column.min())} to {_fmt(column.max())})")
+        elif name in roles.measures:
+            described.append(f"{name} (number)")
+        elif name in roles.labels:
+            described.append(f"{name} ({column.nunique():,} distinct)")
+        else:
+            described.append(f"{name} (identifier)")
+    lines.append("Columns: " + ", ".join(described))
+    return lines
+
+def _measure_stats(df: pd.DataFrame, roles: _Columns, labels: Optional[pd.Series], k: int) -> List[str]:
+    lines = []
+    if roles.unit is not None:
+        # The primary measure per parameter, most frequent first
+        grouped = df.groupby(roles.unit)[roles.primary].agg(['count', 'sum', 'mean', 'min', 'max'])
+        grouped = grouped[grouped['count'] > 0].sort_values('count', ascending=False).head(2 * k)
+        lines.extend(f"{roles.primary} for {unit}: total {_fmt(row['sum'])}, mean {_fmt(row['mean'])}, "
+                     f"min {_fmt(row['min'])}, max {_fmt(row['max'])} ({int(row['count']):,} rows)"
+                     for unit, row in grouped.iterrows())
+    for name in roles.measures:
+        if roles.unit is not None and name == roles.primary:
+            continue
+        column = df[name]
+        if column.notna().sum() == 0:
+            continue
+        low, high = column.idxmin(), column.idxmax()
+        at_low = f" ({labels[low]})" if labels is not None else ""
+        at_high = f" ({labels[high]})" if labels is not None else ""
+        missing = int(column.isna().sum())
+        lines.append(f"{name}: total {_fmt(column.sum())}, mean {_fmt(column.mean())}, "
+                     f"median {_fmt(column.median())}, min {_fmt(column[low])}{at_low}, "
+                     f"max {_fmt(column[high])}{at_high}" + (f", {missing:,} missing" if missing else ""))
+    return lines
+
+def _ranked(df: pd.DataFrame, roles: _Columns, labels: pd.Series, k: int) -> List[Tuple[str, List[str]]]:
+    """Top and bottom k rows by the primary measure, with shares of the total"""
+    measure = df[roles.primary]
+    total = measure.sum()
+    with_shares = bool(roles.unit is None and (measure.dropna() >= 0).all() and total > 0)
+
+    def describe(index) -> List[str]:
+        items = []
+        for i in index:
+            share = f" ({measure[i] / total:.1%} of total)" if with_shares else ""
+            when = f" in {_fmt(df.at[i, roles.time])}" if roles.time else ""
+            items.append(f"- {labels[i]}{when}: {_fmt(measure[i])}{share}")
+        return items
+
+    top = measure.nlargest(k).index
+    sections = [(f"Top {len(top)} by {roles.primary}:", describe(top))]
+    if with_shares:
+        sections[0][1].append(f"Top {len(top)} together: {measure[top].sum() / total:.1%} of the total")
+    if len(measure.dropna()) > k:
+        bottom = measure.nsmallest(k).index
+        sections.append((f"Bottom {len(bottom)} by {roles.primary}:", describe(bottom)))
+    return sections
+
+def _growth_rates(start: pd.Series, end: pd.Series,
+                  reference: Optional[pd.Series] = None) -> Tuple[pd.Series, pd.Series]:
+    """Growth rates of labels with a meaningful positive start, and the labels whose sign changed
+
+    Returns (growth, flips): growth is (end - start) / start for starts of at least
+    GROWTH_MIN_START_FRACTION of the median positive reference value (the starts
+    themselves by default); flips holds end - start for labels that went from
+    negative to positive or the other way round.
+    """
+    reference = start if reference is None else reference
+    positive = reference[reference > 0]
+    floor = GROWTH_MIN_START_FRACTION * positive.median() if len(positive) else np.inf
+    flipped = ((start < 0) & (end > 0)) | ((start > 0) & (end < 0))
+    valid = (start >= floor) & ~flipped & end.notna()
+    growth = ((end[valid] - start[valid]) / start[valid]).replace([np.inf, -np.inf], np.nan).dropna()
+    return growth, (end - start)[flipped]
+
+def _change_line(label: Any, start: float, end: float, growth: Optional[float] = None) -> str:
+    if growth is not None:
+        change = _pct(growth)
+    elif start < 0 < end:
+        change = "turned positive"
+    elif end < 0 < start:
+        change = "turned negative"
+    elif start < 0 and end < 0:
+        change = "negative throughout"
+    else:
+        change = "change from a small base"
+    return f"- {label}: {_fmt(start)} -> {_fmt(end)} ({change})"
+
+def _growth(df: pd.DataFrame, roles: _Columns, labels: Optional[pd.Series], k: int) -> List[Tuple[str, List[str]]]:
+    """Change over the time column, overall and per label"""
+    measure = roles.primary
+    sections = []
+    series = df.groupby(roles.time)[measure].sum(min_count=1).sort_index().dropna()
+    if len(series) >= 2 and roles.unit is None:
+        first, last = series.iloc[0], series.iloc[-1]
+        growth, _ = _growth_rates(pd.Series([first]), pd.Series([last]), series)
+        overall = [_change_line(f"{_fmt(series.index[0])} to {_fmt(series.index[-1])}", first, last,
+                                growth.iloc[0] if len(growth) else None)
+                   + f" over {len(series)} periods"]
+        # Period-on-period steps, with the same rule for the starting value
+        steps, _ = _growth_rates(series.shift().iloc[1:], series.iloc[1:], series)
+        if len(steps):
+            overall.append(f"- Largest rise: {_fmt(steps.idxmax())} ({_pct(steps.max())}); "
+                           f"largest fall: {_fmt(steps.idxmin())} ({_pct(steps.min())})")
+        sections.append((f"Total {measure} over {roles.time}:", overall))
+
+    if labels is not None:
+        pivot = (df.groupby([labels.rename('_label'), df[roles.time]])[measure].sum(min_count=1)
+                 .unstack().sort_index(axis=1))
+        # Zeros mostly mean "not open yet" or "not reported", and growth from zero is undefined
+        pivot = pivot.where(pivot != 0)
+        if pivot.shape[1] >= 2 and len(pivot) > 1:
+            # First and last reported value of each label, wherever its series starts and ends
+            start = pivot.bfill(axis=1).iloc[:, 0]
+            end = pivot.ffill(axis=1).iloc[:, -1]
+            growth, flips = _growth_rates(start, end)
+            if len(growth):
+                sections.append((f"Fastest growing by {measure} (first to last {roles.time}):",
+                                 [_change_line(label, start[label], end[label], g)
+                                  for label, g in growth.nlargest(k).items()]))
+                sections.append((f"Fastest declining by {measure}:",
+                                 [_change_line(label, start[label], end[label], g)
+                                  for label, g in growth.nsmallest(k).items() if g < 0]))
+            if len(flips):
+                sections.append((f"{measure} changed sign (first to last {roles.time}):",
+                                 [_change_line(label, start[label], end[label])
+                                  for label in flips.abs().nlargest(k).index]))
+    return sections
+
+def _outliers(df: pd.DataFrame, roles: _Columns, labels: Optional[pd.Series], k: int,
+              listed: pd.Index) -> List[str]:
+    """Rows whose primary measure is far from the median (robust z-score), skipping rows already listed"""
+    measure = df[roles.primary].dropna()
+    if len(measure) < 8 or roles.unit is not None:
+        return []
+    values = measure.to_numpy(dtype=float)
+    median = np.median(values)
+    mad = np.median(np.abs(values - median))
+    if mad == 0:
+        return []
+    z = pd.Series(0.6745 * (values - median) / mad, index=measure.index)
+    outlying = z[z.abs() > OUTLIER_Z]
+    if outlying.empty:
+        return []
+    items = [f"{int((outlying > 0).sum()):,} rows far above and {int((outlying < 0).sum()):,} far below "
+             f"the median {_fmt(median)}"]
+    flagged = outlying.drop(listed, errors='ignore').abs().sort_values(ascending=False).index[:k]
+    for i in flagged:
+        label = f"{labels[i]}" if labels is not None else f"row {i + 1}"
+        when = f" in {_fmt(df.at[i, roles.time])}" if roles.time else ""
+        direction = 'above' if measure[i] > median else 'below'
+        items.append(f"- {label}{when}: {_fmt(measure[i])} (far {direction} the median {_fmt(median)})")
+    return items
+
+def _categories(df: pd.DataFrame, roles: _Columns) -> List[str]:
+    lines = []
+    for name in roles.labels:
+        counts = df[name].value_counts()
+        if len(counts) == 0 or len(counts) == len(df):
+            continue
+        common = ", ".join(f"{value} ({count:,})" for value, count in counts.head(3).items())
+        lines.append(f"{name}: {len(counts):,} distinct; most rows: {common}")
+    return lines
+
+def build_digest(df: pd.DataFrame, notes: Optional[List[str]] = None, token_budget: int = DIGEST_TOKEN_BUDGET,
+                 k: int = DIGEST_TOP_K, table_text: Optional[str] = None) -> str:
+    """Statistics of a typed result DataFrame as prompt text of about token_budget tokens at most"""
+    df = df.reset_index(drop=True)
+    notes = notes or []
+    roles = _Columns(df)
+    labels = roles.row_labels(df)
+
+    # Sections in priority order; items are dropped from the end when the budget runs out
+    sections: List[Tuple[Optional[str], List[str]]] = [(None, _overview(df, roles, notes))]
+    small = table_text is not None and len(df) <= FULL_TABLE_ROWS
+    if small:
+        sections.append(("All rows:", table_text.split('\n')[:len(df) + 2]))
+    sections.append((None, _measure_stats(df, roles, labels, k)))
+    if roles.primary is not None:
+        listed = pd.Index([])
+        if labels is not None and not small and roles.unit is None:
+            sections.extend(_ranked(df, roles, labels, k))
+            measure = df[roles.primary]
+            listed = measure.nlargest(k).index.union(measure.nsmallest(k).index)
+        if roles.time is not None:
+            sections.extend(_growth(df, roles, labels, k))
+        outliers = _outliers(df, roles, labels, k, listed)
+        if outliers:
+            sections.append((f"Outliers in {roles.primary}:", outliers))
+    sections.append((None, _categories(df, roles)))
+
+    lines: List[str] = []
+    used = 0
+    for title, items in sections:
+        if not items:
+            continue
+        block = ([f"\n{title}"] if title else [""]) if lines else ([title] if title else [])
+        for item in items:
+            cost = estimate_tokens('\n'.join(block + [item]))
+            if used + cost > token_budget:
+                break
+            block.append(item)
+        if len(block) > (1 if title or lines else 0):
+            lines.extend(block)
+            used = estimate_tokens('\n'.join(lines))
+    return '\n'.join(lines).strip()
+
+def digest_results(results: Union[str, pd.DataFrame, Dict[str, Any]],
+                   token_budget: int = DIGEST_TOKEN_BUDGET, k: int = DIGEST_TOP_K) -> str:
+    """Digest of a query result for the summarization prompt
+
+    Text that isn't a result table (an error or "No results found") is
+    returned unchanged.
+    """
+    try:
+        df, notes = result_to_frame(results)
+    except (ValueError, KeyError, TypeError):
+        return results if isinstance(results, str) else str(results)
+    if df.empty:
+        return "No results found"
+    return build_digest(df, notes, token_budget, k, results if isinstance(results, str) else None)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Print the digest the summarizer would send for a result table')
+    parser.add_argument('file', help='Text file with a formatted result table')
+    parser.add_argument('--tokens', type=int, default=DIGEST_TOKEN_BUDGET,
+                        help=f'Token budget (default: {DIGEST_TOKEN_BUDGET})')
+    parser.add_argument('--top', type=int, default=DIGEST_TOP_K, help=f'Rows per ranking (default: {DIGEST_TOP_K})')
+    args = parser.parse_args()
+
+    with open(args.file, encoding='utf-8') as f:
+        text = f.read()
+    digest = digest_results(text, args.tokens, args.top)
+    print(digest)
+    print(f"\n📏 {estimate_tokens(text):,} tokens of results -> {estimate_tokens(digest):,} tokens of digest")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
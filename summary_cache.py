@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Summary Cache for BTC Store Analytics
+Persists local LLM summaries in SQLite, keyed by a hash of the question, SQL,
+results, backend, model and prompt version, so summarizing the same result
+again returns instantly. The least recently used entries are evicted beyond a
+size limit, entries can expire after a TTL, and hits and misses are counted
+across all worker processes sharing the file.
+
+Usage:
+    python summary_cache.py            # show statistics
+    python summary_cache.py --clear    # drop every cached summary
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables (optional for Railway deployment)
+load_dotenv(override=False)
+
+# Cache file; set SUMMARY_CACHE_PATH=off to disable caching
+SUMMARY_CACHE_PATH = os.getenv('SUMMARY_CACHE_PATH', '.summary_cache.sqlite3')
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '500'))
+# Seconds before a cached summary expires (0 keeps summaries until evicted)
+SUMMARY_CACHE_TTL = int(os.getenv('SUMMARY_CACHE_TTL', '0'))
+
+class SummaryCache:
+    """Size-bounded LRU cache of summaries in a SQLite file"""
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES,
+                 ttl: int = SUMMARY_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        # One connection shared by this process's threads; the timeout waits out other processes' writes
+        self._con = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                backend TEXT,
+                model TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._con.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self._con.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def make_key(query: str, sql: str, results: str, backend: str, model: str, prompt_version: Any) -> str:
+        """SHA-256 of everything that determines the summary"""
+        material = json.dumps([query, sql, results, backend, model, prompt_version], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str, amount: int = 1):
+        if amount:
+            self._con.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                              "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached summary for key, or None on a miss (an expired entry is removed)"""
+        now = time.time()
+        with self._lock:
+            row = self._con.execute("SELECT summary, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._con.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                self._count('expired')
+                row = None
+            if row is None:
+                self._count('misses')
+                return None
+            self._con.execute("UPDATE summaries SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._count('hits')
+            return row[0]
+
+    def put(self, key: str, summary: str, backend: Optional[str] = None, model: Optional[str] = None):
+        """Store a summary, then evict the least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                self._con.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, backend, model, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (key, summary, backend, model, now, now))
+                evicted = self._con.execute(
+                    "DELETE FROM summaries WHERE key IN "
+                    "(SELECT key FROM summaries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)).rowcount
+                self._count('evictions', evicted)
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Entries, hits, misses, hit rate, evictions and expirations since the cache file was created"""
+        with self._lock:
+            counters = dict(self._con.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self._con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(summary)), 0) FROM summaries").fetchone()
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'summary_bytes': size,
+            'ttl_seconds': self.ttl or None,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            'evictions': counters.get('evictions', 0),
+            'expired': counters.get('expired', 0)
+        }
+
+    def clear(self):
+        """Drop every cached summary and reset the counters"""
+        with self._lock:
+            self._con.execute("DELETE FROM summaries")
+            self._con.execute("DELETE FROM counters")
+
+    def close(self):
+        self._con.close()
+
+# Global instance
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+
+def get_summary_cache() -> Optional[SummaryCache]:
+    """Shared cache at SUMMARY_CACHE_PATH, or None when caching is disabled or the file can't be opened"""
+    global _summary_cache
+    if SUMMARY_CACHE_PATH.lower() in ('', 'off', 'none'):
+        return None
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            try:
+                _summary_cache = SummaryCache()
+            except sqlite3.Error as e:
+                print(f"⚠️  Summary cache disabled, could not open {SUMMARY_CACHE_PATH}: {e}")
+                return None
+        return _summary_cache
+
+def get_summary_cache_stats() -> Optional[Dict[str, Any]]:
+    """Statistics of the shared cache (None when disabled)"""
+    cache = get_summary_cache()
+    return cache.stats() if cache else None
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or clear the local LLM summary cache')
+    parser.add_argument('--clear', action='store_true', help='Remove every cached summary')
+    args = parser.parse_args()
+
+    cache = get_summary_cache()
+    if cache is None:
+        print("❌ Summary cache is disabled (SUMMARY_CACHE_PATH)")
+        return 1
+    if args.clear:
+        cache.clear()
+        print(f"🗑️  Cleared {cache.path}")
+        return 0
+
+    stats = cache.stats()
+    hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else "n/a"
+    print(f"💾 {cache.path}: {stats['entries']}/{stats['max_entries']} summaries ({stats['summary_bytes']:,} bytes)")
+    print(f"🎯 {stats['hits']} hits, {stats['misses']} misses, hit rate {hit_rate}")
+    print(f"♻️  {stats['evictions']} evicted, {stats['expired']} expired")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+-- Server-side aggregation for mis_long
+-- Run this in Supabase SQL Editor. supabase_client.py detects these functions and
+-- sends GROUP BY queries to mis_aggregate as one RPC instead of downloading rows.
+--
+-- Unlike exec_sql, mis_aggregate only accepts column names from a fixed list and
+-- a fixed set of aggregates and operators; values are always quoted as literals.
+-- It runs with the caller's rights (SECURITY INVOKER), so row level security applies.
+
+-- Version probe used by the client's capability check
+CREATE OR REPLACE FUNCTION mis_capabilities()
+RETURNS json
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT json_build_object('version', 1, 'functions', json_build_array('mis_aggregate'));
+$$;
+
+-- Aggregate mis_long:
+--   group_by  text[]  columns to group by, e.g. '{store_name}'
+--   measures  jsonb   [{"fn": "sum", "column": "value", "alias": "total_revenue"}, {"fn": "count", "column": "*"}]
+--   filters   jsonb   [{"column": "parameter", "op": "=", "value": "Revenue"},
+--                      {"column": "region", "op": "in", "value": ["North", "South"]},
+--                      {"column": "value", "op": "is not null"}]
+--   order_by  jsonb   [{"column": "total_revenue", "desc": true, "nulls": "last"}]
+--                     (group columns or measure aliases; "nulls" is optional: first or last)
+--   row_limit integer
+-- Returns a JSON array of rows.
+CREATE OR REPLACE FUNCTION mis_aggregate(
+    group_by text[] DEFAULT '{}',
+    measures jsonb DEFAULT '[{"fn": "sum", "column": "value", "alias": "total_value"}]',
+    filters jsonb DEFAULT '[]',
+    order_by jsonb DEFAULT '[]',
+    row_limit integer DEFAULT 1000
+)
+RETURNS json
+LANGUAGE plpgsql
+STABLE
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    allowed_columns text[] := ARRAY['store_name', 'parameter', 'cafe_code', 'region', 'category', 'for_ssg',
+                                    'area_store', 'store_start_date', 'vintage', 'month', 'value'];
+    select_items text[] := '{}';
+    where_items text[] := '{}';
+    order_items text[] := '{}';
+    aliases text[] := '{}';
+    measure jsonb;
+    filter jsonb;
+    item jsonb;
+    col text;
+    fn text;
+    alias text;
+    op text;
+    query text;
+    result json;
+BEGIN
+    FOREACH col IN ARRAY group_by LOOP
+        IF NOT col = ANY(allowed_columns) THEN
+            RAISE EXCEPTION 'mis_aggregate: unknown group column %', col;
+        END IF;
+        select_items := select_items || format('%I', col);
+    END LOOP;
+
+    FOR measure IN SELECT * FROM jsonb_array_elements(measures) LOOP
+        fn := lower(measure->>'fn');
+        col := measure->>'column';
+        alias := coalesce(measure->>'alias', fn);
+        IF fn NOT IN ('sum', 'avg', 'min', 'max', 'count') THEN
+            RAISE EXCEPTION 'mis_aggregate: unsupported aggregate %', fn;
+        END IF;
+        IF col = '*' AND fn = 'count' THEN
+            select_items := select_items || format('count(*) AS %I', alias);
+        ELSIF col = ANY(allowed_columns) THEN
+            select_items := select_items || format('%s(%I) AS %I', fn, col, alias);
+        ELSE
+            RAISE EXCEPTION 'mis_aggregate: unknown measure column %', col;
+        END IF;
+        aliases := aliases || alias;
+    END LOOP;
+
+    FOR filter IN SELECT * FROM jsonb_array_elements(filters) LOOP
+        col := filter->>'column';
+        op := lower(filter->>'op');
+        IF NOT col = ANY(allowed_columns) THEN
+            RAISE EXCEPTION 'mis_aggregate: unknown filter column %', col;
+        END IF;
+        IF op IN ('=', '<>', '<', '<=', '>', '>=', 'like', 'ilike', 'not like', 'not ilike') THEN
+            where_items := where_items || format('%I %s %L', col, op, filter->>'value');
+        ELSIF op IN ('in', 'not in') THEN
+            where_items := where_items || format('%I %s (%s)', col, op,
+                (SELECT string_agg(format('%L', v), ', ') FROM jsonb_array_elements_text(filter->'value') AS v));
+        ELSIF op IN ('is null', 'is not null') THEN
+            where_items := where_items || format('%I %s', col, op);
+        ELSE
+            RAISE EXCEPTION 'mis_aggregate: unsupported operator %', op;
+        END IF;
+    END LOOP;
+
+    FOR item IN SELECT * FROM jsonb_array_elements(order_by) LOOP
+        col := item->>'column';
+        IF NOT (col = ANY(group_by) OR col = ANY(aliases)) THEN
+            RAISE EXCEPTION 'mis_aggregate: can only order by group columns or measure aliases, not %', col;
+        END IF;
+        IF item->>'nulls' IS NOT NULL AND item->>'nulls' NOT IN ('first', 'last') THEN
+            RAISE EXCEPTION 'mis_aggregate: unsupported nulls placement %', item->>'nulls';
+        END IF;
+        -- Without "nulls" Postgres's default applies (first for DESC, last for ASC), as in plain SQL
+        order_items := order_items || format('%I %s%s', col,
+            CASE WHEN coalesce((item->>'desc')::boolean, false) THEN 'DESC' ELSE 'ASC' END,
+            CASE item->>'nulls' WHEN 'first' THEN ' NULLS FIRST' WHEN 'last' THEN ' NULLS LAST' ELSE '' END);
+    END LOOP;
+
+    IF cardinality(select_items) = 0 THEN
+        RAISE EXCEPTION 'mis_aggregate: nothing to select';
+    END IF;
+
+    query := format('SELECT %s FROM mis_long', array_to_string(select_items, ', '));
+    IF cardinality(where_items) > 0 THEN
+        query := query || ' WHERE ' || array_to_string(where_items, ' AND ');
+    END IF;
+    IF cardinality(group_by) > 0 THEN
+        query := query || ' GROUP BY ' || (SELECT string_agg(format('%I', g), ', ') FROM unnest(group_by) AS g);
+    END IF;
+    IF cardinality(order_items) > 0 THEN
+        query := query || ' ORDER BY ' || array_to_string(order_items, ', ');
+    END IF;
+    query := query || format(' LIMIT %s', greatest(coalesce(row_limit, 1000), 0));
+
+    EXECUTE format('SELECT json_agg(row_to_json(t)) FROM (%s) t', query) INTO result;
+    RETURN coalesce(result, '[]'::json);
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION mis_capabilities() TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION mis_aggregate(text[], jsonb, jsonb, jsonb, integer) TO anon, authenticated;
+
+-- Test the function
+SELECT mis_aggregate(
+    '{store_name}',
+    '[{"fn": "sum", "column": "value", "alias": "total_revenue"}]',
+    '[{"column": "parameter", "op": "=", "value": "Revenue"}]',
+    '[{"column": "total_revenue", "desc": true}]',
+    5
+);
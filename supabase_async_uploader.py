@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Async Supabase Uploader for BT MIS Analytics
+Posts record batches to PostgREST with several requests in flight, sizing
+batches from observed latency and payload limits and retrying transient
+errors with backoff.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+import httpx
+
+# Statuses worth retrying: timeouts, rate limiting and server-side errors
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Statuses that can mean a bad row when PostgREST gives no Postgres error code
+DATA_ERROR_STATUSES = {400, 409}
+
+def is_row_error(response: httpx.Response) -> bool:
+    """Whether a rejected batch is worth bisecting to isolate bad rows
+
+    Postgres data (22xxx) and constraint (23xxx) errors are row problems, as in
+    SupabaseRangeWriter. Auth failures, a missing table or column (PGRSTxxx) and
+    other errors fail every row the same way, so splitting the batch can't help.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    code = str(body.get('code') or '') if isinstance(body, dict) else ''
+    if code:
+        return code.startswith(('22', '23'))
+    return response.status_code in DATA_ERROR_STATUSES
+
+class AsyncSupabaseUploader:
+    """Concurrent, adaptive batch uploader for a PostgREST table"""
+
+    def __init__(self, supabase_url: str, supabase_key: str, table: str = 'mis_long',
+                 concurrency: int = 4, initial_batch_size: int = 500, min_batch_size: int = 50,
+                 max_batch_size: int = 5000, max_payload_bytes: int = 2_000_000,
+                 target_latency: float = 2.0, max_retries: int = 5, timeout: float = 60.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url = f"{supabase_url.rstrip('/')}/rest/v1/{table}"
+        self.headers = {
+            'apikey': supabase_key,
+            'Authorization': f"Bearer {supabase_key}",
+            'Content-Type': 'application/json',
+            'Prefer': 'return=minimal'
+        }
+        self.concurrency = concurrency
+        self.batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_payload_bytes = max_payload_bytes
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.transport = transport
+
+        self.bytes_per_record = None
+        self.stats = {}
+
+    def _next_batch_size(self) -> int:
+        """Current batch size, capped so the payload stays under the size limit"""
+        size = self.batch_size
+        if self.bytes_per_record:
+            size = min(size, int(self.max_payload_bytes / self.bytes_per_record))
+        return max(1, size)
+
+    def _grow_or_shrink(self, latency: float):
+        """Grow the batch by half while well under the target latency, halve it when over"""
+        if latency < self.target_latency / 2:
+            self.batch_size = min(self.max_batch_size, int(self.batch_size * 1.5) + 1)
+        elif latency > self.target_latency:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After when given"""
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+    async def _send(self, client: httpx.AsyncClient, records: List[Dict[str, Any]],
+                    start: int, end: int, requeued: deque, semaphore: asyncio.Semaphore):
+        """Post one batch; split it on payload/data errors, retry it on transient ones
+
+        Any other failure (auth, missing table, retries exhausted) aborts the
+        upload: no new batches are sent and stats['aborted'] holds the error.
+        """
+        try:
+            body = json.dumps(records[start:end], default=str)
+            error = None
+
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+
+                retry_after = None
+                request_start = time.monotonic()
+                self.stats['requests'] += 1
+                try:
+                    response = await client.post(self.url, content=body, headers=self.headers)
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+                    self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                    continue
+
+                latency = time.monotonic() - request_start
+
+                if response.status_code < 300:
+                    self.stats['loaded'] += end - start
+                    self.stats['bytes_sent'] += len(body)
+                    per_record = len(body) / (end - start)
+                    self.bytes_per_record = (per_record if self.bytes_per_record is None
+                                             else 0.8 * self.bytes_per_record + 0.2 * per_record)
+                    self._grow_or_shrink(latency)
+                    return
+
+                if response.status_code == 413:
+                    # Payload too large: lower the limit and resend as two halves
+                    self.max_payload_bytes = max(1024, int(len(body) * 0.5))
+                    self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                    error = 'payload too large'
+                    break
+
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code in RETRYABLE_STATUSES:
+                    retry_after = response.headers.get('Retry-After')
+                    self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                    continue
+                if is_row_error(response):
+                    # Data errors are not transient; bisect to isolate the bad rows
+                    break
+                self._abort(error)
+                return
+            else:
+                self._abort(f"{error} (after {self.max_retries} retries)")
+                return
+
+            if end - start > 1:
+                middle = (start + end) // 2
+                requeued.append((start, middle))
+                requeued.append((middle, end))
+            else:
+                self.stats['failed_rows'].append((start, error))
+        finally:
+            semaphore.release()
+
+    def _abort(self, error: str):
+        if not self.stats['aborted']:
+            self.stats['aborted'] = error
+
+    async def upload_async(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Upload all records and return a summary (stats['aborted'] is set if the upload stopped early)"""
+        self.stats = {'loaded': 0, 'requests': 0, 'retries': 0, 'bytes_sent': 0, 'failed_rows': [],
+                      'aborted': None}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        requeued: deque = deque()
+        tasks = set()
+        cursor = 0
+        start_time = time.time()
+
+        async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+            while cursor < len(records) or requeued or tasks:
+                if self.stats['aborted']:
+                    # Let in-flight batches finish, but send nothing new
+                    if tasks:
+                        await asyncio.wait(set(tasks))
+                    break
+                if not requeued and cursor >= len(records):
+                    # Nothing to dispatch until an in-flight batch finishes (it may requeue halves)
+                    await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                # Size the batch only once a slot is free, so it reflects the latest latency
+                await semaphore.acquire()
+                if self.stats['aborted']:
+                    semaphore.release()
+                    continue
+                if requeued:
+                    start, end = requeued.popleft()
+                elif cursor < len(records):
+                    start, end = cursor, min(cursor + self._next_batch_size(), len(records))
+                    cursor = end
+                else:
+                    semaphore.release()
+                    continue
+
+                task = asyncio.create_task(self._send(client, records, start, end, requeued, semaphore))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        elapsed = time.time() - start_time
+        self.stats['elapsed_seconds'] = round(elapsed, 2)
+        self.stats['rows_per_second'] = round(self.stats['loaded'] / max(elapsed, 1e-9), 1)
+        self.stats['final_batch_size'] = self.batch_size
+        return self.stats
+
+    def upload(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Synchronous wrapper around upload_async"""
+        return asyncio.run(self.upload_async(records))
@@ -5,14 +5,28 @@ Replaces DuckDB with Supabase PostgreSQL connection
 """
 
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 from typing import List, Dict, Any, Optional
 import pandas as pd
+from postgrest_query import translate_aggregate, PushdownError
 
 # Load environment variables
 load_dotenv()
 
+# Seconds a capability probe stays valid before the functions are checked again
+CAPABILITY_TTL = int(os.getenv('SUPABASE_CAPABILITY_TTL', '600'))
+
+# Group cap for mis_aggregate when the SQL has no LIMIT
+MAX_AGGREGATE_ROWS = int(os.getenv('SUPABASE_AGGREGATE_MAX_ROWS', '10000'))
+
+# PostgREST / Postgres error codes meaning the function can't be called:
+# not found in the schema cache, undefined function, permission denied
+UNAVAILABLE_FUNCTION_CODES = {'PGRST202', '42883', '42501'}
+
 class SupabaseClient:
     """Client for interacting with Supabase database"""
     
@@ -24,29 +38,114 @@ class SupabaseClient:
             raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        
+        self._capabilities: Optional[Dict[str, bool]] = None
+        self._capabilities_expire = 0.0
+        self._capability_lock = threading.Lock()
+        self.capabilities()
+    
+    def _probe(self, function: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Result of a probe RPC; False if the function can't be called, None if the probe itself failed"""
+        try:
+            result = self.supabase.rpc(function, params or {}).execute()
+            return result.data if result.data is not None else True
+        except APIError as e:
+            if e.code in UNAVAILABLE_FUNCTION_CODES:
+                return False
+            print(f"⚠️  Could not check {function}: {e.message}")
+        except Exception as e:
+            print(f"⚠️  Could not check {function}: {e}")
+        return None
+    
+    def capabilities(self, refresh: bool = False) -> Dict[str, Optional[bool]]:
+        """Which optional SQL functions the project has: {'exec_sql': ..., 'mis_aggregate': ...}
+        
+        Probed once and cached for CAPABILITY_TTL seconds. None means the probe
+        failed (e.g. a network error); that isn't cached, so the next call retries.
+        """
+        with self._capability_lock:
+            if not refresh and self._capabilities is not None and time.time() < self._capabilities_expire:
+                return dict(self._capabilities)
+            
+            exec_sql = self._probe('exec_sql', {'sql': 'SELECT 1 AS ok'})
+            # mis_capabilities lists the functions installed by supabase_aggregate_functions.sql
+            listed = self._probe('mis_capabilities')
+            capabilities = {
+                'exec_sql': None if exec_sql is None else exec_sql is not False,
+                'mis_aggregate': (None if listed is None else
+                                  isinstance(listed, dict) and 'mis_aggregate' in listed.get('functions', []))
+            }
+            if None not in capabilities.values():
+                self._capabilities = capabilities
+                self._capabilities_expire = time.time() + CAPABILITY_TTL
+            return dict(capabilities)
+    
+    def _mark_unavailable(self, function: str):
+        """Record that a function disappeared since the last probe"""
+        with self._capability_lock:
+            if self._capabilities is not None:
+                self._capabilities[function] = False
     
     def execute_query(self, sql_query: str) -> str:
-        """Execute SQL query and return results as formatted string"""
+        """Execute SQL query and return results as formatted string
+        
+        Routes straight to the best available backend: exec_sql runs any SQL,
+        mis_aggregate runs GROUP BY queries inside Postgres, and anything else
+        goes through the table API.
+        """
         try:
             # Remove any DuckDB-specific syntax and convert to PostgreSQL
             sql_query = self._convert_duckdb_to_postgresql(sql_query)
+            capabilities = self.capabilities()
             
-            # Try to execute using raw SQL (if available in your Supabase setup)
-            try:
-                # This requires enabling the exec_sql function in Supabase
-                result = self.supabase.rpc('exec_sql', {'sql': sql_query}).execute()
-                
-                if result.data:
-                    return self._format_results(result.data)
-                else:
-                    return "Query executed successfully (no results returned)"
-            except:
-                # Fallback to alternative approach
-                return self._execute_query_alternative(sql_query)
+            if capabilities['exec_sql'] is not False:
+                try:
+                    return self._execute_exec_sql(sql_query)
+                except APIError as e:
+                    if e.code not in UNAVAILABLE_FUNCTION_CODES:
+                        return f"Error executing query: {e.message}"
+                    self._mark_unavailable('exec_sql')
+            
+            if capabilities['mis_aggregate'] is not False:
+                try:
+                    params, columns = translate_aggregate(sql_query)
+                except PushdownError:
+                    params = None
+                if params is not None:
+                    try:
+                        return self._execute_aggregate(params, columns)
+                    except APIError as e:
+                        if e.code not in UNAVAILABLE_FUNCTION_CODES:
+                            return f"Error executing query: {e.message}"
+                        self._mark_unavailable('mis_aggregate')
+            
+            return self._execute_query_alternative(sql_query)
                 
         except Exception as e:
             return f"Error executing query: {e}"
     
+    def _execute_exec_sql(self, sql_query: str) -> str:
+        """Run arbitrary SQL through the exec_sql function (enable_supabase_sql.sql)"""
+        # exec_sql wraps the statement in a subquery, where a trailing semicolon is a syntax error
+        result = self.supabase.rpc('exec_sql', {'sql': sql_query.strip().rstrip(';')}).execute()
+        
+        if result.data:
+            return self._format_results(result.data)
+        else:
+            return "Query executed successfully (no results returned)"
+    
+    def _execute_aggregate(self, params: Dict[str, Any], columns: List[str]) -> str:
+        """Run a translated GROUP BY query through mis_aggregate (supabase_aggregate_functions.sql)"""
+        if params['row_limit'] is None:
+            params = dict(params, row_limit=MAX_AGGREGATE_ROWS)
+        result = self.supabase.rpc('mis_aggregate', params).execute()
+        
+        if not result.data:
+            return "No results found"
+        # The function returns JSON objects; restore the SELECT column order
+        df = pd.DataFrame(result.data)
+        return self._format_results(df[columns].to_dict('records'))
+    
     def _convert_duckdb_to_postgresql(self, sql: str) -> str:
         """Convert DuckDB-specific syntax to PostgreSQL"""
         # DuckDB uses different syntax for some functions
@@ -183,6 +282,17 @@ class SupabaseClient:
         except Exception as e:
             return f"Error getting table info: {e}"
     
+    def scan_table(self, table: str = 'mis_long', filters: Optional[List[tuple]] = None,
+                   workers: int = 8) -> pd.DataFrame:
+        """Read a whole table (optionally filtered with PostgREST params) with parallel paged requests"""
+        from supabase_scan import SupabaseScanner
+        
+        scanner = SupabaseScanner(self.supabase_url, self.supabase_key, workers=workers)
+        try:
+            return scanner.scan(table, filters=filters or [])
+        finally:
+            scanner.close()
+    
     def test_connection(self) -> bool:
         """Test the connection to Supabase"""
         try:
@@ -213,6 +323,9 @@ if __name__ == "__main__":
     
     if client.test_connection():
         print("✅ Supabase connection successful!")
+        for function, available in client.capabilities().items():
+            status = "✅ available" if available else ("❌ not installed" if available is False else "⚠️  unknown")
+            print(f"🔧 {function}: {status}")
         print("\n📊 Table info:")
         print(client.get_table_info())
     else:
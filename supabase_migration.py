@@ -4,10 +4,12 @@ Supabase Migration Script for BT MIS Analytics
 Migrates data from local CSV to Supabase PostgreSQL database
 """
 
+import argparse
 import pandas as pd
 import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from migration_engine import ParallelMigrator, SupabaseRangeWriter, FileCheckpointStore, compute_run_id
 import time
 from typing import Optional
 
@@ -135,6 +137,47 @@ class SupabaseMigrator:
         print(f"🎉 Migration completed! {successful_records}/{len(data)} records migrated successfully")
         return successful_records
     
+    def migrate_data_parallel(self, data: list, run_id: str, workers: int = 4, range_size: int = 1000,
+                              checkpoint_path: str = '.supabase_migration_checkpoint.json'):
+        """Upload ranges concurrently, resuming from a local checkpoint file"""
+        print(f"🚀 Starting parallel migration of {len(data)} records...")
+        
+        records = self._clean_batch_data(data)
+        
+        migrator = ParallelMigrator(
+            writer_factory=lambda: SupabaseRangeWriter(self.supabase_url, self.supabase_key, records),
+            checkpoint=FileCheckpointStore(checkpoint_path),
+            run_id=run_id,
+            range_size=range_size,
+            workers=workers
+        )
+        summary = migrator.run(len(records))
+        
+        if summary['failed_ranges']:
+            return 0
+        # A resumed run counts the rows earlier attempts already committed
+        return summary['already_loaded'] + summary['loaded']
+    
+    def migrate_data_async(self, data: list, concurrency: int = 4, batch_size: int = 500):
+        """Upload with several batch requests in flight and adaptive batch sizes"""
+        from supabase_async_uploader import AsyncSupabaseUploader
+        
+        print(f"🚀 Starting async migration of {len(data)} records ({concurrency} requests in flight)...")
+        
+        records = self._clean_batch_data(data)
+        uploader = AsyncSupabaseUploader(self.supabase_url, self.supabase_key,
+                                         concurrency=concurrency, initial_batch_size=batch_size)
+        summary = uploader.upload(records)
+        
+        print(f"🎉 Uploaded {summary['loaded']}/{len(records)} records in {summary['elapsed_seconds']}s "
+              f"({summary['rows_per_second']:,.0f} rows/s, {summary['requests']} requests, "
+              f"{summary['retries']} retries, final batch size {summary['final_batch_size']})")
+        for row, error in summary['failed_rows'][:10]:
+            print(f"⚠️  Record {row} rejected: {error}")
+        if summary['aborted']:
+            print(f"❌ Upload stopped early: {summary['aborted']}")
+        return summary['loaded']
+    
     def _clean_batch_data(self, batch: list) -> list:
         """Clean batch data to ensure JSON compatibility"""
         cleaned_batch = []
@@ -207,7 +250,9 @@ class SupabaseMigrator:
             print(f"❌ Verification failed: {e}")
             return False
     
-    def run_migration(self, csv_path: str = 'clean_mis_long.csv'):
+    def run_migration(self, csv_path: str = 'clean_mis_long.csv', parallel: bool = False,
+                      workers: int = 4, range_size: int = 1000, run_id: str = None,
+                      use_async: bool = False, concurrency: int = 4):
         """Run the complete migration process"""
         print("🚀 Starting Supabase Migration for BT MIS Analytics")
         print("=" * 50)
@@ -222,7 +267,14 @@ class SupabaseMigrator:
             return False
         
         # Step 3: Migrate data
-        successful_records = self.migrate_data(data)
+        if use_async:
+            successful_records = self.migrate_data_async(data, concurrency)
+        elif parallel:
+            successful_records = self.migrate_data_parallel(
+                data, run_id or compute_run_id(csv_path), workers, range_size
+            )
+        else:
+            successful_records = self.migrate_data(data)
         if successful_records == 0:
             return False
         
@@ -239,9 +291,21 @@ class SupabaseMigrator:
 
 def main():
     """Main function to run the migration"""
+    parser = argparse.ArgumentParser(description='Migrate clean_mis_long.csv into Supabase')
+    parser.add_argument('--csv', default='clean_mis_long.csv', help='Tidy CSV to load (default: clean_mis_long.csv)')
+    parser.add_argument('--parallel', action='store_true', help='Upload ranges concurrently and resume from checkpoints')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent uploads in parallel mode (default: 4)')
+    parser.add_argument('--range-size', type=int, default=1000, help='Records per range in parallel mode (default: 1000)')
+    parser.add_argument('--run-id', help='Checkpoint run id for parallel mode (default: hash of the CSV content)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Upload with concurrent async requests and adaptive batch sizes')
+    parser.add_argument('--concurrency', type=int, default=4, help='Requests in flight in async mode (default: 4)')
+    args = parser.parse_args()
+    
     try:
         migrator = SupabaseMigrator()
-        success = migrator.run_migration()
+        success = migrator.run_migration(args.csv, args.parallel, args.workers, args.range_size, args.run_id,
+                                         args.use_async, args.concurrency)
         
         if success:
             print("\n✅ Next steps:")
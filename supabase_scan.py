@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Parallel Supabase Scanner for BT MIS Analytics
+Reads results larger than one PostgREST response with several requests in
+flight. The scan counts the matching rows first, then splits the work into id
+ranges (keyset pagination), or into offset pages when the query has its own
+ORDER BY. Pages are fetched over one pooled keep-alive session and reassembled
+in order into a DataFrame.
+
+Usage:
+    python supabase_scan.py --sql "SELECT * FROM mis_long WHERE parameter = 'Revenue'" --output revenue.csv
+    python supabase_scan.py --table mis_long --output mis_long.parquet --workers 16
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from postgrest_query import translate_sql, PushdownError
+
+# Load environment variables
+load_dotenv()
+
+class RangeNotSatisfiable(Exception):
+    """HTTP 416: the requested page starts past the last row"""
+
+class SupabaseScanner:
+    """Concurrent paged reads from a PostgREST endpoint"""
+
+    def __init__(self, supabase_url: str, supabase_key: str, workers: int = 8, page_size: int = 1000,
+                 timeout: float = 60.0, max_retries: int = 3):
+        self.rest_url = f"{supabase_url.rstrip('/')}/rest/v1"
+        self.workers = workers
+        self.page_size = page_size
+        self.timeout = timeout
+
+        # One connection per worker, kept alive across pages; rate limits and
+        # gateway errors are retried with backoff (honouring Retry-After)
+        retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['GET'], respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'apikey': supabase_key,
+            'Authorization': f"Bearer {supabase_key}"
+        })
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _get(self, table: str, params: List[Tuple[str, str]], headers: Optional[Dict[str, str]] = None):
+        response = self.session.get(f"{self.rest_url}/{table}", params=params, headers=headers,
+                                    timeout=self.timeout)
+        with self._stats_lock:
+            self.stats['requests'] = self.stats.get('requests', 0) + 1
+        if response.status_code == 416:
+            raise RangeNotSatisfiable(response.headers.get('Content-Range', ''))
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('message', response.text)
+            except ValueError:
+                detail = response.text
+            raise RuntimeError(f"PostgREST returned HTTP {response.status_code}: {detail}")
+        return response
+
+    def count(self, table: str, filters: Sequence[Tuple[str, str]] = (), method: str = 'exact') -> Optional[int]:
+        """Matching rows: 'exact' runs COUNT(*), 'planned' uses the planner estimate,
+        'estimated' is exact for small results and planned for large ones"""
+        response = self._get(table, list(filters) + [('limit', '1')], headers={'Prefer': f"count={method}"})
+        # Content-Range: 0-0/154440 (or */0 when nothing matches)
+        total = response.headers.get('Content-Range', '*/*').split('/')[-1]
+        return int(total) if total.isdigit() else None
+
+    def _key_bounds(self, table: str, filters: Sequence[Tuple[str, str]], key: str) -> Optional[Tuple[int, int]]:
+        """Smallest and largest integer key among the matching rows"""
+        bounds = []
+        for direction in ('asc', 'desc'):
+            rows = self._get(table, list(filters) + [('select', key), ('order', f"{key}.{direction}"),
+                                                      ('limit', '1')]).json()
+            if not rows or not isinstance(rows[0].get(key), int):
+                return None
+            bounds.append(rows[0][key])
+        return bounds[0], bounds[1]
+
+    def _fetch_key_range(self, table: str, select: str, filters: Sequence[Tuple[str, str]], key: str,
+                         low: int, high: int) -> List[Dict[str, Any]]:
+        """All matching rows with low <= key < high, in key order"""
+        rows = []
+        lower = ('gte', low)
+        while True:
+            page = self._get(table, list(filters) + [
+                ('select', select),
+                (key, f"{lower[0]}.{lower[1]}"),
+                (key, f"lt.{high}"),
+                ('order', f"{key}.asc"),
+                ('limit', str(self.page_size))
+            ]).json()
+            rows.extend(page)
+            # PostgREST may cap a response below page_size, so only an empty
+            # page or reaching the end of the range means the range is done
+            if not page or page[-1][key] >= high - 1:
+                return rows
+            lower = ('gt', page[-1][key])
+
+    def _fetch_offset_page(self, table: str, params: List[Tuple[str, str]], offset: int,
+                           limit: int) -> List[Dict[str, Any]]:
+        """Rows offset..offset+limit-1 of an ordered query, re-requesting the rest if the server capped the page"""
+        rows = []
+        while len(rows) < limit:
+            start = offset + len(rows)
+            try:
+                page = self._get(table, params, headers={
+                    'Range-Unit': 'items',
+                    'Range': f"{start}-{offset + limit - 1}"
+                }).json()
+            except RangeNotSatisfiable:
+                # Past the last row (the count was an overestimate)
+                break
+            if not page:
+                break
+            rows.extend(page)
+        return rows
+
+    def scan(self, table: str, select: str = '*', filters: Sequence[Tuple[str, str]] = (),
+             order: Optional[str] = None, limit: Optional[int] = None, offset: Optional[int] = None,
+             key: str = 'id', count: str = 'exact') -> pd.DataFrame:
+        """Fetch every matching row concurrently and return them in order as a DataFrame
+
+        Unordered scans are split into key ranges and read with keyset pagination,
+        which stays fast however deep the scan goes. Ordered or limited scans read
+        offset pages in the query's order (with key as a tiebreaker).
+        """
+        self.stats = {'requests': 0}
+        start_time = time.time()
+        filters = list(filters)
+
+        total = self.count(table, filters, count)
+        if limit is not None:
+            total = min(total, limit) if total is not None else limit
+        if total == 0:
+            return self._finish(pd.DataFrame(), start_time, 'empty', 0)
+
+        # The key must be selected for keyset paging and tiebreaking; it's dropped again afterwards
+        selected = [column.split(':')[-1] for column in select.split(',')]
+        added_key = select != '*' and key not in selected
+        scan_select = f"{select},{key}" if added_key else select
+
+        bounds = None
+        if order is None and limit is None and not offset:
+            bounds = self._key_bounds(table, filters, key)
+
+        if bounds is not None:
+            low, high = bounds[0], bounds[1] + 1
+            expected_rows = total if total is not None else high - low
+            chunks = max(1, min(self.workers * 4, math.ceil(expected_rows / self.page_size)))
+            step = math.ceil((high - low) / chunks)
+            ranges = [(start, min(start + step, high)) for start in range(low, high, step)]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pages = list(executor.map(
+                    lambda r: self._fetch_key_range(table, scan_select, filters, key, r[0], r[1]), ranges
+                ))
+            strategy = 'keyset'
+        else:
+            # Offsets are only stable if the order is total, so break ties on the key
+            order_items = order.split(',') if order else []
+            if not any(item.split('.')[0] == key for item in order_items):
+                order_items.append(f"{key}.asc")
+            params = filters + [('select', scan_select), ('order', ','.join(order_items))]
+            base = offset or 0
+            known = total if total is not None else self.page_size
+            offsets = list(range(base, base + known, self.page_size))
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pages = list(executor.map(
+                    lambda o: self._fetch_offset_page(table, params, o, min(self.page_size, base + known - o)),
+                    offsets
+                ))
+            # A planner estimate can be low; keep reading past it until the rows run out
+            if count != 'exact' and limit is None:
+                next_offset = base + known
+                while True:
+                    page = self._fetch_offset_page(table, params, next_offset, self.page_size)
+                    if not page:
+                        break
+                    pages.append(page)
+                    next_offset += len(page)
+            strategy = 'offset'
+
+        return self._finish(self._to_frame(pages, key if added_key else None), start_time, strategy, len(pages))
+
+    def _to_frame(self, pages: List[List[Dict[str, Any]]], drop_key: Optional[str]) -> pd.DataFrame:
+        """Concatenate pages, in order, column by column"""
+        first = next((page[0] for page in pages if page), None)
+        if first is None:
+            return pd.DataFrame()
+        columns = {name: [] for name in first if name != drop_key}
+        for page in pages:
+            for name, values in columns.items():
+                values.extend(row.get(name) for row in page)
+        return pd.DataFrame(columns)
+
+    def _finish(self, df: pd.DataFrame, start_time: float, strategy: str, chunks: int) -> pd.DataFrame:
+        elapsed = time.time() - start_time
+        self.stats.update({
+            'rows': len(df),
+            'strategy': strategy,
+            'chunks': chunks,
+            'elapsed_seconds': round(elapsed, 2),
+            'rows_per_second': round(len(df) / max(elapsed, 1e-9), 1)
+        })
+        return df
+
+    def scan_sql(self, sql_query: str, **kwargs) -> pd.DataFrame:
+        """Scan the rows selected by a SQL query (see postgrest_query.translate_sql for what's supported)"""
+        translated = translate_sql(sql_query)
+        if translated.count_only:
+            raise PushdownError("COUNT(*) returns a single value; use count() instead of a scan")
+        return self.scan(translated.table, translated.select, translated.filters, translated.order,
+                         translated.limit, translated.offset, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+def get_supabase_scanner(workers: Optional[int] = None) -> SupabaseScanner:
+    """Scanner for the project in SUPABASE_URL / SUPABASE_ANON_KEY"""
+    supabase_url = os.getenv('SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_ANON_KEY')
+    if not supabase_url or not supabase_key:
+        raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
+    return SupabaseScanner(supabase_url, supabase_key,
+                           workers=workers or int(os.getenv('SUPABASE_SCAN_WORKERS', '8')))
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Read a large Supabase table or query with parallel requests')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sql', help='SELECT to scan (filters, ordering and limits are pushed down)')
+    source.add_argument('--table', help='Scan a whole table')
+    parser.add_argument('--output', '-o', required=True, help='Output file (.csv or .parquet)')
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent requests (default: 8)')
+    parser.add_argument('--page-size', type=int, default=1000, help='Rows per request (default: 1000)')
+    parser.add_argument('--count', choices=['exact', 'planned', 'estimated'], default='exact',
+                        help='How to count rows before splitting the scan (default: exact)')
+    args = parser.parse_args()
+
+    scanner = get_supabase_scanner(args.workers)
+    scanner.page_size = args.page_size
+    try:
+        if args.sql:
+            df = scanner.scan_sql(args.sql, count=args.count)
+        else:
+            df = scanner.scan(args.table, count=args.count)
+    except (PushdownError, RuntimeError, requests.RequestException) as e:
+        print(f"❌ Scan failed: {e}")
+        return 1
+    finally:
+        scanner.close()
+
+    if args.output.endswith('.parquet'):
+        df.to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+
+    stats = scanner.stats
+    print(f"🎉 Scanned {stats['rows']:,} rows in {stats['elapsed_seconds']}s "
+          f"({stats['rows_per_second']:,.0f} rows/s, {stats['requests']} requests, {stats['strategy']})")
+    print(f"💾 Saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
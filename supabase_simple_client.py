@@ -5,14 +5,19 @@ Uses Supabase's built-in query capabilities for common operations
 """
 
 import os
+import requests
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from typing import List, Dict, Any, Optional
 import pandas as pd
+from postgrest_query import translate_sql, PostgrestQuery, PushdownError
 
 # Load environment variables
 load_dotenv()
 
+# Rows shown for queries without a LIMIT
+MAX_DISPLAY_ROWS = 1000
+
 class SimpleSupabaseClient:
     """Simple client for common Supabase operations"""
     
@@ -24,165 +29,71 @@ class SimpleSupabaseClient:
             raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in .env file")
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        
+        # Translated queries go straight to the PostgREST endpoint over one keep-alive session
+        self.timeout = float(os.getenv('SUPABASE_TIMEOUT', '60'))
+        self.session = requests.Session()
+        self.session.headers.update({
+            'apikey': self.supabase_key,
+            'Authorization': f"Bearer {self.supabase_key}"
+        })
     
     def execute_simple_query(self, sql_query: str) -> str:
-        """Execute simple queries using Supabase client methods"""
+        """Execute a SELECT by translating it into PostgREST query parameters"""
         try:
-            sql_upper = sql_query.upper().strip()
-            
-            # Handle different types of queries
-            if 'SELECT' in sql_upper and 'FROM mis_long' in sql_upper:
-                return self._handle_select_query(sql_query)
-            else:
-                return "Complex queries not yet supported. Please use simpler SELECT statements."
-                
-        except Exception as e:
-            return f"Error executing query: {e}"
-    
-    def _handle_select_query(self, sql_query: str) -> str:
-        """Handle SELECT queries using Supabase client"""
+            translated = translate_sql(sql_query)
+        except PushdownError as e:
+            return (f"Error: this query can't run through the PostgREST API ({e}). "
+                    f"Aggregations and joins need the exec_sql function (enable_supabase_sql.sql) "
+                    f"or a direct PostgreSQL connection.")
+        
         try:
-            # Parse the query to extract basic components
-            sql_upper = sql_query.upper()
-            
-            # Start with base query
-            query = self.supabase.table('mis_long')
-            
-            # Handle WHERE clauses
-            if 'WHERE' in sql_upper:
-                where_clause = self._extract_where_clause(sql_query)
-                if where_clause:
-                    query = self._apply_where_clause(query, where_clause)
-            
-            # Handle GROUP BY
-            if 'GROUP BY' in sql_upper:
-                group_by = self._extract_group_by(sql_query)
-                if group_by:
-                    query = query.select(f"{group_by}, SUM(value) as total_value")
-                else:
-                    query = query.select('*')
-            else:
-                query = query.select('*')
-            
-            # Handle ORDER BY
-            if 'ORDER BY' in sql_upper:
-                order_by = self._extract_order_by(sql_query)
-                if order_by:
-                    if 'DESC' in sql_upper:
-                        query = query.order(order_by, desc=True)
-                    else:
-                        query = query.order(order_by)
-            
-            # Handle LIMIT
-            if 'LIMIT' in sql_upper:
-                limit = self._extract_limit(sql_query)
-                if limit:
-                    query = query.limit(limit)
-            else:
-                query = query.limit(1000)  # Default limit
-            
-            # Execute the query
-            result = query.execute()
-            
-            if result.data:
-                return self._format_results(result.data)
-            else:
-                return "No results found"
-                
+            return self._handle_select_query(translated)
         except Exception as e:
-            return f"Error executing SELECT query: {e}"
-    
-    def _extract_where_clause(self, sql_query: str) -> Optional[str]:
-        """Extract WHERE clause from SQL"""
-        try:
-            sql_upper = sql_query.upper()
-            where_start = sql_upper.find('WHERE')
-            if where_start == -1:
-                return None
-            
-            # Find the end of WHERE clause
-            where_end = sql_upper.find('GROUP BY', where_start)
-            if where_end == -1:
-                where_end = sql_upper.find('ORDER BY', where_start)
-            if where_end == -1:
-                where_end = sql_upper.find('LIMIT', where_start)
-            if where_end == -1:
-                where_end = len(sql_query)
-            
-            where_clause = sql_query[where_start + 5:where_end].strip()
-            return where_clause
-        except:
-            return None
-    
-    def _extract_group_by(self, sql_query: str) -> Optional[str]:
-        """Extract GROUP BY clause from SQL"""
-        try:
-            sql_upper = sql_query.upper()
-            group_start = sql_upper.find('GROUP BY')
-            if group_start == -1:
-                return None
-            
-            group_end = sql_upper.find('ORDER BY', group_start)
-            if group_end == -1:
-                group_end = sql_upper.find('LIMIT', group_start)
-            if group_end == -1:
-                group_end = len(sql_query)
-            
-            group_clause = sql_query[group_start + 8:group_end].strip()
-            return group_clause
-        except:
-            return None
-    
-    def _extract_order_by(self, sql_query: str) -> Optional[str]:
-        """Extract ORDER BY clause from SQL"""
-        try:
-            sql_upper = sql_query.upper()
-            order_start = sql_upper.find('ORDER BY')
-            if order_start == -1:
-                return None
-            
-            order_end = sql_upper.find('LIMIT', order_start)
-            if order_end == -1:
-                order_end = len(sql_query)
-            
-            order_clause = sql_query[order_start + 8:order_end].strip()
-            # Remove DESC/ASC
-            order_clause = order_clause.replace('DESC', '').replace('ASC', '').strip()
-            return order_clause
-        except:
-            return None
+            return f"Error executing query: {e}"
     
-    def _extract_limit(self, sql_query: str) -> Optional[int]:
-        """Extract LIMIT clause from SQL"""
-        try:
-            sql_upper = sql_query.upper()
-            limit_start = sql_upper.find('LIMIT')
-            if limit_start == -1:
-                return None
-            
-            limit_clause = sql_query[limit_start + 5:].strip()
-            limit_value = int(limit_clause.split()[0])
-            return limit_value
-        except:
-            return None
+    def _handle_select_query(self, translated: PostgrestQuery) -> str:
+        """Run a translated SELECT; filtering, ordering and limits happen in PostgREST"""
+        url = f"{self.supabase_url.rstrip('/')}/rest/v1/{translated.table}"
+        
+        if translated.count_only:
+            response = self.session.get(url, params=translated.params(),
+                                        headers={'Prefer': 'count=exact'}, timeout=self.timeout)
+            self._raise_for_status(response)
+            # Content-Range: 0-0/154440 (or */0 when nothing matches)
+            total = int(response.headers.get('Content-Range', '*/0').split('/')[-1])
+            return self._format_results([{translated.count_alias: total}])
+        
+        if translated.limit is not None:
+            response = self.session.get(url, params=translated.params(), timeout=self.timeout)
+            self._raise_for_status(response)
+            data = response.json()
+            return self._format_results(data) if data else "No results found"
+        
+        # Without a LIMIT, fetch one display page. Supabase caps responses at 1,000 rows
+        # (max-rows), so the planner's estimate in Content-Range tells whether there are more
+        response = self.session.get(url, params=translated.params(default_limit=MAX_DISPLAY_ROWS),
+                                    headers={'Prefer': 'count=planned'}, timeout=self.timeout)
+        self._raise_for_status(response)
+        data = response.json()
+        
+        if not data:
+            return "No results found"
+        output = self._format_results(data)
+        estimate = response.headers.get('Content-Range', '*/*').split('/')[-1]
+        if len(data) >= MAX_DISPLAY_ROWS and estimate.isdigit() and int(estimate) > len(data):
+            output += (f"\n\n📊 About {int(estimate):,} matching rows (approximate, planner estimate)"
+                       f"\n⚠️  Showing first {len(data):,} rows (limited for display)")
+        return output
     
-    def _apply_where_clause(self, query, where_clause: str):
-        """Apply WHERE clause to Supabase query"""
-        try:
-            # Simple WHERE clause handling
-            if "parameter = 'Revenue'" in where_clause:
-                query = query.eq('parameter', 'Revenue')
-            elif "parameter = 'EBITDA'" in where_clause:
-                query = query.eq('parameter', 'EBITDA')
-            elif "parameter = 'Transactions'" in where_clause:
-                query = query.eq('parameter', 'Transactions')
-            elif "parameter = 'Area'" in where_clause:
-                query = query.eq('parameter', 'Area')
-            
-            # Add more WHERE clause handling as needed
-            return query
-        except:
-            return query
+    def _raise_for_status(self, response):
+        """Raise with PostgREST's own error message (e.g. an unknown column)"""
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('message', response.text)
+            except ValueError:
+                detail = response.text
+            raise RuntimeError(f"PostgREST returned HTTP {response.status_code}: {detail}")
     
     def _format_results(self, data: List[Dict[str, Any]]) -> str:
         """Format query results for display"""
@@ -214,6 +125,16 @@ class SimpleSupabaseClient:
         
         return "\n".join(output)
     
+    def scan_query(self, sql_query: str, workers: int = 8) -> pd.DataFrame:
+        """Fetch every row of a pushed-down SELECT with parallel paged requests (no display cap)"""
+        from supabase_scan import SupabaseScanner
+        
+        scanner = SupabaseScanner(self.supabase_url, self.supabase_key, workers=workers, timeout=self.timeout)
+        try:
+            return scanner.scan_sql(sql_query)
+        finally:
+            scanner.close()
+    
     def test_connection(self) -> bool:
         """Test the connection to Supabase"""
         try:
@@ -246,7 +167,7 @@ if __name__ == "__main__":
         print("✅ Supabase connection successful!")
         
         # Test a simple query
-        test_query = "SELECT store_name, SUM(value) as total_revenue FROM mis_long WHERE parameter = 'Revenue' GROUP BY store_name ORDER BY total_revenue DESC LIMIT 5"
+        test_query = "SELECT store_name, month, value AS revenue FROM mis_long WHERE parameter = 'Revenue' ORDER BY revenue DESC LIMIT 5"
         print(f"\n🔍 Testing query: {test_query}")
         result = client.execute_simple_query(test_query)
         print(f"\n📊 Results:\n{result}")
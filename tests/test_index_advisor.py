@@ -0,0 +1,42 @@
+from collections import Counter
+
+from index_advisor import IndexAdvisor, query_columns
+
+COLUMNS = ['id', 'store_name', 'parameter', 'cafe_code', 'region', 'category', 'for_ssg',
+           'area_store', 'store_start_date', 'vintage', 'month', 'value', 'created_at']
+
+REGION_SQL = ("SELECT region, SUM(value) AS total FROM mis_long WHERE parameter = 'Revenue' "
+              "AND month >= '2023-01-01' AND month < '2024-01-01' GROUP BY region")
+
+
+def _advisor():
+    """IndexAdvisor without a connection; recommend only needs the column list"""
+    advisor = object.__new__(IndexAdvisor)
+    advisor.columns = COLUMNS
+    advisor.partitioned = False
+    return advisor
+
+
+def test_query_columns_follow_the_query_not_the_literals():
+    assert query_columns(REGION_SQL, COLUMNS) == ['region', 'value', 'parameter', 'month']
+    assert query_columns("SELECT COUNT(*) FROM mis_long WHERE store_name = 'value'", COLUMNS) == ['store_name']
+    assert query_columns("SELECT * FROM mis_long WHERE parameter = 'Revenue'", COLUMNS) == COLUMNS
+
+
+def test_recommendation_covers_grouped_columns():
+    # Bitmap heap scans report every column of the row as output; that must not leak into INCLUDE
+    explained = {REGION_SQL: {'ms': 5.0, 'scans': [{
+        'type': 'Seq Scan',
+        'relation': 'mis_long',
+        'filter': "((month >= '2023-01-01'::date) AND (month < '2024-01-01'::date) "
+                  "AND (parameter = 'Revenue'::text))",
+        'rows_removed': 150000,
+        'blocks': 1200
+    }]}}
+
+    [rec] = _advisor().recommend(explained, Counter({REGION_SQL: 3}))
+
+    assert rec['keys'] == ['month']
+    assert rec['include'] == ['region', 'value']
+    assert rec['sql'] == ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mis_long_revenue_month ON mis_long (month) "
+                          "INCLUDE (region, value) WHERE parameter = 'Revenue'")
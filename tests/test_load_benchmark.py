@@ -0,0 +1,67 @@
+"""
+Benchmark of neon_migration.py's load modes: batched INSERT (--mode insert)
+against COPY FROM STDIN (--mode copy), on the same prepared frame in a scratch
+database. Needs TEST_DATABASE_URL; BENCHMARK_ROWS sets the frame size.
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/postgres \\
+        python -m pytest -q -s tests/test_load_benchmark.py
+"""
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from process_btc_csv import run_pipeline
+
+SAMPLE_CSV = Path(__file__).resolve().parent.parent / "BTC store for CSV.csv"
+BENCHMARK_ROWS = int(os.getenv("BENCHMARK_ROWS", "50000"))
+
+
+def _row_count(migrator):
+    migrator.postgres_client.connect()
+    try:
+        migrator.postgres_client.cursor.execute("SELECT COUNT(*) FROM mis_long")
+        return migrator.postgres_client.cursor.fetchone()[0]
+    finally:
+        migrator.postgres_client.disconnect()
+
+
+def _truncate(migrator):
+    migrator.postgres_client.connect()
+    migrator.postgres_client.cursor.execute("TRUNCATE mis_long")
+    migrator.postgres_client.connection.commit()
+    migrator.postgres_client.disconnect()
+
+
+def test_copy_outpaces_batched_insert(scratch_database, tmp_path):
+    from neon_migration import NeonMigrator
+
+    if not SAMPLE_CSV.exists():
+        pytest.skip("sample CSV not available")
+    df_tidy, _ = run_pipeline(SAMPLE_CSV)
+    csv_path = tmp_path / "clean_mis_long.csv"
+    df_tidy.to_csv(csv_path, index=False)
+
+    migrator = NeonMigrator()
+    assert migrator.create_table_schema()
+    prepared = migrator.load_csv_data(str(csv_path))
+    # Repeat the prepared rows up to BENCHMARK_ROWS so both modes load the same, realistic volume
+    df = pd.concat([prepared] * -(-BENCHMARK_ROWS // len(prepared)), ignore_index=True).head(BENCHMARK_ROWS)
+
+    timings = {}
+    for mode, load in (('insert', migrator.migrate_data), ('copy', migrator.copy_data)):
+        _truncate(migrator)
+        start = time.perf_counter()
+        assert load(df) == len(df)
+        timings[mode] = time.perf_counter() - start
+        assert _row_count(migrator) == len(df)
+
+    # migrate_data sleeps 0.1 s after every 1,000-row batch; report the time without it too
+    sleeps = 0.1 * -(-len(df) // 1000)
+    print(f"\n⏱️  {len(df):,} rows: insert {timings['insert']:.2f}s "
+          f"({timings['insert'] - sleeps:.2f}s without batch sleeps), copy {timings['copy']:.2f}s, "
+          f"{timings['insert'] / timings['copy']:.1f}x "
+          f"({(timings['insert'] - sleeps) / timings['copy']:.1f}x without sleeps)")
+    assert timings['copy'] < timings['insert'] - sleeps
@@ -0,0 +1,32 @@
+from local_llm_summarizer import LocalLLMSummarizer, NO_RESPONSE
+from summary_cache import SummaryCache
+
+RESULTS = "store_name | value\nA | 1"
+
+
+def _summarizer(tmp_path, monkeypatch, *answers):
+    """Ollama summarizer whose streamed and blocking answers come from answers, in order"""
+    summarizer = LocalLLMSummarizer('ollama', 'llama3', cache=SummaryCache(str(tmp_path / 'cache.sqlite3')))
+    answers = list(answers)
+    monkeypatch.setattr(summarizer, '_stream_ollama', lambda prompt: iter(answers.pop(0)))
+    monkeypatch.setattr(summarizer, '_query_ollama', lambda prompt: answers.pop(0) or NO_RESPONSE)
+    return summarizer
+
+
+def test_empty_stream_is_not_cached(tmp_path, monkeypatch):
+    summarizer = _summarizer(tmp_path, monkeypatch, [], ['Revenue ', 'grew.'])
+
+    assert ''.join(summarizer.stream_query_results('q', 'SELECT 1', RESULTS)) == ''
+    assert summarizer.cache.stats()['entries'] == 0
+    assert ''.join(summarizer.stream_query_results('q', 'SELECT 1', RESULTS)) == 'Revenue grew.'
+    assert list(summarizer.stream_query_results('q', 'SELECT 1', RESULTS)) == ['Revenue grew.']
+
+
+def test_placeholder_answer_is_shown_but_not_cached(tmp_path, monkeypatch):
+    summarizer = _summarizer(tmp_path, monkeypatch, '', 'Revenue grew.')
+
+    assert summarizer.summarize_query_results('q', 'SELECT 1', RESULTS) == NO_RESPONSE
+    assert summarizer.cache.stats()['entries'] == 0
+    assert summarizer.summarize_query_results('q', 'SELECT 1', RESULTS) == 'Revenue grew.'
+    assert summarizer.summarize_query_results('q', 'SELECT 1', RESULTS) == 'Revenue grew.'
+    assert summarizer.cache.stats()['hits'] == 1
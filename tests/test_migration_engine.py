@@ -0,0 +1,91 @@
+import pytest
+
+from migration_engine import FileCheckpointStore, ParallelMigrator, bisect_load, pending_ranges
+
+
+class RowError(Exception):
+    pass
+
+
+def test_bisect_load_isolates_bad_rows():
+    bad = {3, 10, 11}
+    calls = []
+
+    def load(start, end):
+        calls.append((start, end))
+        if bad & set(range(start, end)):
+            raise RowError(f"bad row in {start}-{end}")
+
+    failed = []
+    assert bisect_load(load, 0, 16, failed) == 16 - len(bad)
+    assert sorted(row for row, _ in failed) == sorted(bad)
+    # Far fewer round trips than one per row
+    assert len(calls) < 2 * 16
+
+
+def test_bisect_load_reraises_non_row_errors():
+    def load(start, end):
+        raise ConnectionError("server went away")
+
+    failed = []
+    with pytest.raises(ConnectionError):
+        bisect_load(load, 0, 8, failed, is_row_error=lambda e: isinstance(e, RowError))
+    assert failed == []
+
+
+def test_pending_ranges_fresh_run():
+    assert pending_ranges(10, {}, 4) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_pending_ranges_skip_committed_offsets_with_other_range_size():
+    done = {(0, 5000): 5000, (10000, 15000): 5000}
+    pending = pending_ranges(17000, done, 3000)
+    assert pending == [(5000, 8000), (8000, 10000), (15000, 17000)]
+    covered = set()
+    for start, end in list(done) + pending:
+        rows = set(range(start, end))
+        assert not covered & rows
+        covered |= rows
+    assert covered == set(range(17000))
+
+
+def test_pending_ranges_nothing_left():
+    assert pending_ranges(100, {(0, 60): 60, (60, 100): 40}, 30) == []
+
+
+class RecordingWriter:
+    def __init__(self, loaded_rows, fail_at=None):
+        self.loaded_rows = loaded_rows
+        self.fail_at = fail_at
+
+    def load_range(self, start, end):
+        if self.fail_at is not None and start <= self.fail_at < end:
+            raise ConnectionError("lost connection")
+        self.loaded_rows.extend(range(start, end))
+        return end - start, []
+
+    def close(self):
+        pass
+
+
+def test_resume_with_different_range_size_loads_each_row_once(tmp_path):
+    checkpoint = FileCheckpointStore(str(tmp_path / "checkpoint.json"))
+    loaded_rows = []
+
+    first = ParallelMigrator(lambda: RecordingWriter(loaded_rows, fail_at=450), checkpoint, 'run',
+                             range_size=100, workers=2).run(1000)
+    assert first['failed_ranges']
+    assert first['loaded'] == 900
+
+    second = ParallelMigrator(lambda: RecordingWriter(loaded_rows), checkpoint, 'run',
+                              range_size=256, workers=2).run(1000)
+    assert not second['failed_ranges']
+    assert second['already_loaded'] == 900
+    assert second['loaded'] == 100
+    assert sorted(loaded_rows) == list(range(1000))
+
+    third = ParallelMigrator(lambda: RecordingWriter(loaded_rows), checkpoint, 'run',
+                             range_size=100, workers=2).run(1000)
+    assert third['loaded'] == 0
+    assert third['already_loaded'] == 1000
+    assert sorted(loaded_rows) == list(range(1000))
@@ -0,0 +1,113 @@
+import psycopg2
+import pytest
+
+import postgres_client
+from postgres_client import PostgreSQLClient, PostgreSQLPool
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = [('store_name',), ('value',)]
+        self.closed = False
+        self.itersize = None
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = 0
+        self.cursors = []
+
+    def cursor(self, name=None):
+        cursor = FakeCursor(self.rows if name else [])
+        self.cursors.append(cursor)
+        return cursor
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rows = [(f"store {i}", i) for i in range(2000)]
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://fake')
+    monkeypatch.setattr(postgres_client.psycopg2, 'connect', lambda dsn: FakeConnection(rows))
+    client = PostgreSQLClient()
+    client._pool = PostgreSQLPool('postgresql://fake', max_size=2, timeout=0.1)
+    yield client
+    client.close_pool()
+
+
+def test_closing_stream_early_returns_connection(client):
+    stream = client.stream_query("SELECT * FROM mis_long", max_rows=1500, batch_size=100)
+    assert next(stream) == ['store_name', 'value']
+    for _ in range(250):
+        next(stream)
+    assert client.pool.get_stats()['in_use'] == 1
+
+    stream.close()
+
+    stats = client.pool.get_stats()
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 1
+    connection = client.pool._idle[0][0]
+    assert all(cursor.closed for cursor in connection.cursors)
+
+
+def test_abandoned_streams_do_not_exhaust_pool(client):
+    for _ in range(client.pool.max_size * 3):
+        stream = client.stream_query("SELECT * FROM mis_long", batch_size=10)
+        next(stream)
+        next(stream)
+        stream.close()
+    assert client.pool.get_stats()['in_use'] == 0
+    assert client.pool.get_stats()['timeouts'] == 0
+
+
+def test_fetch_rows_caps_and_releases(client):
+    result = client.fetch_rows("SELECT * FROM mis_long", max_rows=50)
+    assert len(result['rows']) == 50
+    assert result['truncated']
+    assert client.pool.get_stats()['in_use'] == 0
+
+
+def test_connection_errors_discard_connection(client):
+    with pytest.raises(psycopg2.OperationalError):
+        with client.pool.connection():
+            raise psycopg2.OperationalError("server closed the connection")
+    stats = client.pool.get_stats()
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 0
+    assert stats['connections_closed'] == 1
+
+
+def test_other_errors_return_connection(client):
+    with pytest.raises(ValueError):
+        with client.pool.connection():
+            raise ValueError("boom")
+    stats = client.pool.get_stats()
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 1
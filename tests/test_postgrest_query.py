@@ -0,0 +1,103 @@
+import re
+
+import pytest
+
+from postgrest_query import PushdownError, translate_aggregate, translate_sql
+
+
+def test_projection_filters_order_and_limit():
+    query = translate_sql("SELECT store_name, value AS revenue FROM mis_long WHERE parameter = 'Revenue' "
+                          "AND month >= '2024-01-01' ORDER BY value DESC LIMIT 5")
+
+    assert query.table == 'mis_long'
+    assert query.params() == [('select', 'store_name,revenue:value'), ('parameter', 'eq.Revenue'),
+                              ('month', 'gte.2024-01-01'), ('order', 'value.desc'), ('limit', '5')]
+
+
+def test_default_limit_applies_only_without_a_limit():
+    query = translate_sql("SELECT store_name FROM mis_long WHERE value BETWEEN 1 AND 5 OFFSET 10")
+
+    assert query.params(default_limit=1000) == [('select', 'store_name'), ('value', 'gte.1'), ('value', 'lte.5'),
+                                                ('limit', '1000'), ('offset', '10')]
+
+
+def test_in_list_quotes_reserved_characters_and_not_is_negated():
+    query = translate_sql("SELECT * FROM mis_long WHERE region IN ('North', 'South, East') AND NOT (value > 10)")
+
+    assert query.params() == [('select', '*'), ('region', 'in.(North,"South, East")'), ('value', 'lte.10')]
+
+
+def test_or_group_and_year_extract_become_ranges():
+    query = translate_sql("SELECT store_name FROM mis_long WHERE EXTRACT(YEAR FROM month) = 2024 "
+                          "AND (region = 'North' OR region = 'West')")
+
+    assert query.filters == [('month', 'gte.2024-01-01'), ('month', 'lt.2025-01-01'),
+                             ('or', '(region.eq.North,region.eq.West)')]
+
+
+def test_bare_count_is_an_exact_count_request():
+    query = translate_sql("SELECT COUNT(*) AS n FROM mis_long WHERE store_name LIKE 'Cafe%'")
+
+    assert query.count_only
+    assert query.count_alias == 'n'
+    assert query.filters == [('store_name', 'like.Cafe*')]
+
+
+@pytest.mark.parametrize('sql, reason', [
+    ("SELECT a.store_name FROM mis_long a JOIN stores b ON a.store_name = b.name", 'JOIN'),
+    ("SELECT region, SUM(value) FROM mis_long GROUP BY region", 'GROUP BY'),
+    ("SELECT store_name FROM mis_long WHERE value + 1 > 2", 'arithmetic'),
+    ("WITH x AS (SELECT 1) SELECT * FROM x", 'WITH'),
+    ("SELECT COUNT(*), store_name FROM mis_long", 'COUNT(*)'),
+])
+def test_unsupported_sql_raises_instead_of_fetching_everything(sql, reason):
+    with pytest.raises(PushdownError, match=re.escape(reason)):
+        translate_sql(sql)
+
+
+def test_aggregate_becomes_rpc_arguments():
+    params, columns = translate_aggregate(
+        "SELECT region, SUM(value) AS revenue, COUNT(*) FROM mis_long WHERE parameter = 'Revenue' "
+        "AND NOT region IN ('X') AND month >= '2024-01-01' GROUP BY region ORDER BY SUM(value) DESC LIMIT 3")
+
+    assert columns == ['region', 'revenue', 'count']
+    assert params == {
+        'group_by': ['region'],
+        'measures': [{'fn': 'sum', 'column': 'value', 'alias': 'revenue'},
+                     {'fn': 'count', 'column': '*', 'alias': 'count'}],
+        'filters': [{'column': 'parameter', 'op': '=', 'value': 'Revenue'},
+                    {'column': 'region', 'op': 'not in', 'value': ['X']},
+                    {'column': 'month', 'op': '>=', 'value': '2024-01-01'}],
+        'order_by': [{'column': 'revenue', 'desc': True, 'nulls': None}],
+        'row_limit': 3
+    }
+
+
+def test_aggregate_positional_group_and_order():
+    params, columns = translate_aggregate("SELECT store_name, AVG(value) FROM mis_long GROUP BY 1 ORDER BY 2")
+
+    assert columns == ['store_name', 'avg']
+    assert params['group_by'] == ['store_name']
+    assert params['order_by'] == [{'column': 'avg', 'desc': False, 'nulls': None}]
+    assert params['row_limit'] is None
+
+
+def test_aggregate_keeps_explicit_nulls_placement():
+    params, _ = translate_aggregate("SELECT region, SUM(value) AS total FROM mis_long GROUP BY region "
+                                    "ORDER BY total DESC NULLS LAST, region NULLS FIRST")
+
+    assert params['order_by'] == [{'column': 'total', 'desc': True, 'nulls': 'last'},
+                                  {'column': 'region', 'desc': False, 'nulls': 'first'}]
+
+
+@pytest.mark.parametrize('sql, reason', [
+    ("SELECT region, SUM(value) FROM mis_long WHERE region = 'A' OR region = 'B' GROUP BY region", 'OR'),
+    ("SELECT region, SUM(value) FROM mis_long GROUP BY region HAVING SUM(value) > 1", 'HAVING'),
+    ("SELECT store_name, SUM(value) FROM mis_long GROUP BY region", 'must appear in GROUP BY'),
+    ("SELECT region, SUM(value) FROM stores GROUP BY region", 'only reads mis_long'),
+    ("SELECT region, STDDEV(value) FROM mis_long GROUP BY region", 'STDDEV()'),
+    ("SELECT region FROM mis_long GROUP BY region", 'without an aggregate'),
+])
+def test_aggregate_outside_mis_aggregate_raises(sql, reason):
+    with pytest.raises(PushdownError, match=re.escape(reason)):
+        translate_aggregate(sql)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from postgres_client import format_result
+from result_digest import digest_results, estimate_tokens
+
+
+def _monthly(stores):
+    """fetch_rows-style result of store_name, month, value with one series per store"""
+    months = pd.date_range('2023-01-01', periods=12, freq='MS')
+    rows = []
+    for store, series in stores.items():
+        rows.extend((store, month.date(), value) for month, value in zip(months, series))
+    return {'columns': ['store_name', 'month', 'ebitda'], 'rows': rows, 'truncated': False}
+
+
+@pytest.fixture
+def ebitda():
+    rng = np.random.default_rng(7)
+    stores = {f"Store {i:02d}": np.linspace(100_000, 100_000 * (1 + i / 10), 12) + rng.normal(0, 1000, 12)
+              for i in range(30)}
+    stores['WeWork'] = np.linspace(-3_046, 298_257, 12)
+    stores['Crossword'] = np.linspace(-4, -3_186, 12)
+    stores['Tiny Start'] = np.linspace(50, 120_000, 12)
+    stores['Falling'] = np.linspace(200_000, -50_000, 12)
+    return _monthly(stores)
+
+
+def test_digest_fits_budget_whatever_the_result_size(ebitda):
+    text = format_result(ebitda)
+    for budget in (200, 400, 800):
+        digest = digest_results(text, token_budget=budget)
+        assert estimate_tokens(digest) <= budget
+    assert estimate_tokens(digest_results(text)) < estimate_tokens(text) / 5
+
+
+def test_growth_ignores_negative_and_tiny_starts(ebitda):
+    digest = digest_results(format_result(ebitda), token_budget=2000)
+    growing = digest.split('Fastest growing')[1].split('\n\n')[0]
+    assert 'WeWork' not in growing
+    assert 'Crossword' not in growing
+    assert 'Tiny Start' not in growing
+    assert 'Store 29' in growing
+
+    flips = digest.split('changed sign')[1].split('\n\n')[0]
+    assert 'WeWork' in flips and 'turned positive' in flips
+    assert 'Falling' in flips and 'turned negative' in flips
+    assert '%' not in flips
+
+
+def test_accepts_dataframes_and_fetch_rows_results(ebitda):
+    df = pd.DataFrame(ebitda['rows'], columns=ebitda['columns'])
+    assert digest_results(df) == digest_results(ebitda)
+    assert 'Store 29' in digest_results(df)
+
+
+def test_small_results_are_included_whole():
+    result = {'columns': ['region', 'revenue'], 'rows': [('Delhi', 300.0), ('Mumbai', 200.0)], 'truncated': False}
+    text = format_result(result)
+    digest = digest_results(text)
+    assert 'All rows:' in digest
+    assert 'Delhi' in digest and 'Mumbai' in digest
+
+
+def test_non_table_text_passes_through():
+    assert digest_results("Error executing query: relation does not exist") == \
+        "Error executing query: relation does not exist"
+    assert digest_results("No results found") == "No results found"
+    assert digest_results({'columns': ['a'], 'rows': [], 'truncated': False}) == "No results found"
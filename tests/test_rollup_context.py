@@ -0,0 +1,44 @@
+import nl_to_sql_postgres
+from postgres_client import ROLLUP_VIEWS
+
+
+class FakeClient:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def available_rollups(self):
+        self.calls += 1
+        return self.answers.pop(0)
+
+
+def _use(monkeypatch, client):
+    monkeypatch.setattr(nl_to_sql_postgres, 'get_postgres_client', lambda: client)
+    nl_to_sql_postgres.clear_rollup_context()
+
+
+def test_empty_lookup_is_not_cached(monkeypatch):
+    # No views before the first load; the reload creates them in this process
+    client = FakeClient([], list(ROLLUP_VIEWS))
+    _use(monkeypatch, client)
+
+    assert nl_to_sql_postgres.get_rollup_context() == ''
+    context = nl_to_sql_postgres.get_rollup_context()
+    assert all(name in context for name in ROLLUP_VIEWS)
+
+
+def test_views_are_cached_until_ttl_or_clear(monkeypatch):
+    client = FakeClient(list(ROLLUP_VIEWS), [], [])
+    _use(monkeypatch, client)
+
+    first = nl_to_sql_postgres.get_rollup_context()
+    assert nl_to_sql_postgres.get_rollup_context() == first
+    assert client.calls == 1
+
+    monkeypatch.setattr(nl_to_sql_postgres, '_rollup_context_expire', 0.0)
+    assert nl_to_sql_postgres.get_rollup_context() == ''
+    assert client.calls == 2
+
+    nl_to_sql_postgres.clear_rollup_context()
+    assert nl_to_sql_postgres.get_rollup_context() == ''
+    assert client.calls == 3
@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from process_btc_csv import build_store_lifecycle, run_pipeline
+
+SAMPLE_CSV = Path(__file__).resolve().parent.parent / "BTC store for CSV.csv"
+
+
+def _long(rows):
+    return pd.DataFrame(rows, columns=["store_name", "parameter", "cafe_code", "region", "category",
+                                       "month", "value"]).assign(month=lambda df: pd.to_datetime(df["month"]))
+
+
+def test_zero_filled_parameters_are_not_activity():
+    df_long = _long([
+        ("A", "Revenue", "CA-1", "Delhi", "CWK", "2024-01-01", 100.0),
+        ("A", "Revenue", "CA-1", "Delhi", "CWK", "2024-02-01", 120.0),
+        ("B", "Revenue", "CA-2", "Delhi", "CWK", "2024-01-01", 50.0),
+        ("B", "Revenue", "CA-2", "Delhi", "CWK", "2024-02-01", 0.0),
+        ("B", "Gross Margin", "CA-2", "Delhi", "CWK", "2024-02-01", 0.0),
+        ("B", "Area", "CA-2", "Delhi", "CWK", "2024-02-01", 400.0),
+        ("C", "Area", "CA-3", "Delhi", "CWK", "2024-02-01", 300.0),
+    ])
+    lifecycle = build_store_lifecycle(df_long).set_index("store_name")
+    assert lifecycle.loc["A", "status"] == "open"
+    assert lifecycle.loc["B", "status"] == "closed"
+    assert lifecycle.loc["B", "last_active_month"] == pd.Timestamp("2024-01-01")
+    assert lifecycle.loc["C", "status"] == "never_opened"
+
+
+def test_trailing_unreported_month_does_not_close_everyone():
+    df_long = _long([
+        ("A", "Transactions", "CA-1", "Delhi", "CWK", "2024-01-01", 10.0),
+        ("A", "Transactions", "CA-1", "Delhi", "CWK", "2024-02-01", None),
+    ])
+    assert build_store_lifecycle(df_long)["status"].tolist() == ["open"]
+
+
+def test_closed_marker_closes_store():
+    df_long = _long([("A", "Revenue", "CA-1", "Delhi", "CWK", "2024-01-01", 100.0)])
+    assert build_store_lifecycle(df_long, {"A"})["status"].tolist() == ["closed"]
+
+
+@pytest.mark.skipif(not SAMPLE_CSV.exists(), reason="sample CSV not available")
+def test_known_closed_stores_in_sample_csv():
+    _, lifecycle = run_pipeline(SAMPLE_CSV, sparse=True)
+    lifecycle = lifecycle.set_index("store_name")
+
+    saidulajab = lifecycle.loc["Saidulajab"]
+    assert saidulajab["status"] == "closed"
+    assert saidulajab["last_active_month"] == pd.Timestamp("2022-02-01")
+    assert saidulajab["active_months"] == 11
+    assert lifecycle.loc["DLF Cyber City", "status"] == "closed"
+    assert lifecycle.loc["Panjim", "status"] == "never_opened"
+    assert lifecycle.loc["Vasant Vihar", "status"] == "open"
+    assert (lifecycle["status"] != "open").sum() > 0
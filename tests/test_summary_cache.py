@@ -0,0 +1,72 @@
+import pytest
+
+import summary_cache
+from summary_cache import SummaryCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time for the cache module"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(summary_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def _cache(tmp_path, **kwargs):
+    return SummaryCache(str(tmp_path / 'summaries.sqlite3'), **kwargs)
+
+
+def test_key_depends_on_everything_that_shapes_the_summary():
+    key = SummaryCache.make_key('q', 'SELECT 1', '[]', 'ollama', 'llama3', 2)
+
+    assert key == SummaryCache.make_key('q', 'SELECT 1', '[]', 'ollama', 'llama3', 2)
+    assert key != SummaryCache.make_key('q', 'SELECT 1', '[]', 'ollama', 'llama3', 3)
+    assert key != SummaryCache.make_key('q', 'SELECT 1', '[]', 'llamafile', 'llama3', 2)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=2, ttl=0)
+    cache.put('a', 'summary a')
+    clock[0] += 1
+    cache.put('b', 'summary b')
+    clock[0] += 1
+    assert cache.get('a') == 'summary a'  # a is now more recent than b
+    clock[0] += 1
+    cache.put('c', 'summary c')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'summary a'
+    assert cache.get('c') == 'summary c'
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert (stats['hits'], stats['misses']) == (3, 1)
+    cache.close()
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=10, ttl=60)
+    cache.put('a', 'summary a')
+    clock[0] += 59
+    assert cache.get('a') == 'summary a'
+
+    # Reading an entry doesn't extend its life; the TTL counts from when it was stored
+    clock[0] += 2
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert stats['entries'] == 0
+    assert stats['expired'] == 1
+    cache.close()
+
+
+def test_cache_persists_across_processes_sharing_the_file(tmp_path, clock):
+    writer = _cache(tmp_path, max_entries=10, ttl=0)
+    writer.put('a', 'summary a', backend='ollama', model='llama3')
+    writer.close()
+
+    reader = _cache(tmp_path, max_entries=10, ttl=0)
+    assert reader.get('a') == 'summary a'
+    reader.clear()
+    assert reader.stats()['entries'] == 0
+    assert reader.stats()['hits'] == 0
+    reader.close()
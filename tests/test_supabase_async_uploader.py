@@ -0,0 +1,95 @@
+import json
+
+import httpx
+import pytest
+
+from supabase_async_uploader import AsyncSupabaseUploader, is_row_error
+
+RECORDS = [{'store_name': f"store {i}", 'value': i} for i in range(2000)]
+
+
+def _uploader(handler, **kwargs):
+    kwargs.setdefault('max_retries', 2)
+    return AsyncSupabaseUploader('https://example.supabase.co', 'key', transport=httpx.MockTransport(handler),
+                                 **kwargs)
+
+
+def test_loads_everything():
+    sent = []
+
+    def handler(request):
+        sent.extend(json.loads(request.content))
+        return httpx.Response(201)
+
+    summary = _uploader(handler).upload(RECORDS)
+    assert summary['loaded'] == len(RECORDS)
+    assert summary['aborted'] is None
+    assert sorted(r['value'] for r in sent) == list(range(len(RECORDS)))
+
+
+@pytest.mark.parametrize('status', [401, 403, 404])
+def test_auth_and_missing_table_errors_abort_without_bisecting(status):
+    def handler(request):
+        return httpx.Response(status, json={'message': 'Invalid API key'})
+
+    summary = _uploader(handler, concurrency=4, initial_batch_size=500).upload(RECORDS)
+    assert summary['loaded'] == 0
+    assert summary['aborted'].startswith(f"HTTP {status}")
+    assert summary['failed_rows'] == []
+    # At most one request per concurrent slot, not one per bisected half
+    assert summary['requests'] <= 4
+
+
+def test_data_errors_are_bisected_to_the_bad_rows():
+    bad = {17, 1234}
+
+    def handler(request):
+        batch = json.loads(request.content)
+        if any(r['value'] in bad for r in batch):
+            return httpx.Response(400, json={'code': '22P02', 'message': 'invalid input syntax'})
+        return httpx.Response(201)
+
+    summary = _uploader(handler).upload(RECORDS)
+    assert summary['aborted'] is None
+    assert summary['loaded'] == len(RECORDS) - len(bad)
+    assert sorted(row for row, _ in summary['failed_rows']) == sorted(bad)
+
+
+def test_unknown_column_aborts():
+    def handler(request):
+        return httpx.Response(400, json={'code': 'PGRST204', 'message': "Could not find the 'x' column"})
+
+    summary = _uploader(handler).upload(RECORDS)
+    assert summary['aborted']
+    assert summary['requests'] <= 4
+
+
+def test_transient_errors_are_retried():
+    calls = {'n': 0}
+
+    def handler(request):
+        calls['n'] += 1
+        if calls['n'] <= 2:
+            return httpx.Response(503, headers={'Retry-After': '0'})
+        return httpx.Response(201)
+
+    summary = _uploader(handler, concurrency=1).upload(RECORDS[:100])
+    assert summary['loaded'] == 100
+    assert summary['retries'] == 2
+
+
+def test_exhausted_retries_abort():
+    def handler(request):
+        return httpx.Response(503, headers={'Retry-After': '0'})
+
+    summary = _uploader(handler, concurrency=1, max_retries=1).upload(RECORDS[:100])
+    assert summary['loaded'] == 0
+    assert 'after 1 retries' in summary['aborted']
+    assert summary['requests'] == 2
+
+
+def test_is_row_error():
+    assert is_row_error(httpx.Response(409, json={'code': '23505'}))
+    assert is_row_error(httpx.Response(400, text='bad row'))
+    assert not is_row_error(httpx.Response(401, json={'code': 'PGRST301'}))
+    assert not is_row_error(httpx.Response(404, json={'code': '42P01'}))